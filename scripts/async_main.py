@@ -0,0 +1,82 @@
+"""
+Agents run as asyncio tasks: one event loop and one connection for all the agents of the process (async_network.py),
+instead of a strategy thread and a receiver thread per agent (main.py).
+The strategies are the step functions of main.py (main.STRATEGIES, main.play): they yield their requests, run_steps
+awaits them. Their decisions, the map knowledge (planner.shared_map, frontier.shared_frontier) and the task planner are
+the ones of main.py. Usage: python3 async_main.py [-i IP] [-n NB_LOCAL] [-s STRATEGY]
+"""
+
+import asyncio
+from my_constants import *
+from async_network import AsyncNetwork
+from main import REQUEST, SEND, FOLLOW, STRATEGIES, play, frontier_explore, get_direction_from_delta
+
+
+async def run_steps(agent, steps):
+    """Carry out the operations yielded by the step function 'steps' on the event loop (main.run_steps), returns its result"""
+    result = None
+    while True:
+        try:
+            op = steps.send(result)
+        except StopIteration as stop:
+            return stop.value
+        if op[0] == REQUEST:
+            result = await agent.request(op[1])
+        elif op[0] == FOLLOW:   # No pipelining over this transport: a batch is the first move of the path
+            nx, ny = op[1][0]
+            reply = await agent.request({"header": MOVE, "direction": get_direction_from_delta(nx - agent.x, ny - agent.y), "purpose": agent.purpose})
+            result = [reply] if reply else []
+        elif op[0] == SEND:
+            agent.send(op[1])
+            result = await agent.network.writer.drain()
+        else:
+            try:
+                result = await asyncio.wait_for(agent.over.wait(), op[1])
+            except asyncio.TimeoutError:
+                result = False
+
+
+async def agent_loop(agent, explore=frontier_explore):
+    """Task of an agent: its steps (main.play) over the connection of the process"""
+    await run_steps(agent, play(agent, explore))
+
+
+async def run(server_ip="localhost", nb_local=0, strategy="frontier"):
+    """ Connect the agents, play until all of them completed or the game is over, then close the connection """
+    network = AsyncNetwork()
+    agents = [await network.connect(server_ip)]
+    await agents[0].start()
+    nb_expected = agents[0].nb_agent_expected
+    nb_local = min(nb_local, nb_expected) if nb_local > 0 else nb_expected
+    print(f"Server expects {nb_expected} agents, {nb_local} run in this process")
+    for _ in range(1, nb_local):
+        agent = await network.join()
+        if agent is None:
+            break
+        await agent.start()
+        agents.append(agent)
+    await asyncio.gather(*(a.wait_for_connected_agent() for a in agents))
+
+    print(f"Created {len(agents)} agents | Map: {agents[0].w}x{agents[0].h}")
+    try:
+        await asyncio.gather(*(agent_loop(a, STRATEGIES[strategy]) for a in agents))
+    finally:
+        await network.close()
+    if any(a.game_over for a in agents):
+        print("💀 === GAME OVER === 💀")
+    else:
+        print("=== ALL DONE ===")
+    return agents
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--server_ip", help="Ip address of the server", type=str, default="localhost")
+    parser.add_argument("-n", "--nb_local", help="Number of agents run by this process (default: all the agents expected by the server)", type=int, default=0)
+    parser.add_argument("-s", "--strategy", help="Exploration strategy", choices=sorted(STRATEGIES), default="frontier")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args.server_ip, args.nb_local, args.strategy))
+    except KeyboardInterrupt:
+        print("Stopped")
@@ -0,0 +1,167 @@
+"""
+Asyncio transport of the agents run as coroutines (async_main.py).
+One connection carries all the agents of the process (multiplexed, like network.MuxNetwork): requests are tagged with the
+id of their agent ("mux_id"), the replies come back addressed to it ("to"), pushes and broadcasts arrive once and are
+handed to every agent but their sender. A single task reads the socket, every agent awaits its own reply: no thread at all.
+"""
+
+import asyncio, io, pickle, socket
+from collections import deque
+from my_constants import *
+from agent import Agent
+
+READ_SIZE = 1 << 16
+REPLY_TIMEOUT = 1.0
+
+
+class AsyncNetwork:
+    """ Connection of the agents of this process, dispatching the incoming messages from one reader task """
+    def __init__(self):
+        self.agents = {}    #id -> AsyncAgent
+        self.joined = asyncio.Queue()   #agents created from the MUX_JOIN replies
+        self.buffer = bytearray()
+        self.parsed = deque()   #messages read from the buffer, not dispatched yet
+        self.reader_task = None
+
+
+    async def connect(self, server_ip="localhost"):
+        """ Open the connection, returns the agent with the id sent by the server """
+        self.reader, self.writer = await asyncio.open_connection(server_ip, 5555)
+        self.writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        agent = AsyncAgent(self, await self.receive())
+        self.agents[agent.agent_id] = agent
+        self.reader_task = asyncio.create_task(self.receive_loop())
+        return agent
+
+
+    async def join(self):
+        """ One more agent on the connection, None once the server has no id left """
+        self.send({"header": MUX_JOIN})
+        return await self.joined.get()
+
+
+    def send(self, msg):
+        """ Queue a msg, the event loop writes it without blocking (messages of the process keep their order) """
+        self.writer.write(pickle.dumps(msg))
+
+
+    async def receive(self):
+        """ Next message of the server. The pickles arrive back to back, a partial one waits for the rest of its bytes """
+        while not self.parsed:
+            data = await self.reader.read(READ_SIZE)
+            if not data:
+                raise EOFError("The server closed the connection")
+            self.buffer += data
+            stream = io.BytesIO(self.buffer)
+            end = 0
+            while end < len(self.buffer):
+                try:
+                    self.parsed.append(pickle.load(stream))
+                except (EOFError, pickle.UnpicklingError):     #truncated: the rest is still on its way
+                    break
+                end = stream.tell()
+            del self.buffer[:end]
+        return self.parsed.popleft()
+
+
+    async def receive_loop(self):
+        """ Dispatch the incoming messages to the agents """
+        try:
+            while True:
+                msg = await self.receive()
+                if msg["header"] == MUX_JOIN:   #the agent exists before any later message can address it
+                    agent = AsyncAgent(self, msg["id"]) if msg["id"] is not None else None
+                    if agent is not None:
+                        self.agents[agent.agent_id] = agent
+                    self.joined.put_nowait(agent)
+                elif "to" in msg:
+                    self.agents[msg["to"]].handle_msg(msg)
+                else:
+                    for agent in list(self.agents.values()):
+                        if msg["header"] != BROADCAST_MSG or msg.get("sender") != agent.agent_id:
+                            agent.handle_msg(msg)
+        except (EOFError, OSError):
+            for agent in self.agents.values():  #nobody will answer any more
+                agent._handle_game_over()
+
+
+    async def close(self):
+        """ Stop reading and close the connection (the server sees every agent of the process leave) """
+        if self.reader_task is not None:
+            self.reader_task.cancel()
+            try:
+                await self.reader_task
+            except asyncio.CancelledError:
+                pass
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except OSError:
+            pass
+
+
+class AsyncAgent(Agent):
+    """ Agent whose requests are awaited: same state and message handling as Agent, the reader task of the network feeds it """
+    def __init__(self, network, agent_id):
+        self.init_state()
+        self.network = network
+        self.agent_id = agent_id
+        self.running = True
+        self.msg = {}
+        self.reply = None   #future of the request in flight
+        self.started = asyncio.Event()  #GAME_START pushed
+        self.over = asyncio.Event()     #GAME_OVER pushed, or connection lost
+
+
+    async def start(self):
+        """ Read the environment, like Agent.__init__ """
+        env_conf = await self.request({"header": GET_DATA})
+        self.nb_agent_expected = (await self.request({"header": GET_NB_AGENTS}))["nb_agents"]
+        self.nb_agent_connected = 0
+        self.x, self.y = env_conf["x"], env_conf["y"]
+        self.w, self.h = env_conf["w"], env_conf["h"]
+        self.patch_size = env_conf.get("patch_size", 0)
+        self.guarded_moves = env_conf.get("guarded_moves", False)
+        print(f"Agent {self.agent_id} initialized at ({self.x}, {self.y}) - cell_val: {env_conf['cell_val']}")
+
+
+    def send(self, msg):
+        self.network.send(dict(msg, mux_id=self.agent_id))
+
+
+    async def request(self, msg, timeout=REPLY_TIMEOUT):
+        """ Send a request and await its reply, at most 'timeout' (s). None without a reply to this request (Agent.request) """
+        if self.game_over:
+            return None
+        self.rid += 1
+        self.reply = asyncio.get_running_loop().create_future()
+        self.send(dict(msg, rid=self.rid))
+        try:
+            return await asyncio.wait_for(self.reply, timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+    def on_reply(self, msg):
+        if msg.get("rid", self.rid) != self.rid:    #late reply to a timed out request (Agent.on_reply)
+            return
+        self.msg = msg
+        if "rid" in msg and self.reply is not None and not self.reply.done():
+            self.reply.set_result(msg)
+
+
+    def _handle_game_start(self, msg):
+        super()._handle_game_start(msg)
+        self.started.set()
+
+
+    def _handle_game_over(self):
+        super()._handle_game_over()
+        self.over.set()
+        if self.reply is not None and not self.reply.done():
+            self.reply.set_result(None)
+
+
+    async def wait_for_connected_agent(self):
+        await self.started.wait()
+        print("All agents connected!")
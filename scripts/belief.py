@@ -0,0 +1,81 @@
+"""
+Belief map over the item locations, for exploration by expected information gain.
+Every cell starts with the same weight. The reading of the cell an agent stands on tells a lot about the 5x5 area around it:
+- 0 or 0.35 (wall warning): no item within 2 cells (item zones are never overwritten by walls)
+- 0.25 / 0.3: an item 2 cells away, 0.5 / 0.6: an item 1 cell away
+Known items (own discoveries, broadcasts) are removed with their area. All updates are slice operations on NumPy arrays.
+"""
+
+import numpy as np
+from my_constants import *
+
+RADIUS = 2  #half size of the area revealed by a reading
+RING_1_LIKELIHOOD = 8.0     #weight factor of the cells that may hold the item announced by a halo reading
+RING_2_LIKELIHOOD = 4.0
+
+
+class Belief:
+    """ Unnormalized weights of the cells that may hold an item nobody found yet """
+    def __init__(self, w, h):
+        self.w, self.h = w, h
+        self.weights = np.ones((h, w))
+        self.known_items = set()
+
+
+    def _area(self, x, y, r):
+        """ Slices of the (2r+1)x(2r+1) square around (x, y), clipped to the map """
+        return slice(max(0, y - r), y + r + 1), slice(max(0, x - r), x + r + 1)
+
+
+    def observe(self, x, y, val):
+        """ Update from the value of the cell (x, y) """
+        if val == 0 or abs(val - WALL_WARNING_PERCENTAGE) < 0.01:
+            self.weights[self._area(x, y, RADIUS)] = 0
+        elif val < 1.0:
+            near = val >= min(KEY_NEIGHBOUR_PERCENTAGE, BOX_NEIGHBOUR_PERCENTAGE)    #0.5 / 0.6: item adjacent
+            ring = 1 if near else 2
+            inside = self.weights[self._area(x, y, ring)].copy()
+            self.weights[self._area(x, y, RADIUS)] = 0
+            self.weights[self._area(x, y, ring)] = inside * (RING_1_LIKELIHOOD if near else RING_2_LIKELIHOOD)
+            if not near:    #0.25 / 0.3: the item is not adjacent
+                self.weights[self._area(x, y, 1)] = 0
+            else:
+                self.weights[y, x] = 0
+        else:   #an item (or a wall) is on this very cell
+            self.weights[y, x] = 0
+
+
+    def rule_out(self, x, y):
+        """ Nothing left to find around (x, y) """
+        self.weights[self._area(x, y, RADIUS)] = 0
+
+
+    def sync(self, positions):
+        """ Remove the items whose position is known, with their halo """
+        for pos in positions:
+            if pos and pos not in self.known_items:
+                self.known_items.add(pos)
+                self.weights[self._area(pos[0], pos[1], RADIUS)] = 0
+
+
+    def gain(self):
+        """ (h, w) weight revealed by standing on each cell: 5x5 box sums through a summed-area table """
+        k = 2 * RADIUS + 1
+        sat = np.pad(np.pad(self.weights, RADIUS).cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+        return sat[k:, k:] - sat[:-k, k:] - sat[k:, :-k] + sat[:-k, :-k]
+
+
+    def best_target(self, x, y, blocked=None):
+        """
+        Cell maximizing revealed weight per step of travel from (x, y) (Chebyshev distance), None once every cell was ruled out.
+        'blocked' cells (known obstacles) are never chosen.
+        """
+        gain = self.gain()
+        if blocked is not None:
+            gain[blocked] = 0
+        if gain.max() <= 0:
+            return None
+        ys, xs = np.ogrid[0:self.h, 0:self.w]
+        score = gain / (1 + np.maximum(np.abs(xs - x), np.abs(ys - y)))
+        ty, tx = np.unravel_index(np.argmax(score), score.shape)
+        return int(tx), int(ty)
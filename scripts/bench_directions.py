@@ -0,0 +1,89 @@
+"""
+Micro-benchmark of the direction helpers used by the strategy layer (main.py).
+Compares the former per-call implementations (dict/list rebuilt on every call, if-chain)
+with the precomputed tables of directions.py, on the calls a typical move step makes.
+Usage: python3 bench_directions.py [nb_steps]
+"""
+
+import sys
+import timeit
+from my_constants import *
+import main
+
+
+def old_get_direction_from_delta(dx, dy):
+    if dx == 0 and dy == 0: return STAND
+    if dx == 1 and dy == 0: return RIGHT
+    if dx == -1 and dy == 0: return LEFT
+    if dx == 0 and dy == 1: return DOWN
+    if dx == 0 and dy == -1: return UP
+    if dx == 1 and dy == 1: return DOWN_RIGHT
+    if dx == 1 and dy == -1: return UP_RIGHT
+    if dx == -1 and dy == 1: return DOWN_LEFT
+    if dx == -1 and dy == -1: return UP_LEFT
+    return STAND
+
+
+def old_rotate_direction(d, clockwise=True):
+    order = [UP, UP_RIGHT, RIGHT, DOWN_RIGHT, DOWN, DOWN_LEFT, LEFT, UP_LEFT]
+    if d not in order:
+        return UP
+    idx = order.index(d)
+    step = 1 if clockwise else -1
+    return order[(idx + step) % 8]
+
+
+def old_get_target_from_direction(x, y, d):
+    deltas = {
+        STAND: (0, 0), LEFT: (-1, 0), RIGHT: (1, 0), UP: (0, -1), DOWN: (0, 1),
+        UP_LEFT: (-1, -1), UP_RIGHT: (1, -1), DOWN_LEFT: (-1, 1), DOWN_RIGHT: (1, 1)
+    }
+    dx, dy = deltas.get(d, (0, 0))
+    return (x + dx, y + dy)
+
+
+def old_step(x, y, tx, ty):
+    """ Direction bookkeeping of one move_to iteration + a bypass rotation + a retreat, former helpers """
+    dx, dy = tx - x, ty - y
+    d = old_get_direction_from_delta(1 if dx > 0 else (-1 if dx < 0 else 0), 1 if dy > 0 else (-1 if dy < 0 else 0))
+    old_get_target_from_direction(x, y, d)
+    for alt in [old_rotate_direction(d, True), old_rotate_direction(d, False)]:
+        old_get_target_from_direction(x, y, alt)
+    all_dirs = [UP_LEFT, UP_RIGHT, DOWN_LEFT, DOWN_RIGHT, UP, DOWN, LEFT, RIGHT]
+    for nd in all_dirs:
+        old_get_target_from_direction(x, y, nd)
+    return old_get_direction_from_delta(x - tx, y - ty)
+
+
+def new_step(x, y, tx, ty):
+    """ Same bookkeeping with the precomputed tables """
+    d = main.direction_towards(tx - x, ty - y)
+    main.get_target_from_direction(x, y, d)
+    for alt in [main.rotate_direction(d, True), main.rotate_direction(d, False)]:
+        main.get_target_from_direction(x, y, alt)
+    for nd in main.GRADIENT_DIRS:
+        main.get_target_from_direction(x, y, nd)
+    return main.get_direction_from_delta(x - tx, y - ty)
+
+
+def bench(fn, nb_steps):
+    targets = [(x % 35, x % 30, (7 * x) % 35, (3 * x) % 30) for x in range(nb_steps)]
+    def run():
+        for x, y, tx, ty in targets:
+            fn(x, y, tx, ty)
+    return min(timeit.repeat(run, number=1, repeat=5)) / nb_steps * 1e6   #µs per step
+
+
+if __name__ == "__main__":
+    nb_steps = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    for dx in (-1, 0, 1):   #sanity check: both implementations agree
+        for dy in (-1, 0, 1):
+            d = old_get_direction_from_delta(dx, dy)
+            assert main.get_direction_from_delta(dx, dy) == d
+            assert main.rotate_direction(d) == old_rotate_direction(d) and main.rotate_direction(d, False) == old_rotate_direction(d, False)
+            assert main.get_target_from_direction(5, 5, d) == old_get_target_from_direction(5, 5, d)
+    old_us, new_us = bench(old_step, nb_steps), bench(new_step, nb_steps)
+    print(f"Direction bookkeeping per strategy step ({nb_steps} steps)")
+    print(f"  per-call tables : {old_us:.3f} µs")
+    print(f"  precomputed     : {new_us:.3f} µs")
+    print(f"  speed-up        : x{old_us / new_us:.2f}")
@@ -0,0 +1,64 @@
+"""
+Benchmark of the ALT heuristic of planner.py against plain A* (Chebyshev heuristic).
+Counts the nodes expanded between random pairs of free cells, on the maps of config.json (walls and warning zones known)
+and on a large generated map cluttered with L-walls. Both searches must return paths of the same length.
+Usage: python3 bench_planner.py [nb_queries]
+"""
+
+import sys, time
+import numpy as np
+from my_constants import *
+from game import Game, Walls
+import map_cache, planner
+
+
+def map_obstacles(map_id):
+    """ Walls and warning zones of a map of config.json, as the planner sees them once everything is discovered """
+    game = Game(1, map_id, headless=True)
+    return game.get_wall_mask() | (game.map_real == WALL_WARNING_PERCENTAGE)
+
+
+def generated_obstacles(size, nb_walls, seed=0):
+    """ size x size map with nb_walls randomly placed and rotated L-walls, plus their warning zones """
+    rng = np.random.default_rng(seed)
+    draws = [(*rng.integers(1, size - 4, 2).tolist(), int(rng.integers(4))) for _ in range(nb_walls)]
+    walls = Walls(*zip(*draws)) if draws else Walls([], [], [])
+    blocked = np.zeros((size, size), dtype=bool)
+    for cells in (walls.cells, walls.warning):
+        blocked[cells[..., 1], cells[..., 0]] = True
+    return blocked
+
+
+def bench(name, blocked, nb_queries, seed=0):
+    t = time.perf_counter()
+    landmark_dist = map_cache.landmark_tables(blocked)[1].tolist()   #converted once, as KnownMap does
+    build_ms = (time.perf_counter() - t) * 1e3
+    rows = blocked.tolist()
+    free_y, free_x = np.nonzero(~blocked)
+    rng = np.random.default_rng(seed)
+    stats = {"plain": [0, 0.0], "alt": [0, 0.0]}
+    nb_paths = 0
+    for _ in range(nb_queries):
+        i, j = rng.integers(len(free_x), size=2)
+        start, goal = (int(free_x[i]), int(free_y[i])), (int(free_x[j]), int(free_y[j]))
+        lengths = []
+        for kind, tables in (("plain", None), ("alt", landmark_dist)):
+            t = time.perf_counter()
+            path, expansions = planner.astar(rows, start, goal, tables)
+            stats[kind][0] += expansions
+            stats[kind][1] += time.perf_counter() - t
+            lengths.append(None if path is None else len(path))
+        assert lengths[0] == lengths[1], f"{start} -> {goal}: {lengths}"
+        nb_paths += lengths[0] is not None
+    h, w = blocked.shape
+    print(f"{name} ({w}x{h}, {blocked.mean():.0%} obstacles, {nb_paths}/{nb_queries} reachable pairs, tables built in {build_ms:.1f} ms)")
+    for kind, (expansions, seconds) in stats.items():
+        print(f"  {kind:<6} {expansions / nb_queries:>9.1f} expansions/query  {seconds / nb_queries * 1e3:>7.2f} ms/query")
+    print(f"  expansions ratio: x{stats['plain'][0] / max(1, stats['alt'][0]):.2f}")
+
+
+if __name__ == "__main__":
+    nb_queries = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    for map_id in (1, 2, 3):
+        bench(f"map_{map_id}", map_obstacles(map_id), nb_queries)
+    bench("generated", generated_obstacles(200, 600), nb_queries // 4)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Comparison of the exploration strategies of main.py (main.STRATEGIES) on the headless engine.
+Every strategy plays the same maps and agent counts; the table reports, per strategy, the mean makespan
+(moves of the busiest agent), mean total moves, completed agents, game overs and episodes stopped by the budget.
+A second table splits the mean total moves by purpose (explore, localize, bypass, probe, claim), per strategy and map.
+Usage: python3 bench_strategies.py [--strategies sweep frontier] [--maps 1 2 3] [--agents 2 3 4] [--episodes 3] [--workers W]
+"""
+
+import argparse, os
+from multiprocessing import Pool
+from my_constants import PURPOSES
+from tuner import silence
+
+
+def play(task):
+    strategy, map_id, nb_agents, max_moves, timeout = task
+    import headless
+    return strategy, map_id, nb_agents, headless.run_episode(map_id, nb_agents, max_moves, timeout, strategy=strategy)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--strategies", help="Strategies to compare", type=str, nargs="+", default=["sweep", "frontier"])
+    parser.add_argument("--maps", help="Maps to play", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--agents", help="Agent counts to play", type=int, nargs="+", default=[2, 3, 4])
+    parser.add_argument("--episodes", help="Episodes per strategy, map and agent count", type=int, default=3)
+    parser.add_argument("--max_moves", help="Moves of one agent after which an episode is stopped", type=int, default=3000)
+    parser.add_argument("--timeout", help="Wall-clock limit of one episode (s)", type=float, default=60)
+    parser.add_argument("--workers", help="Worker processes", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    tasks = [(strategy, map_id, nb_agents, args.max_moves, args.timeout) for strategy in args.strategies
+             for map_id in args.maps for nb_agents in args.agents for _ in range(args.episodes)]
+    with Pool(args.workers, initializer=silence) as pool:
+        results = pool.map(play, tasks)
+
+    print(f"{'strategy':<10} {'map':>4} {'agents':>6} {'makespan':>9} {'moves':>7} {'completed':>10} {'game over':>10} {'stopped':>8}")
+    for strategy in args.strategies:
+        for map_id in args.maps + [None]:   #None: all maps together
+            for nb_agents in (args.agents if map_id else [None]):
+                runs = [r for s, m, n, r in results if s == strategy and m == (map_id or m) and n == (nb_agents or n)]
+                agents = sum(n for s, m, n, r in results if s == strategy and m == (map_id or m) and n == (nb_agents or n))
+                print(f"{strategy:<10} {map_id or 'all':>4} {nb_agents or '':>6} {sum(r['makespan'] for r in runs) / len(runs):>9.0f} "
+                      f"{sum(r['steps'] for r in runs) / len(runs):>7.0f} {sum(r['completed'] for r in runs):>5}/{agents:<4} "
+                      f"{sum(r['game_over'] for r in runs):>10} {sum(r['timed_out'] for r in runs):>8}")
+
+    print()
+    print(f"{'strategy':<10} {'map':>4} " + " ".join(f"{p:>9}" for p in PURPOSES))
+    for strategy in args.strategies:
+        for map_id in args.maps + [None]:
+            runs = [r for s, m, n, r in results if s == strategy and m == (map_id or m)]
+            print(f"{strategy:<10} {map_id or 'all':>4} " + " ".join(f"{sum(r['purposes'][p] for r in runs) / len(runs):>9.0f}" for p in PURPOSES))
+
+
+if __name__ == "__main__":
+    main()
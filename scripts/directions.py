@@ -0,0 +1,36 @@
+""" Precomputed direction tables used by the agent strategies, all indexed by the move constants of my_constants """
+
+from my_constants import *
+import numpy as np
+
+
+""" PER DIRECTION TABLES """
+DELTAS = ((0, 0), (-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (1, -1), (-1, 1), (1, 1))    #(dx, dy), same order as Game.moves
+OPPOSITE = (STAND, RIGHT, LEFT, DOWN, UP, DOWN_RIGHT, DOWN_LEFT, UP_RIGHT, UP_LEFT)
+CLOCKWISE = (UP, UP_RIGHT, RIGHT, DOWN_RIGHT, DOWN, DOWN_LEFT, LEFT, UP_LEFT)    #45° steps
+ROTATE_CW = tuple(CLOCKWISE[(CLOCKWISE.index(d) + 1) % 8] if d in CLOCKWISE else UP for d in range(9))
+ROTATE_CCW = tuple(CLOCKWISE[(CLOCKWISE.index(d) - 1) % 8] if d in CLOCKWISE else UP for d in range(9))
+PERPENDICULAR = (
+    (LEFT, RIGHT, UP, DOWN),    #STAND
+    (UP, DOWN), (UP, DOWN), (LEFT, RIGHT), (LEFT, RIGHT),
+    (DOWN, LEFT, RIGHT), (DOWN, LEFT, RIGHT), (UP, LEFT, RIGHT), (UP, LEFT, RIGHT),
+)
+FROM_DELTA = ((UP_LEFT, UP, UP_RIGHT), (LEFT, STAND, RIGHT), (DOWN_LEFT, DOWN, DOWN_RIGHT))  #FROM_DELTA[dy + 1][dx + 1]
+
+""" NEIGHBOURHOOD """
+GRADIENT_DIRS = (UP_LEFT, UP_RIGHT, DOWN_LEFT, DOWN_RIGHT, UP, DOWN, LEFT, RIGHT)    #probing order: diagonals first
+DIAGONALS = frozenset((UP_LEFT, UP_RIGHT, DOWN_LEFT, DOWN_RIGHT))
+NEIGHBOUR_DIRS = np.array(GRADIENT_DIRS)
+NEIGHBOUR_OFFSETS = np.array([DELTAS[d] for d in GRADIENT_DIRS])    #(8, 2) array of (dx, dy), row i is GRADIENT_DIRS[i]
+
+
+def direction_towards(dx, dy):
+    """ Direction of the one-cell step that follows the sign of (dx, dy) """
+    return FROM_DELTA[(dy > 0) - (dy < 0) + 1][(dx > 0) - (dx < 0) + 1]
+
+
+def neighbours(x, y, w, h):
+    """ In-bounds neighbours of (x, y): (directions, (n, 2) array of positions), in GRADIENT_DIRS order """
+    cells = NEIGHBOUR_OFFSETS + (x, y)
+    inside = (cells[:, 0] >= 0) & (cells[:, 0] < w) & (cells[:, 1] >= 0) & (cells[:, 1] < h)
+    return NEIGHBOUR_DIRS[inside], cells[inside]
@@ -0,0 +1,130 @@
+"""
+Frontier detection for frontier-based exploration (main.py -s frontier).
+A cell is covered once an agent stood within 2 cells of it: an item there would have been noticed from its halo.
+Frontier cells are covered cells with an uncovered neighbour. Sensing a cell only changes the coverage of its 5x5 area,
+so only the frontier status of the cells around it is recomputed: the cost of an update does not depend on the map size.
+One Frontier is shared by all the agents of a process (shared_frontier).
+"""
+
+from threading import Lock
+import numpy as np
+
+RADIUS = 2  #half size of the area covered from a cell
+TARGET_SPACING = 5  #frontier cells this close to the target of another agent are left to it
+
+_shared = {}    #(w, h) -> Frontier of this process
+_shared_lock = Lock()
+
+
+def shared_frontier(w, h):
+    """ Frontier shared by the agents of this process playing on a w x h map """
+    with _shared_lock:
+        if (w, h) not in _shared:
+            _shared[(w, h)] = Frontier(w, h)
+        return _shared[(w, h)]
+
+
+def reset():
+    """ Forget the frontiers of previous games (several episodes played in one process) """
+    with _shared_lock:
+        _shared.clear()
+
+
+class Frontier:
+    """ Coverage, frontier and unreachable cells of a map as (h, w) boolean arrays, plus the current target of each agent """
+    def __init__(self, w, h):
+        self.w, self.h = w, h
+        self.covered = np.zeros((h, w), dtype=bool)
+        self.frontier = np.zeros((h, w), dtype=bool)
+        self.unreachable = np.zeros((h, w), dtype=bool)
+        self.targets = {}   #agent id -> frontier cell it travels to
+        self.lock = Lock()
+
+
+    def observe(self, x, y):
+        """ An agent stood on (x, y): cover its area and update the frontier around it """
+        y0, y1, x0, x1 = max(0, y - RADIUS), min(self.h, y + RADIUS + 1), max(0, x - RADIUS), min(self.w, x + RADIUS + 1)
+        with self.lock:
+            if self.covered[y0:y1, x0:x1].all():
+                return
+            self.covered[y0:y1, x0:x1] = True
+            # Cells whose status may change: the covered area and its border. Their neighbours are read too
+            oy0, oy1, ox0, ox1 = max(0, y0 - 1), min(self.h, y1 + 1), max(0, x0 - 1), min(self.w, x1 + 1)
+            iy0, iy1, ix0, ix1 = max(0, oy0 - 1), min(self.h, oy1 + 1), max(0, ox0 - 1), min(self.w, ox1 + 1)
+            uncovered = np.pad(~self.covered[iy0:iy1, ix0:ix1], 1)     #outside the map counts as covered
+            h, w = uncovered.shape
+            near_uncovered = np.zeros((h - 2, w - 2), dtype=bool)
+            for dy in (0, 1, 2):
+                for dx in (0, 1, 2):
+                    near_uncovered |= uncovered[dy:h - 2 + dy, dx:w - 2 + dx]
+            window = self.covered[iy0:iy1, ix0:ix1] & near_uncovered
+            self.frontier[oy0:oy1, ox0:ox1] = window[oy0 - iy0:oy1 - iy0, ox0 - ix0:ox1 - ix0]
+
+
+    def nearest(self, x, y, agent_id, blocked=None, window=None):
+        """
+        Closest frontier cell to (x, y) (Chebyshev distance) that is not blocked, known unreachable or near the target of
+        another agent. Ties go to the cell with the most frontier around it (larger cluster). None when there is none left.
+        Searched in windows of doubling size around (x, y): the first window holding a candidate holds the closest one.
+        With 'window' (x0, y0, x1, y1) only the cells inside it are candidates, 'blocked' then covers the window only.
+        """
+        wx, wy, wx1, wy1 = window or (0, 0, self.w, self.h)
+        with self.lock:
+            candidates = self.frontier[wy:wy1, wx:wx1] & ~self.unreachable[wy:wy1, wx:wx1]
+            others = [t for a, t in self.targets.items() if a != agent_id]
+        if blocked is not None:
+            candidates &= ~blocked
+        spread = candidates.copy()
+        for tx, ty in others:
+            tx, ty = tx - wx, ty - wy
+            spread[max(0, ty - TARGET_SPACING):max(0, ty + TARGET_SPACING + 1), max(0, tx - TARGET_SPACING):max(0, tx + TARGET_SPACING + 1)] = False
+        if spread.any():    #otherwise everything left is near the others: share it
+            candidates = spread
+        lx, ly = x - wx, y - wy     #window coordinates
+        r = 8
+        while True:
+            y0, x0 = max(0, ly - r), max(0, lx - r)
+            fy, fx = np.nonzero(candidates[y0:max(0, ly + r + 1), x0:max(0, lx + r + 1)])
+            if len(fx) or r >= max(self.w, self.h):
+                break
+            r *= 2
+        if not len(fx):
+            return None
+        fx, fy = fx + x0 + wx, fy + y0 + wy
+        dist = np.maximum(np.abs(fx - x), np.abs(fy - y))
+        closest = np.flatnonzero(dist == dist.min())
+        sizes = [self.frontier[max(0, fy[i] - 1):fy[i] + 2, max(0, fx[i] - 1):fx[i] + 2].sum() for i in closest]
+        i = closest[int(np.argmax(sizes))]
+        target = (int(fx[i]), int(fy[i]))
+        with self.lock:
+            self.targets[agent_id] = target
+        return target
+
+
+    def has_candidates(self, window, blocked=None):
+        """ True if the window (x0, y0, x1, y1) holds a frontier cell that is neither known unreachable nor 'blocked' (window sized) """
+        x0, y0, x1, y1 = window
+        with self.lock:
+            candidates = self.frontier[y0:y1, x0:x1] & ~self.unreachable[y0:y1, x0:x1]
+        return (candidates if blocked is None else candidates & ~blocked).any()
+
+
+    def give_up(self, agent_id, cell):
+        """ The agent could not reach this frontier cell """
+        with self.lock:
+            self.unreachable[cell[1], cell[0]] = True
+            self.targets.pop(agent_id, None)
+
+
+def next_target(front, known, x, y, agent_id):
+    """
+    Frontier cell the agent at (x, y) travels to next (Frontier.nearest over the cells the KnownMap does not block).
+    On large maps (known.hierarchy) the whole map is not scanned: the closest cluster by route holding a candidate is
+    found first (hierarchy.nearest_tile), then its closest frontier cell.
+    """
+    if known.hierarchy is None:
+        return front.nearest(x, y, agent_id, known.blocked())
+    def wanted(window):     #the blocked cells are only computed for the windows holding frontier
+        return front.has_candidates(window) and front.has_candidates(window, known.blocked(*window))
+    window = known.hierarchy.nearest_tile((x, y), wanted)
+    return None if window is None else front.nearest(x, y, agent_id, known.blocked(*window), window)
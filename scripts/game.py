@@ -10,13 +10,18 @@ import numpy as np
 
 from my_constants import *
 from gui import GUI
+import map_cache
+from spatial import GridIndex
+from recorder import FlightRecorder
 from time import sleep
 
 
 class Game:
     """ Handle the whole game """
-    def __init__(self, nb_agents, map_id):
+    def __init__(self, nb_agents, map_id, extended_sensor=0, headless=False, guarded_moves=False):
         self.nb_agents = nb_agents
+        self.extended_sensor = extended_sensor  #largest patch size served by GET_PATCH, 0 when the mode is off
+        self.guarded_moves = guarded_moves  #MOVE honours "guard": refused (without moving) when the cell entered holds more
         self.nb_ready = 0
         self.agent_id = 0
         self.moves = [(0, 0), (-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (1, -1), (-1, 1), (1, 1)]
@@ -24,8 +29,11 @@ class Game:
         self.game_over = False
         self.death_position = None
         self.death_agent = None
+        self.move_counts = np.zeros((nb_agents, len(PURPOSES)), dtype=int)  #moves of each agent per purpose (MOVE "purpose"), refused ones excluded
+        self.recorder = FlightRecorder(nb_agents)   #last messages of each agent, dumped by the server when something goes wrong
+        self.map_id = map_id
         self.load_map(map_id)
-        self.gui = GUI(self,cell_size=20)
+        self.gui = None if headless else GUI(self,cell_size=20)   #headless games (batched evaluation) have no window
         
 
     
@@ -35,22 +43,46 @@ class Game:
         with open(json_filename, "r") as json_file:
             self.map_cfg = json.load(json_file)[f"map_{map_id}"]        
         
-        self.agents, self.keys, self.boxes = [], [], []
+        # Entities are stored as columns (EntityStore), self.agents[i], self.keys[i]... are views on their row
+        cfg = lambda name: [self.map_cfg[f"{name}_{i+1}"] for i in range(self.nb_agents)]
+        self.agents = Agents([a["x"] for a in cfg("agent")], [a["y"] for a in cfg("agent")], [a["color"] for a in cfg("agent")])
+        self.keys = Items([k["x"] for k in cfg("key")], [k["y"] for k in cfg("key")], KEY_NEIGHBOUR_PERCENTAGE, "key")
+        self.boxes = Items([b["x"] for b in cfg("box")], [b["y"] for b in cfg("box")], BOX_NEIGHBOUR_PERCENTAGE, "box")
         for i in range(self.nb_agents):
-            self.agents.append(Agent(i+1, self.map_cfg[f"agent_{i+1}"]["x"], self.map_cfg[f"agent_{i+1}"]["y"], self.map_cfg[f"agent_{i+1}"]["color"]))
-            self.keys.append(Key(self.map_cfg[f"key_{i+1}"]["x"], self.map_cfg[f"key_{i+1}"]["y"]))
-            self.boxes.append(Box(self.map_cfg[f"box_{i+1}"]["x"], self.map_cfg[f"box_{i+1}"]["y"]))
             self.agent_paths[i] = [(self.agents[i].x, self.agents[i].y)]
         
         # Load walls
-        self.walls = []
-        wall_idx = 1
-        while f"wall_{wall_idx}" in self.map_cfg:
-            wall_cfg = self.map_cfg[f"wall_{wall_idx}"]
-            self.walls.append(Wall(wall_cfg["x"], wall_cfg["y"], wall_cfg.get("rotation", 0)))
-            wall_idx += 1
+        walls_cfg = []
+        while f"wall_{len(walls_cfg) + 1}" in self.map_cfg:
+            walls_cfg.append(self.map_cfg[f"wall_{len(walls_cfg) + 1}"])
+        self.walls = Walls([w["x"] for w in walls_cfg], [w["y"] for w in walls_cfg], [w.get("rotation", 0) for w in walls_cfg])
         
         self.map_w, self.map_h = self.map_cfg["width"], self.map_cfg["height"]
+
+        # Cells visited by each agent, as bitmaps (agent_paths keeps the order of the first visits)
+        self.trails = np.zeros((self.nb_agents, self.map_h, self.map_w), dtype=bool)
+        self.trails[np.arange(self.nb_agents), self.agents.y, self.agents.x] = True
+
+        artifacts = map_cache.load(self.map_cfg, self.nb_agents, self.build_map)    #memory-mapped once the map has been built
+        self.map_real = artifacts["map_real"]
+        self.wall_mask = artifacts["wall_mask"]
+        self.cell_kinds = artifacts["kinds"]
+        self.landmarks, self.landmark_dist = artifacts["landmarks"], artifacts["landmark_dist"]
+
+        # Spatial indexes of what the GUI draws, queried for the visible window: wall cells (over warning cells), items.
+        # The wall cells come from the cached grid in bulk, no loop over the walls
+        self.wall_index = GridIndex()
+        wall_kinds = artifacts["wall_kinds"]
+        wy, wx = np.nonzero(wall_kinds)
+        self.wall_index.update(wx, wy, wall_kinds[wy, wx])
+        self.item_index = GridIndex()
+        for items, item_type in ((self.keys, KEY_TYPE), (self.boxes, BOX_TYPE)):
+            for owner, pos in enumerate(items.positions().tolist()):
+                self.item_index.add(tuple(pos), (item_type, owner))
+
+
+    def build_map(self):
+        """ Compute the cell values of the map and its wall cells (see map_cache.load) """
         self.map_real = np.zeros(shape=(self.map_h, self.map_w))
         
         # First, add items (keys and boxes) to establish their zones
@@ -66,25 +98,42 @@ class Game:
                     else:
                         self.add_val(item.x, item.y, 1)
         
-        # Store item zones to check wall placement
-        self.item_zones = set()
+        # Store item zones (5x5 around each item) to check wall placement
+        item_zones = np.zeros(self.map_real.shape, dtype=bool)
         for item in items:
-            for sub_list in offsets:
-                for dx, dy in sub_list:
-                    self.item_zones.add((item.x + dx, item.y + dy))
+            item_zones[max(0, item.y - 2):item.y + 3, max(0, item.x - 2):item.x + 3] = True
         
-        # Add walls only on cells that are not in item zones
-        for wall in self.walls:
-            # Add warning zone (0.35) only on empty cells (not in item zones)
-            for wx, wy in wall.get_warning_zone():
-                if 0 <= wx < self.map_w and 0 <= wy < self.map_h:
-                    if (wx, wy) not in self.item_zones and self.map_real[wy, wx] == 0:
-                        self.map_real[wy, wx] = WALL_WARNING_PERCENTAGE
-            # Add wall cells (1.0) only on empty cells (not in item zones)
-            for wx, wy in wall.cells:
-                if 0 <= wx < self.map_w and 0 <= wy < self.map_h:
-                    if (wx, wy) not in self.item_zones:
-                        self.map_real[wy, wx] = WALL_VALUE
+        # Add walls only on cells that are not in item zones, all the walls at once: warning zones (0.35) on empty cells,
+        # then wall cells (1.0), which win over the warning zone of another wall
+        warning, cells = self.inside(self.walls.warning), self.inside(self.walls.cells)
+        free = ~item_zones[warning[:, 1], warning[:, 0]] & (self.map_real[warning[:, 1], warning[:, 0]] == 0)
+        self.map_real[warning[free, 1], warning[free, 0]] = WALL_WARNING_PERCENTAGE
+        free = ~item_zones[cells[:, 1], cells[:, 0]]
+        self.map_real[cells[free, 1], cells[free, 0]] = WALL_VALUE
+
+        # Cells that end the game: wall cells that were not overridden by an item zone
+        mask = np.zeros(self.map_real.shape, dtype=bool)
+        mask[cells[:, 1], cells[:, 0]] = True
+        mask &= self.map_real == WALL_VALUE
+        for item in items:
+            mask[item.y, item.x] = False
+
+        # Wall layout drawn by the GUI (game.wall_index): the walls over their warning zones, item zones or not
+        wall_kinds = np.zeros(self.map_real.shape, dtype=np.int8)
+        wall_kinds[warning[:, 1], warning[:, 0]] = map_cache.KIND_WARNING
+        wall_kinds[cells[:, 1], cells[:, 0]] = map_cache.KIND_WALL
+        return {"map_real": self.map_real, "wall_mask": mask, "items": np.array([(item.x, item.y) for item in items]), "wall_kinds": wall_kinds}
+
+
+    def inside(self, cells):
+        """ The (x, y) rows of an (..., 2) array of cells that lie on the map, as an (n, 2) array """
+        cells = cells.reshape(-1, 2)
+        return cells[(cells[:, 0] >= 0) & (cells[:, 0] < self.map_w) & (cells[:, 1] >= 0) & (cells[:, 1] < self.map_h)]
+
+    
+    def get_wall_mask(self):
+        """ Boolean (map_h, map_w) array of the cells that end the game when an agent moves on them """
+        return self.wall_mask
 
     
     def add_val(self, x, y, val):
@@ -94,33 +143,69 @@ class Game:
 
 
     def process(self, msg, agent_id):
-        """ Process data sent by agent whose id is specified """
+        """ Process data sent by agent whose id is specified, the flight recorder keeps a trace of it """
+        reply = self.answer(msg, agent_id)
+        if reply is not None and "rid" in msg:  #Agent.request matches its reply by this id, a late reply is not taken for the next one
+            reply["rid"] = msg["rid"]
+        agent = self.agents[agent_id]
+        cell_val = reply["cell_val"] if reply and "cell_val" in reply else self.map_real[agent.y, agent.x]   #MOVE and GET_DATA replies carry it
+        self.recorder.record(agent_id, msg, reply, agent.x, agent.y, cell_val)
+        return reply
+
+
+    def answer(self, msg, agent_id):
+        """ Reply to a request """
         self.agent_id = agent_id
         if msg["header"] == MOVE:
-            return self.handle_move(msg, agent_id)
+            reply = self.handle_move(msg, agent_id)
+            if "skipped" not in reply and "refused" not in reply:
+                purpose = msg.get("purpose", UNTAGGED)
+                if type(purpose) is not int or not 0 <= purpose < len(PURPOSES):  #a negative index would count under another purpose
+                    purpose = UNTAGGED
+                self.move_counts[agent_id, purpose] += 1
+            if "seq" in msg:    #pipelined move (pipeline.py): the agent matches the reply by this number
+                reply["seq"] = msg["seq"]
+            return reply
         elif msg["header"] == GET_DATA:
-            return {"sender": GAME_ID, "header": GET_DATA, "agent_id" : self.agent_id, "x": self.agents[agent_id].x, "y": self.agents[agent_id].y, "w": self.map_w, "h": self.map_h, "cell_val": self.map_real[self.agents[agent_id].y, self.agents[agent_id].x]}
+            return {"sender": GAME_ID, "header": GET_DATA, "agent_id" : self.agent_id, "x": self.agents[agent_id].x, "y": self.agents[agent_id].y, "w": self.map_w, "h": self.map_h, "cell_val": self.map_real[self.agents[agent_id].y, self.agents[agent_id].x], "patch_size": self.extended_sensor, "guarded_moves": self.guarded_moves}
         elif msg["header"] == GET_NB_CONNECTED_AGENTS:
             return {"sender": GAME_ID, "header": GET_NB_CONNECTED_AGENTS, "nb_connected_agents": self.nb_ready}
         elif msg["header"] == GET_NB_AGENTS:
             return {"sender": GAME_ID, "header": GET_NB_AGENTS, "nb_agents": self.nb_agents}
         elif msg["header"] == GET_ITEM_OWNER:
             return self.handle_item_owner_request(agent_id)
+        elif msg["header"] == GET_PATCH:
+            return self.handle_patch_request(msg, agent_id)
         
 
+    def move_summary(self):
+        """ Table of the moves of each agent per purpose, and of the whole team on this map """
+        used = [i for i in range(len(PURPOSES)) if self.move_counts[:, i].any()] or [EXPLORE]
+        lines = [f"Moves per purpose on map {self.map_id}:", f"{'agent':>6} " + " ".join(f"{PURPOSES[i]:>9}" for i in used) + f" {'total':>7}"]
+        rows = [(str(i+1), self.move_counts[i]) for i in range(self.nb_agents)] + [("all", self.move_counts.sum(axis=0))]
+        for name, counts in rows:
+            lines.append(f"{name:>6} " + " ".join(f"{counts[i]:>9}" for i in used) + f" {counts.sum():>7}")
+        return "\n".join(lines)
+
+
     def handle_move(self, msg, agent_id):
         """ Make sure the desired move is allowed and update the agent's position """
         if self.game_over:  # Don't process moves if game is over
             return {"sender": GAME_ID, "header": MOVE, "x": self.agents[agent_id].x, "y": self.agents[agent_id].y, "cell_val": self.map_real[self.agents[agent_id].y, self.agents[agent_id].x], "game_over": True}
         
+        x, y = self.agents[agent_id].x, self.agents[agent_id].y
+        if msg.get("max_cell_val") is not None and self.map_real[y, x] > msg["max_cell_val"]:  #conditional move, the previous step did not land on a clean cell
+            return {"sender": GAME_ID, "header": MOVE, "x": x, "y": y, "cell_val": self.map_real[y, x], "game_over": False, "skipped": True}
+
         if msg["direction"] in range(9):
             dx, dy = self.moves[msg["direction"]]
-            x, y = self.agents[agent_id].x, self.agents[agent_id].y
             new_x, new_y = x + dx, y + dy
             
             if 0 <= new_x < self.map_w and 0 <= new_y < self.map_h:
                 # Check if target cell is a wall (not an item)
                 target_val = self.map_real[new_y, new_x]
+                if self.guarded_moves and msg.get("guard") is not None and target_val > msg["guard"]:    #guarded move: report the value instead of entering
+                    return {"sender": GAME_ID, "header": MOVE, "x": x, "y": y, "cell_val": self.map_real[y, x], "game_over": False, "refused": True, "probe": target_val}
                 is_wall = target_val == WALL_VALUE and self._is_wall_cell(new_x, new_y)
                 
                 if is_wall:
@@ -132,69 +217,186 @@ class Game:
                     return {"sender": GAME_ID, "header": MOVE, "x": x, "y": y, "cell_val": self.map_real[y, x], "game_over": True, "death_pos": (new_x, new_y)}
                 else:
                     self.agents[agent_id].x, self.agents[agent_id].y = new_x, new_y
-                    if (self.agents[agent_id].x, self.agents[agent_id].y) not in self.agent_paths[agent_id]:
-                        self.agent_paths[agent_id].append((self.agents[agent_id].x, self.agents[agent_id].y))
+                    if not self.trails[agent_id, new_y, new_x]:
+                        self.trails[agent_id, new_y, new_x] = True
+                        self.agent_paths[agent_id].append((new_x, new_y))
         return {"sender": GAME_ID, "header": MOVE, "x": self.agents[agent_id].x, "y": self.agents[agent_id].y, "cell_val": self.map_real[self.agents[agent_id].y, self.agents[agent_id].x], "game_over": False}
     
     def _is_wall_cell(self, x, y):
-        """Check if position (x,y) is a wall cell (not an item)"""
-        # Check if it's a key or box position
-        for key in self.keys:
-            if key.x == x and key.y == y:
-                return False
-        for box in self.boxes:
-            if box.x == x and box.y == y:
-                return False
-        # Check if it's in any wall's cells
-        for wall in self.walls:
-            if (x, y) in wall.cells:
-                return True
-        return False
+        """Check if position (x,y) is a wall cell (not an item): one lookup in the wall mask, whatever the number of walls"""
+        return bool(self.wall_mask[y, x])
 
 
 
     def handle_item_owner_request(self, agent_id):
         if self.map_real[self.agents[agent_id].y, self.agents[agent_id].x] != 1.0:  #make sure the agent is located on an item
             return {"sender": GAME_ID, "header": GET_ITEM_OWNER, "owner": None}
-        for i, key in enumerate(self.keys): #check if it's a key
-            if (self.agents[agent_id].x == key.x) and (self.agents[agent_id].y == key.y):
-                return  {"sender": GAME_ID, "header": GET_ITEM_OWNER, "owner": i, "type": KEY_TYPE}
-        for i, box in enumerate(self.boxes):    #check if it's a box
-            if (self.agents[agent_id].x == box.x) and (self.agents[agent_id].y == box.y):
-                return  {"sender": GAME_ID, "header": GET_ITEM_OWNER, "owner": i, "type": BOX_TYPE}
+        x, y = self.agents[agent_id].x, self.agents[agent_id].y
+        for items, item_type in ((self.keys, KEY_TYPE), (self.boxes, BOX_TYPE)):   #check if it's a key, then a box
+            owner = items.find(x, y)
+            if owner is not None:
+                return  {"sender": GAME_ID, "header": GET_ITEM_OWNER, "owner": owner, "type": item_type}
+
+
+    def handle_patch_request(self, msg, agent_id):
+        """
+        Send the k x k window of map_real centered on the agent (clipped to the map) as raw bytes.
+        A window centered on a cell has an odd size: an even k is rounded up, then k is capped at the largest odd size
+        allowed (server.py -es), the reply reports the k served
+        """
+        k = msg.get("k", 3)
+        if not self.extended_sensor or type(k) is not int or k < 1:
+            return {"sender": GAME_ID, "header": GET_PATCH, "patch": None}
+        k = min(k | 1, self.extended_sensor - 1 + self.extended_sensor % 2)
+        r = k // 2
+        x, y = self.agents[agent_id].x, self.agents[agent_id].y
+        x0, y0 = max(0, x - r), max(0, y - r)
+        patch = self.map_real[y0:y + r + 1, x0:x + r + 1]   #basic slicing returns a view, the only copy is the serialization
+        return {"sender": GAME_ID, "header": GET_PATCH, "k": k, "x0": x0, "y0": y0, "shape": patch.shape, "dtype": patch.dtype.str, "patch": patch.tobytes()}
+
+
+class EntityStore:
+    """
+    Entities of one kind stored as a struct of arrays: one numpy column per attribute ("x", "y"...), one row per entity.
+    store[i] is a thin view on row i (EntityView), created when asked: no Python object per entity is kept around.
+    """
+    view = None     #EntityView subclass of the rows
+
+    def __init__(self, x, y):
+        self.x = np.array(x, dtype=int)
+        self.y = np.array(y, dtype=int)
+
+    def __len__(self):
+        return len(self.x)
+
+    def __getitem__(self, i):
+        if not -len(self) <= i < len(self):
+            raise IndexError(f"{type(self).__name__} index out of range")
+        return self.view.of(self, i % len(self))
+
+    def __iter__(self):
+        return (self.view.of(self, i) for i in range(len(self)))
+
+    def positions(self):
+        """ (n, 2) array of the (x, y) of the entities """
+        return np.stack((self.x, self.y), axis=1)
+
+    def find(self, x, y):
+        """ Row of the first entity at (x, y), None if there is none """
+        rows = np.flatnonzero((self.x == x) & (self.y == y))
+        return int(rows[0]) if len(rows) else None
+
+
+class EntityView:
+    """ Row of an EntityStore, reading and writing its columns (plain Python values, as the messages carry them) """
+    __slots__ = ("store", "index")
+
+    @classmethod
+    def of(cls, store, index):
+        view = cls.__new__(cls)
+        view.store, view.index = store, index
+        return view
+
+    @property
+    def x(self):
+        return int(self.store.x[self.index])
 
+    @x.setter
+    def x(self, value):
+        self.store.x[self.index] = value
+
+    @property
+    def y(self):
+        return int(self.store.y[self.index])
+
+    @y.setter
+    def y(self, value):
+        self.store.y[self.index] = value
+
+
+class Agent(EntityView):
+    __slots__ = ()
 
-class Agent:
     def __init__(self, id, x, y, color):
-        self.id = id
-        self.x, self.y = x, y
-        self.color = color
+        self.store, self.index = Agents([x], [y], [color], [id]), 0
+
+    @property
+    def id(self):
+        return self.store.ids[self.index]
+
+    @property
+    def color(self):
+        return self.store.colors[self.index]
 
     def __repr__(self):
         return f"Agent's id: {self.id}, x: {self.x}, y: {self.y}, color: {self.color}"
     
 
-class Item:
+class Item(EntityView):
+    __slots__ = ()
+
     def __init__(self, x, y, neighbor_percent, type):
-        self.x, self.y = x, y
-        self.neighbour_percent = neighbor_percent
-        self.type = type
+        self.store, self.index = Items([x], [y], neighbor_percent, type), 0
+
+    @property
+    def neighbour_percent(self):
+        return self.store.neighbour_percent
+
+    @property
+    def type(self):
+        return self.store.type
 
     def __repr__(self):
         return f"type: {self.type}, x: {self.x}, y: {self.y}"
 
 
 class Key(Item):
+    __slots__ = ()
+
     def __init__(self, x, y):
         Item.__init__(self, x, y, KEY_NEIGHBOUR_PERCENTAGE, "key")
     
 
 class Box(Item):
+    __slots__ = ()
+
     def __init__(self, x, y):
         Item.__init__(self, x, y, BOX_NEIGHBOUR_PERCENTAGE, "box")
 
 
-class Wall:
+class Agents(EntityStore):
+    """ The agent of row i has id i + 1 unless 'ids' says otherwise """
+    view = Agent
+
+    def __init__(self, x, y, colors, ids=None):
+        EntityStore.__init__(self, x, y)
+        self.colors = list(colors)
+        self.ids = list(ids) if ids is not None else list(range(1, len(self.x) + 1))
+
+
+class Items(EntityStore):
+    """ Keys or boxes: the item of row i belongs to agent i. Their rows are Key or Box views """
+    views = {"key": Key, "box": Box}
+
+    def __init__(self, x, y, neighbour_percent, type):
+        EntityStore.__init__(self, x, y)
+        self.neighbour_percent = neighbour_percent
+        self.type = type
+        self.view = self.views.get(type, Item)
+
+
+# Cells of the L-shaped walls relative to (x, y), per rotation (see Wall)
+WALL_OFFSETS = np.array([
+    [(0, 0), (1, 0), (2, 0), (0, 1), (0, 2)],   # Top row + left column
+    [(0, 0), (1, 0), (2, 0), (2, 1), (2, 2)],   # Top row + right column
+    [(0, 0), (0, 1), (0, 2), (1, 2), (2, 2)],   # Bottom row + left column
+    [(2, 0), (2, 1), (0, 2), (1, 2), (2, 2)]])  # Bottom row + right column
+# Their warning zones: the 8 neighbours of the wall cells that are not wall cells (same count for every rotation)
+WARNING_OFFSETS = np.array([sorted({(cx + dx, cy + dy) for cx, cy in cells.tolist() for dx in (-1, 0, 1) for dy in (-1, 0, 1)}
+                                   - {tuple(c) for c in cells.tolist()}) for cells in WALL_OFFSETS])
+
+
+class Wall(EntityView):
     """
     L-shaped wall (5 cells in a 3x3 grid) with a warning zone around it.
     Rotation determines the orientation of the L:
@@ -211,49 +413,50 @@ class Wall:
            █
          ███
     """
+    __slots__ = ()
+
     def __init__(self, x, y, rotation=0):
-        self.x, self.y = x, y
-        self.rotation = rotation
-        self.cells = self._get_cells()  # The 5 wall cells
-    
-    def _get_cells(self):
-        """Get the 5 cell positions of the L-shape based on rotation"""
-        # Each L-shape is made of 5 cells in a 3x3 grid
-        if self.rotation == 0:  # Top row + left column
-            return [
-                (self.x, self.y), (self.x + 1, self.y), (self.x + 2, self.y),  # top row
-                (self.x, self.y + 1), (self.x, self.y + 2)  # left column
-            ]
-        elif self.rotation == 1:  # Top row + right column
-            return [
-                (self.x, self.y), (self.x + 1, self.y), (self.x + 2, self.y),  # top row
-                (self.x + 2, self.y + 1), (self.x + 2, self.y + 2)  # right column
-            ]
-        elif self.rotation == 2:  # Bottom row + left column
-            return [
-                (self.x, self.y), (self.x, self.y + 1),  # left column
-                (self.x, self.y + 2), (self.x + 1, self.y + 2), (self.x + 2, self.y + 2)  # bottom row
-            ]
-        elif self.rotation == 3:  # Bottom row + right column
-            return [
-                (self.x + 2, self.y), (self.x + 2, self.y + 1),  # right column
-                (self.x, self.y + 2), (self.x + 1, self.y + 2), (self.x + 2, self.y + 2)  # bottom row
-            ]
-        return []
-    
+        self.store, self.index = Walls([x], [y], [rotation]), 0
+
+    @property
+    def rotation(self):
+        return int(self.store.rotation[self.index])
+
+    @property
+    def cells(self):
+        """ The 5 wall cells """
+        return [tuple(c) for c in self.store.cells[self.index].tolist()]
+
     def get_warning_zone(self):
-        """Get all cells around the L-shape for warning zone"""
-        warning = set()
-        for cx, cy in self.cells:
-            # Add all 8 neighbors
-            for dx in [-1, 0, 1]:
-                for dy in [-1, 0, 1]:
-                    if dx == 0 and dy == 0:
-                        continue
-                    neighbor = (cx + dx, cy + dy)
-                    if neighbor not in self.cells:
-                        warning.add(neighbor)
-        return warning
-    
+        """ All cells around the L-shape for warning zone """
+        return {tuple(c) for c in self.store.warning[self.index].tolist()}
+
     def __repr__(self):
-        return f"Wall at ({self.x}, {self.y}) rotation={self.rotation}"
\ No newline at end of file
+        return f"Wall at ({self.x}, {self.y}) rotation={self.rotation}"
+
+
+class Walls(EntityStore):
+    """ L-shaped walls: their cells and warning zones are computed once for all of them, as (n, k, 2) arrays """
+    view = Wall
+
+    def __init__(self, x, y, rotation):
+        EntityStore.__init__(self, x, y)
+        self.rotation = np.array(rotation, dtype=int)
+        if ((self.rotation < 0) | (self.rotation >= len(WALL_OFFSETS))).any():
+            raise ValueError(f"Wall rotations are 0 to {len(WALL_OFFSETS) - 1}")
+        origin = self.positions()[:, None, :]
+        self.cells = origin + WALL_OFFSETS[self.rotation]
+        self.warning = origin + WARNING_OFFSETS[self.rotation]
+        self._cell_list = self._warning_list = None
+
+    def cell_list(self):
+        """ Cells of all the walls, as (x, y) tuples (cached) """
+        if self._cell_list is None:
+            self._cell_list = [tuple(c) for c in np.unique(self.cells.reshape(-1, 2), axis=0).tolist()]
+        return self._cell_list
+
+    def warning_list(self):
+        """ Cells of all the warning zones, as (x, y) tuples (cached). A cell can be a wall cell of another wall """
+        if self._warning_list is None:
+            self._warning_list = [tuple(c) for c in np.unique(self.warning.reshape(-1, 2), axis=0).tolist()]
+        return self._warning_list
@@ -5,9 +5,16 @@ __license__ = "Apache License 2.0"
 __version__ = "1.0.0"
 
 import pygame, os
+import numpy as np
 from my_constants import * 
+from map_cache import KIND_WALL
 
 img_folder = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "resources", "img")
+MAX_SCREEN = (1280, 880)    #largest map area of the window (pixels), larger maps are viewed through a camera
+LOD_ZOOM = 6    #below this many pixels per cell, the view is drawn as an image of the map (one color per cell or block of cells)
+MAX_ZOOM = 64
+WALL_COLOR, WARNING_COLOR = (80, 80, 80), (200, 200, 200)
+PURPOSE_COLORS = [(70, 160, 230), (240, 200, 60), (230, 120, 40), (200, 60, 60), (80, 200, 110), (150, 150, 150)]  #bar of the moves per purpose, PURPOSES order
 
 
 class GUI:
@@ -17,8 +24,22 @@ class GUI:
         self.fps = fps
         self.clock = pygame.time.Clock()
         self.cell_size = cell_size
+        self.font_size = 2*cell_size
         self.header_height = 40  # Height for step counter display
-        self.screen_res = (self.w*cell_size, self.h*cell_size + self.header_height)      
+        self.map_res = (min(self.w*cell_size, MAX_SCREEN[0]), min(self.h*cell_size, MAX_SCREEN[1]))
+        self.screen_res = (self.map_res[0], self.map_res[1] + self.header_height)
+        # Camera: top left cell of the view and pixels per cell. The whole map is seen at first
+        self.cam_x, self.cam_y = 0, 0
+        self.zoom = cell_size if (self.w*cell_size, self.h*cell_size) == self.map_res else self.fit_zoom()
+        self.update_view()
+        self.sprites = {}   # cell size -> scaled images
+        # Zoomed out view (draw_image), color codes by priority: empty, warning, wall, trail of each agent, items of each agent
+        colors = [self.game.agents[i].color for i in range(self.game.nb_agents)]
+        self.lod_palette = np.array([BG_COLOR, WARNING_COLOR, WALL_COLOR] + colors + [[c // 2 for c in color] for color in colors], dtype=np.uint8)
+        self.lod_codes = np.zeros((self.h, self.w), dtype=np.uint8)  # Codes of the static cells, from map_real
+        self.lod_codes[self.game.map_real == WALL_WARNING_PERCENTAGE] = 1
+        self.lod_codes[self.game.get_wall_mask()] = 2
+        self.lod_blocks = {}    # cells per block -> (block codes, path cells applied per agent), see block_codes
 
 
     def on_init(self):
@@ -31,6 +52,10 @@ class GUI:
 
 
     def create_items(self):
+        """ Images of the items and agents at the current cell size (scaled once per cell size) """
+        if self.cell_size in self.sprites:
+            self.boxes, self.keys, self.text_agents, self.agents = self.sprites[self.cell_size]
+            return
         #box
         box_img = pygame.image.load(img_folder + "/box.png")
         box_img = pygame.transform.scale(box_img, (self.cell_size, self.cell_size))
@@ -46,11 +71,58 @@ class GUI:
         agent_img = pygame.image.load(img_folder + "/robot.png")
         agent_img = pygame.transform.scale(agent_img, (self.cell_size, self.cell_size))
         self.agents = [agent_img.copy() for _ in range(self.game.nb_agents)]
+        self.sprites[self.cell_size] = self.boxes, self.keys, self.text_agents, self.agents
 
     
     def on_event(self, event):
+        """ Quit, and the camera: arrows scroll, +/- or the mouse wheel zoom (around the cursor), 0 shows the whole map """
         if event.type == pygame.QUIT:
             self.running = False
+        elif event.type == pygame.MOUSEWHEEL:
+            mx, my = pygame.mouse.get_pos()
+            self.zoom_at(2 ** event.y, mx, my - self.header_height)
+        elif event.type == pygame.KEYDOWN:
+            step_x, step_y = max(1, (self.view[2] - self.view[0]) // 4), max(1, (self.view[3] - self.view[1]) // 4)
+            moves = {pygame.K_LEFT: (-step_x, 0), pygame.K_RIGHT: (step_x, 0), pygame.K_UP: (0, -step_y), pygame.K_DOWN: (0, step_y)}
+            if event.key in moves:
+                self.cam_x += moves[event.key][0]
+                self.cam_y += moves[event.key][1]
+                self.update_view()
+            elif event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+                self.zoom_at(2, self.map_res[0] // 2, self.map_res[1] // 2)
+            elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                self.zoom_at(0.5, self.map_res[0] // 2, self.map_res[1] // 2)
+            elif event.key in (pygame.K_0, pygame.K_KP0):
+                self.cam_x, self.cam_y, self.zoom = 0, 0, self.fit_zoom()
+                self.update_view()
+
+
+    def fit_zoom(self):
+        """ Pixels per cell showing the whole map """
+        return min(self.map_res[0] / self.w, self.map_res[1] / self.h)
+
+
+    def zoom_at(self, factor, px, py):
+        """ Multiply the zoom by 'factor', the cell under the pixel (px, py) of the map area stays under it """
+        zoom = min(MAX_ZOOM, max(min(self.zoom, self.fit_zoom()), self.zoom * factor))   #no further out than the whole map
+        cx, cy = self.cam_x + px / self.zoom, self.cam_y + py / self.zoom
+        self.zoom = zoom
+        self.cam_x, self.cam_y = int(cx - px / zoom), int(cy - py / zoom)
+        self.update_view()
+
+
+    def update_view(self):
+        """ Clamp the camera to the map and compute the visible window, and the cell size when cells are drawn one by one """
+        if self.zoom >= LOD_ZOOM:
+            self.zoom = int(self.zoom)
+        view_w, view_h = min(self.w, -(-self.map_res[0] // self.zoom)), min(self.h, -(-self.map_res[1] // self.zoom))
+        self.cam_x = int(min(max(0, self.cam_x), self.w - view_w))
+        self.cam_y = int(min(max(0, self.cam_y), self.h - view_h))
+        self.view = (self.cam_x, self.cam_y, self.cam_x + int(view_w), self.cam_y + int(view_h))
+        if self.zoom >= LOD_ZOOM and int(self.zoom) != self.cell_size:
+            self.cell_size = int(self.zoom)
+            if hasattr(self, "screen"):
+                self.create_items()
 
     
     def on_cleanup(self):
@@ -71,6 +143,29 @@ class GUI:
             pass
     
 
+    def draw_purpose_bar(self, agent_id, x, y, width, height):
+        """ Moves of an agent split by purpose (Game.move_counts), one colored segment per purpose """
+        counts = self.game.move_counts[agent_id]
+        total = counts.sum()
+        if total == 0:
+            return
+        start = 0
+        for purpose, count in enumerate(counts):
+            end = start + count
+            pygame.draw.rect(self.screen, PURPOSE_COLORS[purpose], (x + width * start // total, y, width * end // total - width * start // total, height))
+            start = end
+
+
+    def cell_rect(self, x, y, min_size=1):
+        """ Screen rectangle of the map cell (x, y), at least min_size pixels wide when zoomed out """
+        size = max(min_size, round(self.zoom))
+        return (round((x - self.view[0])*self.zoom), round((y - self.view[1])*self.zoom) + self.header_height, size, size)
+
+
+    def visible(self, x, y):
+        return self.view[0] <= x < self.view[2] and self.view[1] <= y < self.view[3]
+
+
     def draw(self):
         self.screen.fill(BG_COLOR)
         
@@ -88,59 +183,28 @@ class GUI:
             color = self.game.agents[i].color
             text = header_font.render(f"Agent {i+1}: {step_count} steps", True, color)
             x_pos = i * section_width + section_width // 2 - text.get_width() // 2
-            self.screen.blit(text, (x_pos, self.header_height // 2 - text.get_height() // 2))
+            self.screen.blit(text, (x_pos, self.header_height // 2 - text.get_height() // 2 - 3))
+            self.draw_purpose_bar(i, i * section_width + 8, self.header_height - 9, section_width - 16, 5)
         
         # Draw separator line under header
         pygame.draw.line(self.screen, (100, 100, 100), (0, self.header_height - 1), (self.screen_res[0], self.header_height - 1), 2)
-        
-        # Draw walls and warning zones
-        for wall in self.game.walls:
-            # Warning zone (light gray)
-            for wx, wy in wall.get_warning_zone():
-                if 0 <= wx < self.w and 0 <= wy < self.h:
-                    pygame.draw.rect(self.screen, (200, 200, 200), (wx*self.cell_size, wy*self.cell_size + y_offset, self.cell_size, self.cell_size))
-            # Wall cells (dark gray)
-            for wx, wy in wall.cells:
-                if 0 <= wx < self.w and 0 <= wy < self.h:
-                    pygame.draw.rect(self.screen, (80, 80, 80), (wx*self.cell_size, wy*self.cell_size + y_offset, self.cell_size, self.cell_size))
-        
-        #Grid
-        for i in range(1, self.h):
-            pygame.draw.line(self.screen, BLACK, (0, i*self.cell_size + y_offset), (self.w*self.cell_size, i*self.cell_size + y_offset))
-        for j in range(1, self.w):
-            pygame.draw.line(self.screen, BLACK, (j*self.cell_size, y_offset), (j*self.cell_size, self.h*self.cell_size + y_offset))
 
-        for i in range(self.game.nb_agents):
-            #agent_paths
-            for x, y in self.game.agent_paths[i]:
-                pygame.draw.rect(self.screen, self.game.agents[i].color, (x*self.cell_size, y*self.cell_size + y_offset, self.cell_size, self.cell_size))
-
-        for i in range(self.game.nb_agents):            
-            #keys
-            key_y = self.game.keys[i].y*self.cell_size + y_offset
-            pygame.draw.rect(self.screen, self.game.agents[i].color, (self.game.keys[i].x*self.cell_size, key_y, self.cell_size, self.cell_size), width=3)
-            self.screen.blit(self.keys[i], self.keys[i].get_rect(topleft=(self.game.keys[i].x*self.cell_size, key_y)))
-            
-            #boxes
-            box_y = self.game.boxes[i].y*self.cell_size + y_offset
-            pygame.draw.rect(self.screen, self.game.agents[i].color, (self.game.boxes[i].x*self.cell_size, box_y, self.cell_size, self.cell_size), width=3)
-            self.screen.blit(self.boxes[i], self.boxes[i].get_rect(topleft=(self.game.boxes[i].x*self.cell_size, box_y)))
-            
-            #agents
-            agent_center_y = self.game.agents[i].y*self.cell_size + self.cell_size//2 + y_offset
-            self.screen.blit(self.agents[i], self.agents[i].get_rect(center=(self.game.agents[i].x*self.cell_size + self.cell_size//2, agent_center_y)))
-            self.screen.blit(self.text_agents[i], self.text_agents[i].get_rect(center=(self.game.agents[i].x*self.cell_size + self.cell_size-self.text_agents[i].get_width()//2, self.game.agents[i].y*self.cell_size + self.text_agents[i].get_height()//2 + y_offset)))
+        # The cells one by one when they are large enough, an image of the view otherwise: the cost follows the window size
+        if self.zoom >= LOD_ZOOM:
+            self.draw_cells()
+        else:
+            self.draw_image()
 
         # Draw red cross if game over
         if self.game.game_over and self.game.death_position:
-            dx, dy = self.game.death_position
-            x, y = dx * self.cell_size, dy * self.cell_size + y_offset
-            # Draw a big red X on the wall cell where agent died
-            pygame.draw.line(self.screen, RED, (x + 2, y + 2), (x + self.cell_size - 2, y + self.cell_size - 2), 4)
-            pygame.draw.line(self.screen, RED, (x + self.cell_size - 2, y + 2), (x + 2, y + self.cell_size - 2), 4)
+            if self.visible(*self.game.death_position):
+                x, y, size, _ = self.cell_rect(*self.game.death_position, min_size=8)
+                # Draw a big red X on the wall cell where agent died
+                pygame.draw.line(self.screen, RED, (x + 2, y + 2), (x + size - 2, y + size - 2), 4)
+                pygame.draw.line(self.screen, RED, (x + size - 2, y + 2), (x + 2, y + size - 2), 4)
             
             # Draw "GAME OVER" text in center of screen
-            font = pygame.font.SysFont("Arial", self.cell_size * 2, True)
+            font = pygame.font.SysFont("Arial", self.font_size, True)
             text = font.render("GAME OVER", True, RED)
             text_rect = text.get_rect(center=(self.screen_res[0] // 2, (self.screen_res[1] + y_offset) // 2))
             # Draw black background for text
@@ -148,4 +212,85 @@ class GUI:
             pygame.draw.rect(self.screen, BLACK, bg_rect)
             self.screen.blit(text, text_rect)
 
-        pygame.display.update()
\ No newline at end of file
+        pygame.display.update()
+
+
+    def draw_cells(self):
+        """ The visible window cell by cell: walls, grid, trails, items and agents """
+        # Draw walls (dark gray) and warning zones (light gray) of the visible window (game.wall_index)
+        for (wx, wy), kind in self.game.wall_index.window(*self.view):
+            pygame.draw.rect(self.screen, WALL_COLOR if kind == KIND_WALL else WARNING_COLOR, self.cell_rect(wx, wy))
+        
+        #Grid
+        x0, y0, x1, y1 = self.view
+        y_offset = self.header_height
+        width, height = (x1 - x0)*self.cell_size, (y1 - y0)*self.cell_size
+        for i in range(1, y1 - y0):
+            pygame.draw.line(self.screen, BLACK, (0, i*self.cell_size + y_offset), (width, i*self.cell_size + y_offset))
+        for j in range(1, x1 - x0):
+            pygame.draw.line(self.screen, BLACK, (j*self.cell_size, y_offset), (j*self.cell_size, height + y_offset))
+
+        for i in range(self.game.nb_agents):
+            #agent_paths, from the trail bitmap of the visible window
+            ys, xs = np.nonzero(self.game.trails[i, y0:y1, x0:x1])
+            for x, y in zip((xs + x0).tolist(), (ys + y0).tolist()):
+                pygame.draw.rect(self.screen, self.game.agents[i].color, self.cell_rect(x, y))
+
+        #keys and boxes of the visible window (game.item_index)
+        for (x, y), (item_type, owner) in self.game.item_index.window(*self.view):
+            rect = self.cell_rect(x, y)
+            img = (self.keys if item_type == KEY_TYPE else self.boxes)[owner]
+            pygame.draw.rect(self.screen, self.game.agents[owner].color, rect, width=3)
+            self.screen.blit(img, img.get_rect(topleft=rect[:2]))
+
+        for i in range(self.game.nb_agents):
+            #agents
+            agent = self.game.agents[i]
+            if not self.visible(agent.x, agent.y):
+                continue
+            ax, ay = self.cell_rect(agent.x, agent.y)[:2]
+            self.screen.blit(self.agents[i], self.agents[i].get_rect(center=(ax + self.cell_size//2, ay + self.cell_size//2)))
+            self.screen.blit(self.text_agents[i], self.text_agents[i].get_rect(center=(ax + self.cell_size-self.text_agents[i].get_width()//2, ay + self.text_agents[i].get_height()//2)))
+
+
+    def block_codes(self, k):
+        """
+        Color codes (lod_palette) of the map reduced to blocks of k x k cells: the most important thing of a block wins
+        (items, then trails, walls, warning zones). Built once per k, then only the cells visited since are applied.
+        """
+        n = self.game.nb_agents
+        if k not in self.lod_blocks:
+            codes = self.lod_codes.copy()
+            for i in range(n):
+                codes[self.game.trails[i]] = np.maximum(codes[self.game.trails[i]], 3 + i)
+            for (x, y), (item_type, owner) in self.game.item_index.window(0, 0, self.w, self.h):
+                codes[y, x] = 3 + n + owner
+            h, w = codes.shape
+            codes = np.pad(codes, ((0, -h % k), (0, -w % k))).reshape(-(-h // k), k, -(-w // k), k).max(axis=(1, 3))
+            self.lod_blocks[k] = codes, [0]*n
+        codes, seen = self.lod_blocks[k]
+        for i, path in enumerate(self.game.agent_paths):
+            for x, y in path[seen[i]:]:
+                codes[y // k, x // k] = max(codes[y // k, x // k], 3 + i)
+            seen[i] = len(path)
+        return codes
+
+
+    def draw_image(self):
+        """ Zoomed out: the visible window as an image (pygame.surfarray), one pixel per block of cells, scaled to the window """
+        x0, y0, x1, y1 = self.view
+        k = max(1, int(np.ceil(1 / self.zoom)))  #cells per block: never more blocks than pixels
+        bx0, by0, bx1, by1 = x0 // k, y0 // k, -(-x1 // k), -(-y1 // k)
+        pixels = self.lod_palette[self.block_codes(k)[by0:by1, bx0:bx1]]
+        surface = pygame.surfarray.make_surface(pixels.transpose(1, 0, 2))     #surfarray is indexed [x, y]
+        scale = k * self.zoom   #pixels per block
+        surface = pygame.transform.scale(surface, (round((bx1 - bx0) * scale), round((by1 - by0) * scale)))
+        self.screen.blit(surface, (round((bx0 * k - x0) * self.zoom), self.header_height + round((by0 * k - y0) * self.zoom)))
+
+        for i in range(self.game.nb_agents):
+            #agents, as squares of their color
+            agent = self.game.agents[i]
+            if self.visible(agent.x, agent.y):
+                rect = pygame.Rect(self.cell_rect(agent.x, agent.y, min_size=5))
+                pygame.draw.rect(self.screen, agent.color, rect)
+                pygame.draw.rect(self.screen, BLACK, rect, width=1)
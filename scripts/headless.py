@@ -0,0 +1,104 @@
+"""
+Headless engine: run the agents of main.py against a Game in the same process, without sockets nor GUI.
+Used to evaluate strategies quickly (tuner.py, benchmarks).
+"""
+
+import contextlib, io, time
+from threading import Thread, Lock
+from queue import Queue
+from my_constants import *
+from game import Game
+from agent import Agent
+
+
+class LocalNetwork:
+    """ In-process stand-in for Network: requests are handed to a LocalServer, replies and pushes are queued """
+    def __init__(self, server, client_id):
+        self.server = server
+        self.id = client_id
+        self.inbox = Queue()
+
+    def send(self, data):
+        self.server.handle(self.id, data)
+
+    def receive(self):
+        return self.inbox.get()
+
+
+class LocalServer:
+    """ Same role as Server (replies, broadcasts, GAME_START/GAME_OVER pushes) for agents living in this process """
+    def __init__(self, nb_agents, map_id, extended_sensor=0, guarded_moves=False):
+        self.game = Game(nb_agents, map_id, extended_sensor, headless=True, guarded_moves=guarded_moves)
+        self.nb_agents = nb_agents
+        self.networks = []
+        self.lock = Lock()
+        self.moves = [0] * nb_agents    #moves requested by each agent (refused conditional and guarded moves excluded)
+
+
+    def connect(self):
+        """ Create the network of the next agent, the game starts once all of them are connected """
+        with self.lock:
+            network = LocalNetwork(self, len(self.networks))
+            self.networks.append(network)
+            self.game.nb_ready += 1
+        if self.game.nb_ready == self.nb_agents:
+            self.push({"sender": GAME_ID, "header": GAME_START, "nb_agents": self.nb_agents, "nb_connected_agents": self.nb_agents})
+        return network
+
+
+    def handle(self, client_id, msg):
+        with self.lock:
+            if msg["header"] == BROADCAST_MSG:
+                msg = dict(msg, sender=client_id)
+                for network in self.networks:
+                    if network.id != client_id:
+                        network.inbox.put(msg)
+                return
+            was_over = self.game.game_over
+            reply = self.game.process(msg, client_id)
+            if msg["header"] == MOVE and not reply.get("skipped") and not reply.get("refused"):
+                self.moves[client_id] += 1
+        self.networks[client_id].inbox.put(reply)
+        if self.game.game_over and not was_over:
+            self.push({"sender": GAME_ID, "header": GAME_OVER, "agent_id": self.game.death_agent, "death_pos": self.game.death_position})
+
+
+    def push(self, msg):
+        for network in self.networks:
+            network.inbox.put(msg)
+
+
+def run_episode(map_id, nb_agents, max_moves=5000, timeout=120, extended_sensor=0, quiet=True, strategy="sweep", guarded_moves=False):
+    """
+    Play one game with an exploration strategy of main.py (main.STRATEGIES, main.PARAMS applies). The episode stops at game over, once every agent
+    completed, or when an agent requested 'max_moves' moves or after 'timeout' seconds (then the agents are stopped).
+    Returns a dict: steps (total moves), makespan (moves of the busiest agent), completed (nb agents), game_over, timed_out,
+    purposes (moves of the team per purpose, my_constants.PURPOSES).
+    """
+    import main, planner, frontier
+    planner.reset()
+    frontier.reset()
+    out = io.StringIO() if quiet else None
+    with contextlib.redirect_stdout(out) if quiet else contextlib.nullcontext():
+        server = LocalServer(nb_agents, map_id, extended_sensor, guarded_moves)
+        agents = [Agent("localhost", wait_for_start=False, network=server.connect()) for _ in range(nb_agents)]
+        for agent in agents:
+            agent.wait_for_connected_agent()
+        threads = [Thread(target=main.agent_loop, args=(agent, main.STRATEGIES[strategy]), daemon=True) for agent in agents]
+        for t in threads:
+            t.start()
+        deadline = time.time() + timeout
+        timed_out = False
+        while any(t.is_alive() for t in threads):
+            if max(server.moves) >= max_moves or time.time() > deadline:
+                timed_out = True
+                for agent in agents:    #move() and every strategy loop give up on completed agents
+                    agent.completed = True
+            threads[0].join(0.05)
+        completed = sum(agent.has_key and agent.has_box for agent in agents)
+        for agent in agents:    #let the msg_cb threads return
+            agent.running = False
+            agent.network.inbox.put({"sender": GAME_ID, "header": None})
+    return {"steps": sum(server.moves), "makespan": max(server.moves), "completed": completed,
+            "game_over": server.game.game_over, "timed_out": timed_out and not server.game.game_over,
+            "purposes": dict(zip(PURPOSES, server.game.move_counts.sum(axis=0).tolist()))}
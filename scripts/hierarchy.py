@@ -0,0 +1,323 @@
+"""
+Hierarchical planning over a planner.KnownMap for large maps (HPA*).
+The map is cut into SIZE x SIZE clusters. Where two neighbouring clusters have free cells face to face along their
+border, the pair of cells is a transition (one in the middle of each run of such cells, the two ends of a long run).
+Two cells only meeting diagonally across the border are a transition too, when neither has a free cell facing it.
+The transitions of a cluster are the nodes of the abstract graph, linked by the length of the shortest path between them
+inside the cluster, and to the cell facing them across the border (1 move).
+A route is searched over this graph (A*, a few nodes per cluster instead of every cell), then refined cluster by cluster
+into cells, only up to HORIZON cells ahead: the agent plans again from there, with what it learnt on the way.
+The rest of the route is kept for that next call, so successive partial paths follow one route instead of searching a new
+one from the middle of a cluster (which could lead back and forth between two routes). It is searched again only when one
+of its segments got blocked.
+Clusters are built when a search first reaches them and dropped when the blocked status of a cell around them changes
+(KnownMap.changes): discovering a wall costs the rebuild of a few clusters, whatever the size of the map.
+A cluster without any blocked cell (most of an unexplored map) needs no search: its distances are Chebyshev distances.
+The same graph picks exploration tiles: nearest_tile returns the closest cluster, by route, that still needs exploring.
+"""
+
+import heapq
+from collections import deque
+from threading import Lock
+from directions import NEIGHBOUR_DIRS, DELTAS
+
+SIZE = 16       #side of a cluster (cells)
+MIN_SIZE = 128  #KnownMap uses a hierarchy when the map is at least this wide or high
+LONG_RUN = 6    #runs of facing free cells this long get a transition at both ends
+HORIZON = 64    #cells of a refined path, the rest of the route is refined when planning again
+MAX_ROUTES = 256    #rests of routes kept for the next plan() calls
+STEPS = [DELTAS[d] for d in NEIGHBOUR_DIRS.tolist()]
+BORDERS = [(1, 0), (0, 1), (1, 1), (-1, 1)]     #one direction of each pair of neighbouring clusters
+
+
+class Hierarchy:
+    """ Cluster graph of a KnownMap, built lazily and invalidated by the cells logged in KnownMap.changes """
+    def __init__(self, known, size=SIZE):
+        self.known = known
+        self.size = size
+        self.nx, self.ny = -(-known.w // size), -(-known.h // size)
+        self.applied = 0    #entries of known.changes already taken into account
+        self.masks = {}     #cluster -> blocked cells as nested lists [y][x] (cluster coordinates), None when none is
+        self.partners = {}  #cluster -> {node: cells facing it in the neighbouring clusters}
+        self.edges = {}     #cluster -> {node: [(node, distance inside the cluster)]}
+        self.trees = {}     #cluster -> {node: search tree from it inside the cluster}, None for a cluster without blocked cells
+        self.routes = {}    #(end of the last partial path, goal) -> rest of its route
+        self.lock = Lock()
+
+
+    def cluster(self, x, y):
+        return x // self.size, y // self.size
+
+
+    def bounds(self, c):
+        """ Window (x0, y0, x1, y1) of cluster c """
+        x0, y0 = c[0] * self.size, c[1] * self.size
+        return x0, y0, min(self.known.w, x0 + self.size), min(self.known.h, y0 + self.size)
+
+
+    def update(self):
+        """ Drop what the cells changed since the last call may have invalidated """
+        changes = self.known.changes[self.applied:]
+        self.applied += len(changes)
+        dirty = {self.cluster(x + dx, y + dy) for x, y in changes for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                 if 0 <= x + dx < self.known.w and 0 <= y + dy < self.known.h}
+        for cx, cy in dirty:
+            self.masks.pop((cx, cy), None)
+            for dx in (-1, 0, 1):   #the transitions of the neighbours depend on the border with this cluster
+                for dy in (-1, 0, 1):
+                    self.partners.pop((cx + dx, cy + dy), None)
+                    self.edges.pop((cx + dx, cy + dy), None)
+                    self.trees.pop((cx + dx, cy + dy), None)
+
+
+    def mask(self, c):
+        if c not in self.masks:
+            blocked = self.known.blocked(*self.bounds(c))
+            self.masks[c] = blocked.tolist() if blocked.any() else None
+        return self.masks[c]
+
+
+    def free(self, x, y):
+        c = self.cluster(x, y)
+        mask = self.mask(c)
+        return mask is None or not mask[y - c[1] * self.size][x - c[0] * self.size]
+
+
+    def border(self, a, dx, dy):
+        """ Transitions (cell of a, cell of the neighbour a + (dx, dy)) between two neighbouring clusters """
+        b = (a[0] + dx, a[1] + dy)
+        if not (0 <= b[0] < self.nx and 0 <= b[1] < self.ny):
+            return []
+        ax0, ay0, ax1, ay1 = self.bounds(a)
+        if dy == 0 or dx == 0:  #side: runs of facing free cells
+            if dy == 0:
+                line = [((ax1 - 1 if dx > 0 else ax0, y), (ax1 if dx > 0 else ax0 - 1, y)) for y in range(ay0, ay1)]
+            else:
+                line = [((x, ay1 - 1 if dy > 0 else ay0), (x, ay1 if dy > 0 else ay0 - 1)) for x in range(ax0, ax1)]
+            facing = [self.free(*p) and self.free(*q) for p, q in line]
+            pairs, run = [], []
+            for (p, q), free in zip(line + [(None, None)], facing + [False]):
+                if free:
+                    run.append((p, q))
+                    continue
+                if len(run) >= LONG_RUN:
+                    pairs += [run[0], run[-1]]
+                elif run:
+                    pairs.append(run[len(run) // 2])
+                run = []
+            for i, j in [(i, i + 1) for i in range(len(line) - 1)] + [(i + 1, i) for i in range(len(line) - 1)]:
+                p, q = line[i][0], line[j][1]   #diagonal crossing, needed when no free cell faces either end
+                if not facing[i] and not facing[j] and self.free(*p) and self.free(*q) \
+                        and not self.free(*line[i][1]) and not self.free(*line[j][0]):
+                    pairs.append((p, q))
+            return pairs
+        p = (ax1 - 1 if dx > 0 else ax0, ay1 - 1 if dy > 0 else ay0)    #corner: the two cells meeting diagonally
+        q = (p[0] + dx, p[1] + dy)
+        return [(p, q)] if self.free(*p) and self.free(*q) else []
+
+
+    def build(self, c):
+        """ Transitions of cluster c, and the search tree of each one inside the cluster (none for a free cluster) """
+        if c in self.edges:
+            return
+        partners = {}
+        for dx, dy in BORDERS:
+            for sign in (1, -1):
+                for p, q in self.border(c, sign * dx, sign * dy):
+                    partners.setdefault(p, []).append(q)
+        trees = {p: self.search(c, p) for p in partners} if self.mask(c) is not None else None
+        self.partners[c] = partners
+        self.trees[c] = trees
+        self.edges[c] = {p: [(q, d) for q in partners if q != p for d in [self.distance(c, q, p)] if d is not None] for p in partners}
+
+
+    def search(self, c, source, goal=None, open_cell=None):
+        """
+        Breadth-first search from 'source' inside cluster c (8-connected), stops at 'goal'.
+        Returns {cell: (parent, moves from source)}, the parent of a cell being one move closer to 'source'
+        """
+        x0, y0, x1, y1 = self.bounds(c)
+        mask = self.mask(c)
+        tree = {source: (None, 0)}
+        queue = deque([source])
+        while queue:
+            cell = queue.popleft()
+            if cell == goal:
+                break
+            x, y = cell
+            d = tree[cell][1] + 1
+            for dx, dy in STEPS:
+                n = (x + dx, y + dy)
+                if x0 <= n[0] < x1 and y0 <= n[1] < y1 and n not in tree \
+                        and (mask is None or not mask[n[1] - y0][n[0] - x0] or n == open_cell):
+                    tree[n] = (cell, d)
+                    queue.append(n)
+        return tree
+
+
+    def distance(self, c, cell, node):
+        """ Moves from 'cell' to the transition 'node' inside cluster c (built), None if it must leave the cluster """
+        trees = self.trees[c]
+        if trees is None:
+            return max(abs(cell[0] - node[0]), abs(cell[1] - node[1]))
+        entry = trees[node].get(cell)
+        return None if entry is None else entry[1]
+
+
+    def path_to(self, tree, cell):
+        """ Cells after 'cell' up to the root of 'tree' """
+        path = []
+        while tree[cell][0] is not None:
+            cell = tree[cell][0]
+            path.append(cell)
+        return path
+
+
+    def segment(self, c, a, b, open_cell=None):
+        """ Cells after a up to b, both in cluster c (built). None if b cannot be reached without leaving the cluster """
+        trees = self.trees[c]
+        if trees is None:   #free cluster: diagonal moves first, then straight ones
+            path, (x, y) = [], a
+            while (x, y) != b:
+                x += (b[0] > x) - (b[0] < x)
+                y += (b[1] > y) - (b[1] < y)
+                path.append((x, y))
+            return path
+        if b in trees and a in trees[b]:
+            return self.path_to(trees[b], a)
+        if a in trees and b in trees[a]:
+            return self.path_to(trees[a], b)[::-1][1:] + [b]
+        tree = self.search(c, b, a, open_cell)  #neither end is a transition reaching the other (e.g. goal on a blocked cell)
+        return self.path_to(tree, a) if a in tree else None
+
+
+    def links(self, c, cell, open_cell=None):
+        """ [(node, distance)] from a cell to the transitions of its cluster """
+        self.build(c)
+        trees = self.trees[c]
+        if trees is not None and open_cell is not None and not self.free(*open_cell):   #the search trees avoid it
+            tree = self.search(c, cell, open_cell=open_cell)
+            return [(node, tree[node][1]) for node in self.partners[c] if node in tree and node != cell]
+        return [(node, d) for node in self.partners[c] if node != cell for d in [self.distance(c, cell, node)] if d is not None]
+
+
+    def route(self, start, goal):
+        """ Cells of the abstract route from start to goal: start, transitions..., goal. None if there is none """
+        cs, cg = self.cluster(*start), self.cluster(*goal)
+        if cs == cg:
+            self.build(cs)
+            if self.segment(cs, start, goal, goal) is not None:
+                return [start, goal]
+        to_goal = dict(self.links(cg, goal, goal))    #8-connected moves: distances are symmetric
+        if start in to_goal:
+            return [start, goal]
+        gx, gy = goal
+        g = {start: 0}
+        parent = {start: None}
+        open_list = [(max(abs(start[0] - gx), abs(start[1] - gy)), 0, start)]
+        closed = set()
+        while open_list:
+            _, neg_cost, node = heapq.heappop(open_list)
+            if node in closed:
+                continue
+            closed.add(node)
+            if node == goal:
+                route = []
+                while node is not None:
+                    route.append(node)
+                    node = parent[node]
+                return route[::-1]
+            cost = -neg_cost
+            c = self.cluster(*node)
+            if node == start:   #the start can be a transition itself: its partners are one move away
+                neighbours = self.links(c, start, goal) + [(q, 1) for q in self.partners[c].get(start, [])]
+            else:
+                self.build(c)
+                neighbours = self.edges[c][node] + [(q, 1) for q in self.partners[c][node]]
+            if node in to_goal:
+                neighbours = neighbours + [(goal, to_goal[node])]
+            for n, d in neighbours:
+                if n not in closed and cost + d < g.get(n, cost + d + 1):
+                    g[n] = cost + d
+                    parent[n] = node
+                    heapq.heappush(open_list, (cost + d + max(abs(n[0] - gx), abs(n[1] - gy)), -cost - d, n))
+        return None
+
+
+    def refine(self, route, goal, horizon):
+        """
+        Cells along 'route' (after its first one), segment by segment until about 'horizon' of them, and the rest of the
+        route from the last of them (None when the path reaches the end of the route, or stops before a blocked segment)
+        """
+        path = []
+        for i, (a, b) in enumerate(zip(route, route[1:])):
+            if len(path) >= horizon:
+                return path, route[i:]
+            if max(abs(a[0] - b[0]), abs(a[1] - b[1])) == 1 and self.cluster(*a) != self.cluster(*b):
+                if not self.free(*b):
+                    return path, None
+                path.append(b)  #across a border
+                continue
+            self.build(self.cluster(*a))
+            segment = self.segment(self.cluster(*a), a, b, goal)     #both ends in the same cluster
+            if segment is None:
+                return path, None
+            path += segment
+        return path, None
+
+
+    def plan(self, start, goal, horizon=HORIZON):
+        """
+        Cells after start along the route to goal, up to about 'horizon' of them. None if goal cannot be reached.
+        A call from the end of the previous partial path to the same goal goes on along the same route.
+        """
+        with self.lock:
+            self.update()
+            route = self.routes.pop((start, goal), None)
+            path, rest = self.refine(route, goal, horizon) if route else ([], None)
+            if not path:    #no route kept, or its next segment got blocked
+                route = self.route(start, goal)
+                if route is None:
+                    return None
+                path, rest = self.refine(route, goal, horizon)
+            if rest:
+                if len(self.routes) >= MAX_ROUTES:
+                    self.routes.clear()
+                self.routes[path[-1], goal] = rest
+            return path
+
+
+    def nearest_tile(self, start, wanted, max_nodes=100000):
+        """
+        Window (x0, y0, x1, y1) of the closest cluster, by route from 'start', for which wanted(window) is True, None if
+        no reachable cluster is. The cluster of 'start' comes first, then the clusters in the order the routes reach them.
+        """
+        with self.lock:
+            self.update()
+            c = self.cluster(*start)
+            if wanted(self.bounds(c)):
+                return self.bounds(c)
+            seen = {c}
+            dist = {start: 0}
+            open_list = [(0, start)]
+            closed = set()
+            while open_list and len(closed) < max_nodes:
+                cost, node = heapq.heappop(open_list)
+                if node in closed:
+                    continue
+                closed.add(node)
+                c = self.cluster(*node)
+                if c not in seen:
+                    seen.add(c)
+                    if wanted(self.bounds(c)):
+                        return self.bounds(c)
+                if node == start:
+                    neighbours = self.links(c, start) + [(q, 1) for q in self.partners[c].get(start, [])]
+                else:
+                    self.build(c)
+                    neighbours = self.edges[c][node] + [(q, 1) for q in self.partners[c][node]]
+                for n, d in neighbours:
+                    if n not in closed and cost + d < dist.get(n, cost + d + 1):
+                        dist[n] = cost + d
+                        heapq.heappush(open_list, (cost + d, n))
+            return None
@@ -1,85 +1,254 @@
 import sys
+import functools
 from server import Server
 from agent import Agent
+from network import Network, MuxNetwork
 from my_constants import *
 from threading import Thread
-import time
-import random
 import numpy as np
-
-# Directions
-OPPOSITE = {
-    STAND: STAND, LEFT: RIGHT, RIGHT: LEFT, UP: DOWN, DOWN: UP,
-    UP_LEFT: DOWN_RIGHT, UP_RIGHT: DOWN_LEFT, DOWN_LEFT: UP_RIGHT, DOWN_RIGHT: UP_LEFT,
-}
-GRADIENT_DIRS = [UP_LEFT, UP_RIGHT, DOWN_LEFT, DOWN_RIGHT, UP, DOWN, LEFT, RIGHT]
-
-# Global game over flag
-game_over_flag = False
+from directions import (DELTAS, OPPOSITE, ROTATE_CW, ROTATE_CCW, PERPENDICULAR, FROM_DELTA,
+                        GRADIENT_DIRS, DIAGONALS, direction_towards, neighbours)
+import planner
+from task_planner import TaskPlanner
+from belief import Belief
+import frontier
+import spatial
+import pipeline
+import profiler
+from profiler import phased
+
+REPLY_TIMEOUT = 1.0  # Upper bound only: requests return as soon as their reply arrives (a lockstep tick can take a while)
+LOCALIZE_STEPS = 24  # Moves of localize_safely before it gives up
+
+# The strategy is written as step functions: generators yielding the operations below to the runtime that carries them out
+# (run_steps here, with a thread per agent, or async_main.run_steps on an event loop) and receiving their result
+REQUEST = "request"  # (REQUEST, msg): send a request, receive its reply (None without one)
+SEND = "send"        # (SEND, msg): send a message that has no reply
+FOLLOW = "follow"    # (FOLLOW, path, depth): pipelined moves along a path (pipeline.follow), receive their replies
+WAIT = "wait"        # (WAIT, seconds): pause, cut short by the game over
+
+
+class StrategyParams:
+    """Tunable constants of the sweep and bypass strategy (see tuner.py)"""
+    def __init__(self, sweep_step=4, zone_overlap=2, max_contours=10, max_bypass_attempts=5, loop_window=10, loop_repeats=3,
+                 claim_slack=40, pipeline_depth=4):
+        self.sweep_step = sweep_step                    # Spacing between sweep lines
+        self.zone_overlap = zone_overlap                # Overlap between agent zones
+        self.max_contours = max_contours                # move_to gives up on its target after this many contours
+        self.max_bypass_attempts = max_bypass_attempts  # ... or after this many failed systematic bypasses
+        self.loop_window = loop_window                  # Number of recent positions checked for loops
+        self.loop_repeats = loop_repeats                # Visits of a position within the window that make a loop
+        self.claim_slack = claim_slack                  # Keep searching for the others while they need this many more steps (0: claim at once)
+        self.pipeline_depth = pipeline_depth            # Moves in flight along planned paths (1: one round trip per step)
+
+    def as_dict(self):
+        return dict(vars(self))
+
+    def __repr__(self):
+        return "StrategyParams(" + ", ".join(f"{k}={v}" for k, v in vars(self).items()) + ")"
+
+
+PARAMS = StrategyParams()
+
+
+def purpose(p):
+    """Decorator of step functions: the moves made during a call (first argument: the agent) are counted by the server under purpose p"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(agent, *args, **kwargs):
+            previous, agent.purpose = agent.purpose, p
+            try:
+                return (yield from func(agent, *args, **kwargs))
+            finally:
+                agent.purpose = previous
+        return wrapper
+    return decorator
+
+
+def run_steps(agent, steps):
+    """Carry out the operations yielded by the step function 'steps' (a generator) for an agent thread, returns its result"""
+    result = None
+    while True:
+        try:
+            op = steps.send(result)
+        except StopIteration as stop:
+            return stop.value
+        if op[0] == REQUEST:
+            result = agent.request(op[1], REPLY_TIMEOUT)
+        elif op[0] == FOLLOW:
+            result = pipeline.follow(agent, op[1], op[2], timeout=REPLY_TIMEOUT)
+        elif op[0] == SEND:
+            result = agent.network.send(op[1])
+        else:
+            result = agent.game_over_event.wait(op[1])
 
 
-def move(agent, d):
-    global game_over_flag
-    if agent.completed or game_over_flag:  # Don't move if already done or game over
+def move(agent, d, guard=None):
+    """Move in direction d. With a 'guard' (guarded moves, server.py -gm) the server refuses to enter a cell holding more
+    and replies with "refused" and the value of that cell ("probe")"""
+    if agent.completed or agent.game_over:  # Don't move if already done or game over
         return
-    agent.network.send({"header": MOVE, "direction": d})
-    time.sleep(0.03)
-    
-    # Check if server responded with game over
-    if agent.msg and agent.msg.get("game_over"):
-        game_over_flag = True
+    msg = {"header": MOVE, "direction": d, "purpose": agent.purpose}
+    if guard is not None:
+        msg["guard"] = guard
+    # Returns as soon as the reply (or a GAME_OVER push) arrives
+    reply = yield REQUEST, msg
+    observe(agent, reply)
+    if reply and reply.get("refused"):
+        observe_cell(agent, *get_target_from_direction(reply["x"], reply["y"], d), reply["probe"])
+    
+    # Check if server responded with game over (agent.game_over is set from the server replies and pushes)
+    if agent.game_over:
         print(f"💀 Agent {agent.agent_id}: Game Over detected!")
         agent.completed = True
+    return reply
+
+
+def observe(agent, reply):
+    """Record the cell value of a MOVE/GET_DATA reply in the map shared by the agents of this process"""
+    if reply and reply.get("header") in (MOVE, GET_DATA) and "cell_val" in reply:
+        planner.shared_map(agent.w, agent.h).observe(reply["x"], reply["y"], reply["cell_val"])
+        frontier.shared_frontier(agent.w, agent.h).observe(reply["x"], reply["y"])
+        if hasattr(agent, 'belief'):
+            agent.belief.observe(reply["x"], reply["y"], reply["cell_val"])
+
+
+def observe_cell(agent, x, y, val):
+    """Record the value of a cell the agent did not stand on (sensed or probed). A 1.0 there is a wall as much as an item:
+    it is blocked unless an item is known there"""
+    known = planner.shared_map(agent.w, agent.h)
+    if val >= WALL_VALUE and not known_item(agent, (x, y)):
+        known.block(x, y)
+    else:
+        known.observe(x, y, val)
+    if hasattr(agent, 'belief'):
+        agent.belief.observe(x, y, val)
+
+
+@purpose(PROBE)
+def probe(agent, d):
+    """
+    Value of the neighbour in direction d, the agent ends where it started. None if the neighbour cannot be entered.
+    Guarded moves read it in one request (refused on purpose, nothing is entered), otherwise the agent steps in and back.
+    """
+    if agent.guarded_moves:
+        reply = yield from move(agent, d, guard=-1.0)
+        return reply["probe"] if reply and reply.get("refused") else None
+    old_x, old_y = agent.x, agent.y
+    yield from move(agent, d)
+    if agent.x == old_x and agent.y == old_y:
+        return None
+    data = yield from get_data(agent)
+    val = data.get("cell_val", 0) if data else 0
+    yield from step_back(agent, d)
+    return val
+
+
+@purpose(PROBE)
+def step_back(agent, d):
+    """Undo a step in direction d that was only taken to read the cell"""
+    return (yield from move(agent, OPPOSITE[d]))
+
+
+def step_safely(agent, d):
+    """
+    Step in direction d unless the neighbour is a wall warning (0.35). Returns True once on the neighbour.
+    Guarded moves are refused by the server on a warning (one request), otherwise the agent steps in, reads the value and retreats.
+    A refused 1.0 is a wall as much as an item: it is only entered when an item is known there, otherwise it is blocked
+    in the map of the process and the caller tries another way.
+    """
+    old_x, old_y = agent.x, agent.y
+    if agent.guarded_moves:
+        reply = yield from move(agent, d, guard=WALL_WARNING_PERCENTAGE - 0.01)
+        if reply and reply.get("refused"):
+            if check_wall_danger(reply["probe"]):
+                return False
+            if reply["probe"] >= WALL_VALUE:
+                target = get_target_from_direction(reply["x"], reply["y"], d)
+                if not known_item(agent, target):
+                    planner.shared_map(agent.w, agent.h).block(*target)
+                    return False
+            yield from move(agent, d)  # Halo or known item cell: entered as without the guard
+        return agent.x != old_x or agent.y != old_y
+    yield from move(agent, d)
+    if agent.x == old_x and agent.y == old_y:
+        return False
+    data = yield from get_data(agent)
+    if check_wall_danger(data.get("cell_val", 0) if data else 0):
+        yield from step_back(agent, d)  # Retreat
+        return False
+    return True
+
+
+def known_item(agent, pos):
+    """True if a key or box is known at pos (own items, items announced for the other agents)"""
+    return pos in (agent.my_key_pos, agent.my_box_pos) or pos in agent.other_items
 
 
 def get_data(agent):
-    agent.network.send({"header": GET_DATA})
-    time.sleep(0.02)
-    return agent.msg
+    data = yield REQUEST, {"header": GET_DATA}
+    observe(agent, data)
+    return data
+
+
+def cell_val(agent):
+    """Value of the cell the agent stands on, 0 without a reply (timeout, game over)"""
+    data = yield from get_data(agent)
+    return data.get("cell_val", 0) if data else 0
 
 
 def get_item_owner(agent):
-    agent.network.send({"header": GET_ITEM_OWNER})
-    time.sleep(0.02)
-    return agent.msg
+    return (yield REQUEST, {"header": GET_ITEM_OWNER})
+
+
+def get_patch(agent, k=3):
+    """
+    Cell values of the k x k window around the agent in one request (extended sensor mode).
+    Returns (x0, y0, patch) where patch[j, i] is the value of cell (x0 + i, y0 + j), or None if unavailable.
+    """
+    if agent.patch_size < k:
+        return None
+    data = yield REQUEST, {"header": GET_PATCH, "k": k}
+    if not data or data.get("header") != GET_PATCH or data.get("patch") is None:
+        return None
+    return data["x0"], data["y0"], np.frombuffer(data["patch"], dtype=data["dtype"]).reshape(data["shape"])
+
+
+def sense_neighbours(agent):
+    """Values of the 8 neighbours {direction: val} from a single 3x3 patch (in-bounds cells only), None if unavailable"""
+    sensed = yield from get_patch(agent)
+    if sensed is None:
+        return None
+    x0, y0, patch = sensed
+    dirs, cells = neighbours(agent.x, agent.y, agent.w, agent.h)
+    vals = patch[cells[:, 1] - y0, cells[:, 0] - x0].tolist()
+    for (cx, cy), val in zip(cells.tolist(), vals):
+        observe_cell(agent, cx, cy, val)
+    return dict(zip(dirs.tolist(), vals))
 
 
 def broadcast(agent, itype, owner, pos):
-    agent.network.send({
+    yield SEND, {
         "header": BROADCAST_MSG,
         "Msg type": KEY_DISCOVERED if itype == KEY_TYPE else BOX_DISCOVERED,
         "position": pos, "owner": owner
-    })
+    }
+    planner.shared_map(agent.w, agent.h).item_found(*pos)
+    # The server does not echo broadcasts: remember what we found for the others too
+    if owner != agent.agent_id:
+        agent.note_other_item(itype, owner, pos)
 
 
 def get_direction_from_delta(dx, dy):
     """Convert delta (dx, dy) to a direction constant"""
-    if dx == 0 and dy == 0: return STAND
-    if dx == 1 and dy == 0: return RIGHT
-    if dx == -1 and dy == 0: return LEFT
-    if dx == 0 and dy == 1: return DOWN
-    if dx == 0 and dy == -1: return UP
-    if dx == 1 and dy == 1: return DOWN_RIGHT
-    if dx == 1 and dy == -1: return UP_RIGHT
-    if dx == -1 and dy == 1: return DOWN_LEFT
-    if dx == -1 and dy == -1: return UP_LEFT
+    if -1 <= dx <= 1 and -1 <= dy <= 1:
+        return FROM_DELTA[dy + 1][dx + 1]
     return STAND
 
 
 def get_perpendicular_dirs(direction):
     """Get perpendicular directions for a given direction"""
-    horizontal = [LEFT, RIGHT]
-    vertical = [UP, DOWN]
-    
-    if direction in [LEFT, RIGHT]:
-        return vertical
-    elif direction in [UP, DOWN]:
-        return horizontal
-    elif direction in [UP_LEFT, UP_RIGHT]:
-        return [DOWN, LEFT, RIGHT]
-    elif direction in [DOWN_LEFT, DOWN_RIGHT]:
-        return [UP, LEFT, RIGHT]
-    return horizontal + vertical
+    return list(PERPENDICULAR[direction])
 
 
 
@@ -97,12 +266,7 @@ def is_in_bounds(agent, pos):
 
 def rotate_direction(d, clockwise=True):
     """Rotate direction by 45 degrees (one step in cardinal/diagonal order)"""
-    order = [UP, UP_RIGHT, RIGHT, DOWN_RIGHT, DOWN, DOWN_LEFT, LEFT, UP_LEFT]
-    if d not in order:
-        return UP
-    idx = order.index(d)
-    step = 1 if clockwise else -1
-    return order[(idx + step) % 8]
+    return ROTATE_CW[d] if clockwise else ROTATE_CCW[d]
 
 
 def is_path_clear(agent, tx, ty):
@@ -121,6 +285,14 @@ def scan_surroundings(agent, quick=False):
     if quick:
         return surroundings
     
+    # Extended sensor: read the 8 neighbours at once instead of probing
+    sensed = yield from sense_neighbours(agent)
+    if sensed is not None:
+        for d in GRADIENT_DIRS:
+            val = sensed.get(d, 1.0)
+            surroundings[d] = (not (check_wall_danger(val) or val == 1.0), val)
+        return surroundings
+    
     # Check each direction by probing
     for d in GRADIENT_DIRS:
         target = get_target_from_direction(agent.x, agent.y, d)
@@ -130,26 +302,12 @@ def scan_surroundings(agent, quick=False):
             surroundings[d] = (False, 1.0)
             continue
         
-        # Probe by moving and immediately checking
-        old_x, old_y = agent.x, agent.y
-        move(agent, d)
-        
-        if agent.x != old_x or agent.y != old_y:
-            # Successfully moved - check value
-            probe_data = get_data(agent)
-            val = probe_data.get("cell_val", 0) if probe_data else 0
-            
-            if check_wall_danger(val) or val == 1.0:
-                # Danger zone - retreat
-                surroundings[d] = (False, val)
-                move(agent, OPPOSITE[d])  # Retreat immediately
-            else:
-                # Safe - return to original position
-                surroundings[d] = (True, val)
-                move(agent, OPPOSITE[d])
-        else:
+        val = yield from probe(agent, d)
+        if val is None:
             # Couldn't move - blocked
             surroundings[d] = (False, 1.0)
+        else:
+            surroundings[d] = (not (check_wall_danger(val) or val == 1.0), val)
     
     return surroundings
 
@@ -162,6 +320,17 @@ def is_in_l_corner(agent):
     blocked_count = 0
     safe_dirs = []
     
+    # Extended sensor: no probing moves (1.0 may be a wall, so it counts as blocked)
+    sensed = yield from sense_neighbours(agent)
+    if sensed is not None:
+        for d in GRADIENT_DIRS:
+            val = sensed.get(d, 1.0)
+            if check_wall_danger(val) or val == 1.0:
+                blocked_count += 1
+            else:
+                safe_dirs.append(d)
+        return blocked_count >= 5, safe_dirs
+    
     # Check all 8 directions by trying to probe
     for d in GRADIENT_DIRS:
         target = get_target_from_direction(agent.x, agent.y, d)
@@ -169,21 +338,11 @@ def is_in_l_corner(agent):
         if not is_in_bounds(agent, target):
             blocked_count += 1
         else:
-            # Try to move and check if safe
-            old_pos = (agent.x, agent.y)
-            move(agent, d)
-            if agent.x != old_pos[0] or agent.y != old_pos[1]:
-                # We moved - check if safe
-                data = get_data(agent)
-                val = data.get("cell_val", 0) if data else 0
-                if check_wall_danger(val):
-                    blocked_count += 1
-                else:
-                    safe_dirs.append(d)
-                # Return to original position
-                move(agent, OPPOSITE[d])
-            else:
+            val = yield from probe(agent, d)
+            if val is None or check_wall_danger(val):
                 blocked_count += 1
+            else:
+                safe_dirs.append(d)
     
     # Trapped if 5+ directions are blocked
     is_trapped = blocked_count >= 5
@@ -191,6 +350,8 @@ def is_in_l_corner(agent):
 
 
 
+@phased("bypass")
+@purpose(BYPASS)
 def retreat_and_slide(agent, previous_pos):
     """
     Safe escape from danger zone (0.35).
@@ -200,7 +361,7 @@ def retreat_and_slide(agent, previous_pos):
     
     # 1. RETREAT to safety
     back_d = get_direction_from_delta(previous_pos[0] - current_x, previous_pos[1] - current_y)
-    move(agent, back_d)
+    yield from move(agent, back_d)
     
     # Check if we successfully retreated
     if agent.x == current_x and agent.y == current_y:
@@ -209,7 +370,12 @@ def retreat_and_slide(agent, previous_pos):
          
     # From safe position, try to slide around the danger
     danger_pos = (current_x, current_y)
-    all_dirs = [UP_LEFT, UP_RIGHT, DOWN_LEFT, DOWN_RIGHT, UP, DOWN, LEFT, RIGHT]
+    all_dirs = GRADIENT_DIRS
+    
+    # Extended sensor: only try the directions that are known to be safe
+    sensed = yield from sense_neighbours(agent)
+    if sensed is not None:
+        all_dirs = [d for d in all_dirs if d in sensed and not check_wall_danger(sensed[d]) and sensed[d] != 1.0]
     
     for d in all_dirs:
         nx, ny = get_target_from_direction(agent.x, agent.y, d)
@@ -222,21 +388,10 @@ def retreat_and_slide(agent, previous_pos):
         if not is_in_bounds(agent, (nx, ny)): 
             continue
         
-        # Move and check
-        old_pos = (agent.x, agent.y)
-        move(agent, d)
-        if agent.x == nx and agent.y == ny:
-             # Moved successfully. Check safety.
-             data = get_data(agent)
-             val = data.get("cell_val", 0) if data else 0
-             if check_wall_danger(val):
-                  # Still danger - retreat
-                  move(agent, OPPOSITE[d])
-                  continue
-             else:
-                  # Safe!
-                  print(f"Agent {agent.agent_id}: 🦶 Slid to ({nx}, {ny})")
-                  return True
+        # Move unless it is still danger
+        if (yield from step_safely(agent, d)):
+            print(f"Agent {agent.agent_id}: 🦶 Slid to ({nx}, {ny})")
+            return True
 
     print(f"Agent {agent.agent_id}: Could not slide safely. Staying at ({agent.x}, {agent.y})")
     return False
@@ -245,14 +400,14 @@ def retreat_and_slide(agent, previous_pos):
 
 
 
+@phased("bypass")
+@purpose(BYPASS)
 def contour_around_wall(agent, target_x, target_y, previous_pos):
     """
     Smart L-shaped wall bypass algorithm.
     Strategy: Move perpendicular to wall until clear, then resume toward target.
     """
-    global game_over_flag
-    
-    if game_over_flag:
+    if agent.game_over:
         return False
         
     print(f"Agent {agent.agent_id}: 🚧 Wall detected at ({agent.x}, {agent.y})! Initiating safe contour...")
@@ -260,37 +415,31 @@ def contour_around_wall(agent, target_x, target_y, previous_pos):
     start_pos = (agent.x, agent.y)
     
     # 1. RETREAT if on danger zone
-    data = get_data(agent)
+    data = yield from get_data(agent)
     if data and check_wall_danger(data.get("cell_val", 0)):
         print(f"Agent {agent.agent_id}: 🔙 On danger zone, retreating...")
         if previous_pos != (agent.x, agent.y):
             back_d = get_direction_from_delta(previous_pos[0] - agent.x, previous_pos[1] - agent.y)
-            move(agent, back_d)
+            yield from move(agent, back_d)
     
     # 2. SCAN to find safe directions
     print(f"Agent {agent.agent_id}: 🔍 Scanning surroundings...")
-    surroundings = scan_surroundings(agent)
+    surroundings = yield from scan_surroundings(agent)
     
     # 3. Identify which direction is blocked (toward target)
     dx = target_x - agent.x
     dy = target_y - agent.y
     
     # 4. CHECK IF TRAPPED
-    is_trapped, safe_dirs = is_in_l_corner(agent)
+    is_trapped, safe_dirs = yield from is_in_l_corner(agent)
     if is_trapped:
-        diagonals_first = sorted(safe_dirs, key=lambda d: d in [UP_LEFT, UP_RIGHT, DOWN_LEFT, DOWN_RIGHT], reverse=True)
+        diagonals_first = sorted(safe_dirs, key=lambda d: d in DIAGONALS, reverse=True)
         print(f"Agent {agent.agent_id}: 🪤 Trapped! Safe directions: {diagonals_first}")
         if diagonals_first:
             for escape_dir in diagonals_first:
-                old_pos = (agent.x, agent.y)
-                move(agent, escape_dir)
-                if agent.x != old_pos[0] or agent.y != old_pos[1]:
-                    escape_data = get_data(agent)
-                    if escape_data and not check_wall_danger(escape_data.get("cell_val", 0)):
-                        print(f"Agent {agent.agent_id}: ✅ Escaped via {escape_dir}")
-                        return True
-                    else:
-                        move(agent, OPPOSITE[escape_dir])
+                if (yield from step_safely(agent, escape_dir)):
+                    print(f"Agent {agent.agent_id}: ✅ Escaped via {escape_dir}")
+                    return True
             return False
         else:
             print(f"Agent {agent.agent_id}: 🔓 Attempting forced escape...")
@@ -298,16 +447,9 @@ def contour_around_wall(agent, target_x, target_y, previous_pos):
                 target_pos = get_target_from_direction(agent.x, agent.y, force_dir)
                 if not is_in_bounds(agent, target_pos):
                     continue
-                old_pos = (agent.x, agent.y)
-                move(agent, force_dir)
-                if agent.x != old_pos[0] or agent.y != old_pos[1]:
-                    force_data = get_data(agent)
-                    force_val = force_data.get("cell_val", 0) if force_data else 0
-                    if not check_wall_danger(force_val):
-                        print(f"Agent {agent.agent_id}: ✅ Forced escape via {force_dir}")
-                        return True
-                    else:
-                        move(agent, OPPOSITE[force_dir])
+                if (yield from step_safely(agent, force_dir)):
+                    print(f"Agent {agent.agent_id}: ✅ Forced escape via {force_dir}")
+                    return True
             print(f"Agent {agent.agent_id}: 💀 Forced escape failed!")
             return False
     
@@ -338,7 +480,7 @@ def contour_around_wall(agent, target_x, target_y, previous_pos):
     
     # Try primary bypass direction first, then secondary
     for bypass_dir in [primary_bypass, secondary_bypass]:
-        if game_over_flag or agent.completed:
+        if agent.game_over or agent.completed:
             return False
         
         bypass_count = 0
@@ -348,11 +490,11 @@ def contour_around_wall(agent, target_x, target_y, previous_pos):
         
         # Phase 1: Move perpendicular to get clear of the wall
         for step in range(MAX_BYPASS_STEPS):
-            if game_over_flag or agent.completed:
+            if agent.game_over or agent.completed:
                 return False
             
             old_pos = (agent.x, agent.y)
-            move(agent, bypass_dir)
+            yield from move(agent, bypass_dir)
             
             if agent.x == old_pos[0] and agent.y == old_pos[1]:
                 # Blocked in bypass direction, try rotating slightly
@@ -361,12 +503,12 @@ def contour_around_wall(agent, target_x, target_y, previous_pos):
                 for alt in alt_dirs:
                     target_pos = get_target_from_direction(agent.x, agent.y, alt)
                     if is_in_bounds(agent, target_pos):
-                        move(agent, alt)
+                        yield from move(agent, alt)
                         if agent.x != old_pos[0] or agent.y != old_pos[1]:
                             # Check safety
-                            alt_data = get_data(agent)
+                            alt_data = yield from get_data(agent)
                             if alt_data and check_wall_danger(alt_data.get("cell_val", 0)):
-                                move(agent, OPPOSITE[alt])
+                                yield from move(agent, OPPOSITE[alt])
                             else:
                                 moved = True
                                 bypass_count += 1
@@ -375,12 +517,12 @@ def contour_around_wall(agent, target_x, target_y, previous_pos):
                     break  # Can't bypass in this direction
             else:
                 # Moved! Check if safe
-                bypass_data = get_data(agent)
+                bypass_data = yield from get_data(agent)
                 bypass_val = bypass_data.get("cell_val", 0) if bypass_data else 0
                 
                 if check_wall_danger(bypass_val):
                     # Hit wall during bypass, retreat and try different angle
-                    move(agent, OPPOSITE[bypass_dir])
+                    yield from move(agent, OPPOSITE[bypass_dir])
                     break
                 
                 bypass_count += 1
@@ -388,24 +530,21 @@ def contour_around_wall(agent, target_x, target_y, previous_pos):
             # After minimum bypass, try heading toward target
             if bypass_count >= MIN_BYPASS_STEPS:
                 # Try one step toward target
-                tgt_dir = get_direction_from_delta(
-                    1 if target_x > agent.x else (-1 if target_x < agent.x else 0),
-                    1 if target_y > agent.y else (-1 if target_y < agent.y else 0)
-                )
+                tgt_dir = direction_towards(target_x - agent.x, target_y - agent.y)
                 
                 tgt_pos = get_target_from_direction(agent.x, agent.y, tgt_dir)
                 if is_in_bounds(agent, tgt_pos):
                     test_old = (agent.x, agent.y)
-                    move(agent, tgt_dir)
+                    yield from move(agent, tgt_dir)
                     if agent.x != test_old[0] or agent.y != test_old[1]:
-                        test_data = get_data(agent)
+                        test_data = yield from get_data(agent)
                         if test_data and not check_wall_danger(test_data.get("cell_val", 0)):
                             # Successfully bypassed and can head toward target!
                             print(f"Agent {agent.agent_id}: ✅ Bypass successful after {bypass_count} steps!")
                             return True
                         else:
                             # Still blocked, retreat and continue bypass
-                            move(agent, OPPOSITE[tgt_dir])
+                            yield from move(agent, OPPOSITE[tgt_dir])
         
         # If we moved at least some, consider it partial success
         if bypass_count >= 2:
@@ -424,11 +563,9 @@ def move_step(agent, tx, ty):
     One step toward target with wall avoidance.
     Uses real-time wall detection.
     """
-    global game_over_flag
-    if agent.completed or game_over_flag:
+    if agent.completed or agent.game_over:
         return False
     
-    old_x, old_y = agent.x, agent.y
     dx, dy = tx - agent.x, ty - agent.y
     
     if dx == 0 and dy == 0: 
@@ -460,19 +597,8 @@ def move_step(agent, tx, ty):
         if not is_in_bounds(agent, target_pos):
             continue
         
-        # Try to move
-        move(agent, direction)
-        
-        if agent.x != old_x or agent.y != old_y:
-            # Moved successfully - check if safe
-            data = get_data(agent)
-            val = data.get("cell_val", 0) if data else 0
-            
-            if check_wall_danger(val):
-                # DANGER! Retreat
-                move(agent, OPPOSITE[direction])
-                continue
-            
+        # Try to move, a wall warning is left at once
+        if (yield from step_safely(agent, direction)):
             return True  # Successfully moved to safe cell
     
     # All directions failed
@@ -481,11 +607,7 @@ def move_step(agent, tx, ty):
 
 def get_target_from_direction(x, y, d):
     """Get target position from current position and direction"""
-    deltas = {
-        STAND: (0, 0), LEFT: (-1, 0), RIGHT: (1, 0), UP: (0, -1), DOWN: (0, 1),
-        UP_LEFT: (-1, -1), UP_RIGHT: (1, -1), DOWN_LEFT: (-1, 1), DOWN_RIGHT: (1, 1)
-    }
-    dx, dy = deltas.get(d, (0, 0))
+    dx, dy = DELTAS[d]
     return (x + dx, y + dy)
 
 
@@ -558,14 +680,14 @@ def get_bypass_direction(agent, target_dir, current_pos, target_pos, attempt_num
         return DOWN, UP
 
 
+@phased("bypass")
+@purpose(BYPASS)
 def systematic_bypass(agent, tx, ty, previous_pos, initial_direction, attempt_num=0):
     """
     Systematic bypass strategy with memory.
     Remembers which bypass directions failed and tries different ones.
     """
-    global game_over_flag
-    
-    if game_over_flag or agent.completed:
+    if agent.game_over or agent.completed:
         return False
     
     init_agent_memory(agent)
@@ -586,7 +708,7 @@ def systematic_bypass(agent, tx, ty, previous_pos, initial_direction, attempt_nu
     )
     
     for bypass_dir in [primary_bypass, secondary_bypass]:
-        if game_over_flag or agent.completed:
+        if agent.game_over or agent.completed:
             return False
         
         bypass_steps = 0
@@ -596,7 +718,7 @@ def systematic_bypass(agent, tx, ty, previous_pos, initial_direction, attempt_nu
         print(f"Agent {agent.agent_id}: 🔄 Trying bypass dir {bypass_dir} (attempt {attempt_num})")
         
         for step in range(MAX_BYPASS_STEPS):
-            if game_over_flag or agent.completed:
+            if agent.game_over or agent.completed:
                 return False
             
             # Check if current position is in blocked zones (avoid returning to bad spots)
@@ -609,19 +731,16 @@ def systematic_bypass(agent, tx, ty, previous_pos, initial_direction, attempt_nu
             if bypass_steps >= MIN_BYPASS_BEFORE_RETRY:
                 dx = tx - agent.x
                 dy = ty - agent.y
-                resume_dir = get_direction_from_delta(
-                    1 if dx > 0 else (-1 if dx < 0 else 0),
-                    1 if dy > 0 else (-1 if dy < 0 else 0)
-                )
+                resume_dir = direction_towards(dx, dy)
                 
                 if resume_dir != STAND:
                     resume_pos = get_target_from_direction(agent.x, agent.y, resume_dir)
                     # Check if resume position is in blocked zones
                     if resume_pos not in agent.blocked_zones and is_in_bounds(agent, resume_pos):
                         old = (agent.x, agent.y)
-                        move(agent, resume_dir)
+                        yield from move(agent, resume_dir)
                         if agent.x != old[0] or agent.y != old[1]:
-                            resume_data = get_data(agent)
+                            resume_data = yield from get_data(agent)
                             if resume_data and not check_wall_danger(resume_data.get("cell_val", 0)):
                                 print(f"Agent {agent.agent_id}: ✅ Bypass OK after {bypass_steps} steps")
                                 # Clear this position from blocked zones since we found a way
@@ -630,7 +749,7 @@ def systematic_bypass(agent, tx, ty, previous_pos, initial_direction, attempt_nu
                             else:
                                 # Still blocked, mark and retreat
                                 agent.blocked_zones.add((agent.x, agent.y))
-                                move(agent, OPPOSITE[resume_dir])
+                                yield from move(agent, OPPOSITE[resume_dir])
             
             # Continue bypass movement
             bypass_pos = get_target_from_direction(agent.x, agent.y, bypass_dir)
@@ -652,7 +771,7 @@ def systematic_bypass(agent, tx, ty, previous_pos, initial_direction, attempt_nu
                     break
             
             old = (agent.x, agent.y)
-            move(agent, bypass_dir)
+            yield from move(agent, bypass_dir)
             
             if agent.x == old[0] and agent.y == old[1]:
                 # Can't move, try rotating
@@ -661,9 +780,9 @@ def systematic_bypass(agent, tx, ty, previous_pos, initial_direction, attempt_nu
                 for alt in alt_dirs:
                     alt_pos = get_target_from_direction(agent.x, agent.y, alt)
                     if is_in_bounds(agent, alt_pos) and alt_pos not in agent.blocked_zones:
-                        move(agent, alt)
+                        yield from move(agent, alt)
                         if agent.x != old[0] or agent.y != old[1]:
-                            alt_data = get_data(agent)
+                            alt_data = yield from get_data(agent)
                             if alt_data and not check_wall_danger(alt_data.get("cell_val", 0)):
                                 bypass_steps += 1
                                 path_taken.append((agent.x, agent.y))
@@ -671,15 +790,15 @@ def systematic_bypass(agent, tx, ty, previous_pos, initial_direction, attempt_nu
                                 break
                             else:
                                 agent.blocked_zones.add((agent.x, agent.y))
-                                move(agent, OPPOSITE[alt])
+                                yield from move(agent, OPPOSITE[alt])
                 if not moved:
                     break
             else:
                 # Check if safe
-                bypass_data = get_data(agent)
+                bypass_data = yield from get_data(agent)
                 if bypass_data and check_wall_danger(bypass_data.get("cell_val", 0)):
                     agent.blocked_zones.add((agent.x, agent.y))
-                    move(agent, OPPOSITE[bypass_dir])
+                    yield from move(agent, OPPOSITE[bypass_dir])
                     break
                 bypass_steps += 1
                 path_taken.append((agent.x, agent.y))
@@ -712,8 +831,6 @@ def move_to(agent, tx, ty):
     Move to target with wall avoidance.
     Uses path memory to avoid repeating failed routes.
     """
-    global game_over_flag
-    
     init_agent_memory(agent)
     
     max_attempts = (agent.w + agent.h) * 2
@@ -727,21 +844,18 @@ def move_to(agent, tx, ty):
     # Calculate initial direction toward target
     initial_dx = tx - agent.x
     initial_dy = ty - agent.y
-    initial_direction = get_direction_from_delta(
-        1 if initial_dx > 0 else (-1 if initial_dx < 0 else 0),
-        1 if initial_dy > 0 else (-1 if initial_dy < 0 else 0)
-    )
+    initial_direction = direction_towards(initial_dx, initial_dy)
     
     while agent.x != tx or agent.y != ty:
-        if agent.completed or game_over_flag:
+        if agent.completed or agent.game_over:
             return
         
         current_pos = (agent.x, agent.y)
         
         # LOOP DETECTION with memory-based escape
-        if current_pos in recent_positions[-10:] if len(recent_positions) > 10 else current_pos in recent_positions:
+        if current_pos in recent_positions[-PARAMS.loop_window:]:
             loop_count = recent_positions.count(current_pos) + 1
-            if loop_count >= 3:
+            if loop_count >= PARAMS.loop_repeats:
                 bypass_attempt += 1
                 print(f"Agent {agent.agent_id}: 🔁 Loop at {current_pos} (bypass attempt #{bypass_attempt})")
                 
@@ -749,12 +863,12 @@ def move_to(agent, tx, ty):
                 agent.blocked_zones.add(current_pos)
                 
                 # Try systematic bypass with increasing attempt number
-                if systematic_bypass(agent, tx, ty, previous_pos, initial_direction, bypass_attempt):
+                if (yield from systematic_bypass(agent, tx, ty, previous_pos, initial_direction, bypass_attempt)):
                     recent_positions.clear()
                 else:
                     attempts += 5
                     # If we've tried many times, give up on this exact path
-                    if bypass_attempt >= 5:
+                    if bypass_attempt >= PARAMS.max_bypass_attempts:
                         print(f"Agent {agent.agent_id}: ⏹️ Too many bypass failures, abandoning target ({tx}, {ty})")
                         return
                 continue
@@ -768,34 +882,31 @@ def move_to(agent, tx, ty):
         # Check if next step toward target is in blocked zones
         dx = tx - agent.x
         dy = ty - agent.y
-        next_dir = get_direction_from_delta(
-            1 if dx > 0 else (-1 if dx < 0 else 0),
-            1 if dy > 0 else (-1 if dy < 0 else 0)
-        )
+        next_dir = direction_towards(dx, dy)
         next_pos = get_target_from_direction(agent.x, agent.y, next_dir)
         
         if next_pos in agent.blocked_zones:
             # Direct path blocked, use bypass immediately
             bypass_attempt += 1
-            if systematic_bypass(agent, tx, ty, previous_pos, initial_direction, bypass_attempt):
+            if (yield from systematic_bypass(agent, tx, ty, previous_pos, initial_direction, bypass_attempt)):
                 continue
         
         # Try to move one step
-        move_result = move_step(agent, tx, ty)
+        move_result = yield from move_step(agent, tx, ty)
         
         # Check for wall warning zone
-        data = get_data(agent)
+        data = yield from get_data(agent)
         if data:
             val = data.get("cell_val", 0)
             if check_wall_danger(val):
                 # Mark this as blocked
                 agent.blocked_zones.add((agent.x, agent.y))
                 contour_count += 1
-                if contour_count > 10:
+                if contour_count > PARAMS.max_contours:
                     print(f"Agent {agent.agent_id}: ⏹️ Too many contours, giving up on target ({tx}, {ty})")
                     return
                 print(f"Agent {agent.agent_id}: 🚧 Danger zone, contour...")
-                contour_around_wall(agent, tx, ty, previous_pos)
+                yield from contour_around_wall(agent, tx, ty, previous_pos)
                 stuck_count = 0
                 continue
         
@@ -806,14 +917,14 @@ def move_to(agent, tx, ty):
             if stuck_count > 3:
                 bypass_attempt += 1
                 contour_count += 1
-                if contour_count > 10:
+                if contour_count > PARAMS.max_contours:
                     print(f"Agent {agent.agent_id}: ⏹️ Too many contours, giving up on target ({tx}, {ty})")
                     return
                 print(f"Agent {agent.agent_id}: 🔄 Stuck, bypass attempt #{bypass_attempt}...")
-                if systematic_bypass(agent, tx, ty, previous_pos, initial_direction, bypass_attempt):
+                if (yield from systematic_bypass(agent, tx, ty, previous_pos, initial_direction, bypass_attempt)):
                     stuck_count = 0
                 else:
-                    contour_around_wall(agent, tx, ty, previous_pos)
+                    yield from contour_around_wall(agent, tx, ty, previous_pos)
                     stuck_count = 0
             
             if attempts > max_attempts:
@@ -825,30 +936,109 @@ def move_to(agent, tx, ty):
             previous_pos = (old_x, old_y)
 
 
+def walk(agent, path):
+    """
+    Replies of the next moves along a planned path, in order, [] once the agent completed or the game is over. With
+    PARAMS.pipeline_depth > 1 the moves are pipelined (pipeline.py): a batch stops on the first cell that is not clean,
+    the next one starts from there. Otherwise every batch is one move.
+    """
+    if agent.completed or agent.game_over:
+        return []
+    if PARAMS.pipeline_depth <= 1:
+        nx, ny = path[0]
+        return [(yield from move(agent, get_direction_from_delta(nx - agent.x, ny - agent.y)))]
+    replies = yield FOLLOW, path, PARAMS.pipeline_depth
+    for reply in replies:
+        observe(agent, reply)
+    if agent.game_over:
+        print(f"💀 Agent {agent.agent_id}: Game Over detected!")
+        agent.completed = True
+    return replies
+
+
+def ring_blocked(agent, known, pos):
+    """True if the next cell of a path became blocked (e.g. an unknown cell next to a ring cell) and no item is known there"""
+    return known.blocked(pos[0], pos[1], pos[0] + 1, pos[1] + 1)[0, 0] and not known_item(agent, pos)
+
+
+def travel_planned(agent, tx, ty, max_replans=5, on_step=None):
+    """
+    Follow an A* path (landmark heuristic) over the walls known by the agents of this process.
+    A step landing on a danger cell is undone and the path replanned around it. Returns True once at (tx, ty).
+    After a step landing on a ring cell, the path is replanned too if its next cell became blocked (see KnownMap.blocked),
+    the trip is abandoned if that cell is the target and no item is known there.
+    The step function on_step(reply) runs after every safe step, the trip is abandoned (False) when it returns True.
+    On large maps the planned paths stop short of far targets (hierarchy.py): walking one to its end is not a replan,
+    as long as it ends closer to the target than any earlier one (a path leading back cannot be followed forever).
+    """
+    known = planner.shared_map(agent.w, agent.h)
+    replans = 0
+    best = max(abs(tx - agent.x), abs(ty - agent.y))   #closest to the target a partial path ended
+    while replans < max_replans:
+        path, _ = known.plan((agent.x, agent.y), (tx, ty))
+        if path is None:
+            return False
+        x, y = agent.x, agent.y
+        replans += 1
+        replies = []
+        for i, (nx, ny) in enumerate(path):
+            if not replies:
+                replies = yield from walk(agent, path[i:])
+                if not replies:
+                    break
+            reply = replies.pop(0)
+            if not reply or (reply.get("x"), reply.get("y")) != (nx, ny):
+                break
+            d = get_direction_from_delta(nx - x, ny - y)
+            x, y = nx, ny
+            if check_wall_danger(reply.get("cell_val", 0)):
+                yield from step_back(agent, d)  # Retreat, the cell is now a known obstacle
+                if (nx, ny) == (tx, ty):
+                    return False
+                break
+            if on_step and (yield from on_step(reply)):
+                return False
+            if reply.get("cell_val", 0) > 0 and i + 1 < len(path) and ring_blocked(agent, known, path[i + 1]):
+                yield from sense_neighbours(agent)  # Extended sensor: the replan may go through once the neighbours are read
+                if path[i + 1] == (tx, ty) and ring_blocked(agent, known, (tx, ty)):
+                    return False  # The target itself may be a wall
+                break  # On a ring cell: the next cell may be a wall without warning, replan around it
+        else:
+            if path and (agent.x, agent.y) == path[-1] and max(abs(tx - agent.x), abs(ty - agent.y)) < best:
+                best = max(abs(tx - agent.x), abs(ty - agent.y))
+                replans -= 1  # Partial path walked to its end, nearer the target
+        if agent.completed or agent.game_over:
+            return False
+        if (agent.x, agent.y) == (tx, ty):
+            return True
+    return (agent.x, agent.y) == (tx, ty)
+
+
+@phased("claim")
+@purpose(CLAIM)
 def claim_known_item(agent, pos, is_key):
     """Go DIRECTLY to known item position and claim it"""
-    global game_over_flag
-    
     # Don't do anything if already complete or game over
     if agent.has_key and agent.has_box:
         return True
-    if game_over_flag:
+    if agent.game_over:
         return False
     
     print(f"Agent {agent.agent_id}: → Direct to {'key' if is_key else 'box'} at {pos}")
-    move_to(agent, pos[0], pos[1])
+    if not (yield from travel_planned(agent, pos[0], pos[1])):
+        yield from move_to(agent, pos[0], pos[1])  # No path over the known map: reactive wall avoidance
     
-    if game_over_flag:
+    if agent.game_over:
         return False
     
     # Verify and claim
-    data = get_data(agent)
+    data = yield from get_data(agent)
     if data is None:
         return False
     
     val = data.get("cell_val", 0)
     if val == 1.0:
-        info = get_item_owner(agent)
+        info = yield from get_item_owner(agent)
         if info and info.get("owner") == agent.agent_id:
             if is_key:
                 agent.has_key = True
@@ -861,6 +1051,51 @@ def claim_known_item(agent, pos, is_key):
     return False
 
 
+def localize_step(agent, d, here):
+    """
+    Step in direction d from a cell of value 'here' while localizing an item. Returns True once on the neighbour (False off
+    the map: there is nothing to undo). Next to an outer ring cell (below 0.5) the item is never adjacent: a 1.0 there is
+    a wall whose warning the item zone overrides. Guarded moves refuse it in the same request, the extended sensor reads
+    it first (with plain moves, localize_safely localizes from outer ring cells instead).
+    """
+    if not is_in_bounds(agent, get_target_from_direction(agent.x, agent.y, d)):
+        return False
+    old_x, old_y = agent.x, agent.y
+    if here < 0.5 and agent.guarded_moves:
+        yield from move(agent, d, guard=WALL_VALUE - 0.01)
+        return agent.x != old_x or agent.y != old_y
+    if here < 0.5:
+        sensed = yield from sense_neighbours(agent)
+        if sensed is not None and sensed.get(d, 0) >= WALL_VALUE:
+            return False
+    yield from move(agent, d)
+    return agent.x != old_x or agent.y != old_y
+
+
+def localize_safely(agent, visited):
+    """
+    Localize the item of the outer ring cell the agent stands on with plain moves, which cannot read a cell
+    before entering it: step by step along KnownMap.localize_path, on cells no wall can hold, reading the values that
+    rule out candidate positions (KnownMap.item_candidates) until the item is reached. Returns (is_own_item, position).
+    """
+    known = planner.shared_map(agent.w, agent.h)
+    ring = (agent.x, agent.y)
+    for _ in range(LOCALIZE_STEPS):
+        candidates = known.item_candidates(ring)
+        path = known.localize_path((agent.x, agent.y), candidates) if candidates else None
+        if not path:
+            return False, None
+        old = (agent.x, agent.y)
+        reply = yield from move(agent, get_direction_from_delta(path[0][0] - agent.x, path[0][1] - agent.y))
+        if not reply or (agent.x, agent.y) == old:
+            return False, None
+        if reply.get("cell_val", 0) == 1.0:
+            return (yield from process_item(agent, visited))
+    return False, None
+
+
+@phased("localize")
+@purpose(LOCALIZE)
 def smart_find_item(agent, visited):
     """
     Smart item detection using triangulation:
@@ -873,7 +1108,7 @@ def smart_find_item(agent, visited):
     if agent.completed:
         return False, None
     
-    val = get_data(agent).get("cell_val", 0)
+    val = yield from cell_val(agent)
     pos = (agent.x, agent.y)
     
     if val <= 0:
@@ -885,7 +1120,7 @@ def smart_find_item(agent, visited):
     
     # Already on item OR on wall (both are 1.0)
     if val == 1.0:
-        result = process_item(agent, visited)
+        result = yield from process_item(agent, visited)
         # If process_item returns None owner, it's a wall - skip it
         if result == (False, None):
             return False, None  # It's a wall, not an item
@@ -894,79 +1129,91 @@ def smart_find_item(agent, visited):
     # ADJACENT (0.5 or 0.6): item is 1 step away - just scan 8 neighbors once
     if val >= 0.5:
         for d in GRADIENT_DIRS:
-            move(agent, d)
-            check_val = get_data(agent).get("cell_val", 0)
+            if not (yield from localize_step(agent, d, val)):
+                continue  # Nothing to undo
+            check_val = yield from cell_val(agent)
             if check_val == 1.0:
-                result = process_item(agent, visited)
+                result = yield from process_item(agent, visited)
                 if result != (False, None):
                     return result
                 # It was a wall, go back and continue
-            move(agent, OPPOSITE[d])
+            yield from move(agent, OPPOSITE[d])
         return False, None
     
-    # NEAR (0.25 or 0.3): item is 2 steps away - triangulate
+    # NEAR (0.25 or 0.3): item is 2 steps away. Plain moves cannot read a cell first: a wall may stand next to the ring
+    if not agent.guarded_moves and agent.patch_size < 3:
+        return (yield from localize_safely(agent, visited))
+    
+    # Guarded moves or extended sensor: triangulate
     # Strategy: probe 2 opposite corners to find direction, then go direct
     start_x, start_y = agent.x, agent.y
     
     # Probe diagonal corners to triangulate
     probes = []
     for d in [UP_LEFT, DOWN_RIGHT]:  # Two opposite corners
-        move(agent, d)
-        v = get_data(agent).get("cell_val", 0)
+        if not (yield from localize_step(agent, d, val)):
+            continue
+        v = yield from cell_val(agent)
         probes.append((d, v, agent.x, agent.y))
-        move(agent, OPPOSITE[d])
+        yield from move(agent, OPPOSITE[d])
     
     # Find best probe
-    best = max(probes, key=lambda p: p[1])
+    best = max(probes, key=lambda p: p[1], default=None)
     
-    if best[1] > val:
+    if best and best[1] > val:
         # Move toward the better value
-        move(agent, best[0])
+        yield from move(agent, best[0])
         
         # If now adjacent or on item, find it
-        new_val = get_data(agent).get("cell_val", 0)
+        new_val = yield from cell_val(agent)
         if new_val == 1.0:
-            return process_item(agent, visited)
+            return (yield from process_item(agent, visited))
         elif new_val >= 0.5:
             # Now adjacent - quick scan
             for d in GRADIENT_DIRS:
-                move(agent, d)
-                if get_data(agent).get("cell_val", 0) == 1.0:
-                    return process_item(agent, visited)
-                move(agent, OPPOSITE[d])
+                if not (yield from localize_step(agent, d, new_val)):
+                    continue
+                if (yield from cell_val(agent)) == 1.0:
+                    return (yield from process_item(agent, visited))
+                yield from move(agent, OPPOSITE[d])
         elif new_val > val:
             # Keep following in same direction
             for _ in range(3):
-                move(agent, best[0])
-                v = get_data(agent).get("cell_val", 0)
+                if not (yield from localize_step(agent, best[0], new_val)):
+                    break
+                v = yield from cell_val(agent)
                 if v == 1.0:
-                    return process_item(agent, visited)
+                    return (yield from process_item(agent, visited))
                 if v < new_val:
                     break
                 new_val = v
     else:
         # Try the other diagonal pair
         for d in [UP_RIGHT, DOWN_LEFT]:
-            move(agent, d)
-            v = get_data(agent).get("cell_val", 0)
+            if not (yield from localize_step(agent, d, val)):
+                continue
+            v = yield from cell_val(agent)
             if v == 1.0:
-                return process_item(agent, visited)
+                return (yield from process_item(agent, visited))
             if v >= 0.5:
                 # Adjacent - quick scan remaining
                 for d2 in GRADIENT_DIRS:
-                    move(agent, d2)
-                    if get_data(agent).get("cell_val", 0) == 1.0:
-                        return process_item(agent, visited)
-                    move(agent, OPPOSITE[d2])
+                    if not (yield from localize_step(agent, d2, v)):
+                        continue
+                    if (yield from cell_val(agent)) == 1.0:
+                        return (yield from process_item(agent, visited))
+                    yield from move(agent, OPPOSITE[d2])
                 return False, None
             if v > val:
                 # Continue this direction
                 for _ in range(2):
-                    move(agent, d)
-                    if get_data(agent).get("cell_val", 0) == 1.0:
-                        return process_item(agent, visited)
+                    if not (yield from localize_step(agent, d, v)):
+                        break
+                    v = yield from cell_val(agent)
+                    if v == 1.0:
+                        return (yield from process_item(agent, visited))
                 return False, None
-            move(agent, OPPOSITE[d])
+            yield from move(agent, OPPOSITE[d])
     
     return False, None
 
@@ -977,11 +1224,11 @@ def process_item(agent, visited):
     if pos in visited:
         return False, pos
     
-    info = get_item_owner(agent)
+    info = yield from get_item_owner(agent)
     if info and info.get("header") == GET_ITEM_OWNER:
         owner, itype = info.get("owner"), info.get("type")
         if owner is not None:
-            broadcast(agent, itype, owner, pos)
+            yield from broadcast(agent, itype, owner, pos)
             visited.add(pos)
             if owner == agent.agent_id:
                 if itype == KEY_TYPE:
@@ -1007,38 +1254,37 @@ def process_item(agent, visited):
 
 
 def near_visited(agent, visited):
-    """Check if we're near a visited item or a known item of another agent"""
-    # Check visited set
-    for vx, vy in visited:
-        if abs(agent.x - vx) <= 2 and abs(agent.y - vy) <= 2:
-            return True
-    
-    # Check known items of other agents (skip their halos)
-    for owner, pos in agent.other_keys.items():
-        if pos and abs(agent.x - pos[0]) <= 2 and abs(agent.y - pos[1]) <= 2:
-            return True
-    for owner, pos in agent.other_boxes.items():
-        if pos and abs(agent.x - pos[0]) <= 2 and abs(agent.y - pos[1]) <= 2:
-            return True
-    
-    return False
+    """Check if we're near a visited item or a known item of another agent (skip their halos)"""
+    # Both are spatial.GridIndex: a few bucket lookups, however many items are known
+    return visited.near(agent.x, agent.y, 2) or agent.other_items.near(agent.x, agent.y, 2)
+
+
+def get_task_planner(agent):
+    """Task planner of an agent, created on first use (zones of get_zone_for_agent)"""
+    if not hasattr(agent, 'tasks'):
+        zones = [get_zone_for_agent(i, agent.nb_agent_expected, agent.w, agent.h) for i in range(agent.nb_agent_expected)]
+        agent.tasks = TaskPlanner(agent, zones)
+    return agent.tasks
 
 
 def check_known_items(agent):
     """Check if we know where our items are and go get them directly.
     Returns True if mission complete (has both key and box)."""
-    global game_over_flag
+    if agent.game_over:
+        return False
     
-    if game_over_flag:
+    # Makespan: while another agent is far behind, searching for its items comes first
+    tasks = get_task_planner(agent)
+    if len(tasks.swept) < len(tasks.zones) and not tasks.should_claim(PARAMS.claim_slack):
         return False
     
     # Priority 1: Get key if we know where it is
     if not agent.has_key and agent.my_key_pos:
-        claim_known_item(agent, agent.my_key_pos, is_key=True)
+        yield from claim_known_item(agent, agent.my_key_pos, is_key=True)
     
     # Priority 2: Get box if we have key and know where box is
     if agent.has_key and not agent.has_box and agent.my_box_pos:
-        claim_known_item(agent, agent.my_box_pos, is_key=False)
+        yield from claim_known_item(agent, agent.my_box_pos, is_key=False)
     
     # Return True if mission complete
     return agent.has_key and agent.has_box
@@ -1049,7 +1295,7 @@ def get_zone_for_agent(agent_id, nb_agents, W, H):
     Divide map into zones based on number of agents.
     Returns (x_start, x_end, y_start, y_end) for this agent's zone.
     """
-    OVERLAP = 2  # Overlap between zones to not miss items at boundaries
+    OVERLAP = PARAMS.zone_overlap  # Overlap between zones to not miss items at boundaries
     
     if nb_agents == 1:
         # Single agent: explore full map
@@ -1077,14 +1323,14 @@ def get_zone_for_agent(agent_id, nb_agents, W, H):
             return mid_x - OVERLAP, W, mid_y - OVERLAP, H
 
 
-def sweep_zone(agent, visited, x_start, x_end, y_start, y_end, STEP):
-    """Sweep a specific zone of the map with wall avoidance"""
+def sweep_zone(agent, visited, x_start, x_end, y_start, y_end, STEP, skip_covered=True):
+    """Sweep a specific zone of the map with wall avoidance (waypoints already sensed are skipped unless skip_covered is False)"""
     going_right = (agent.agent_id % 2 == 0)
     y = y_start
     previous_pos = (agent.x, agent.y)
     
     while y < y_end:
-        if check_known_items(agent):
+        if (yield from check_known_items(agent)):
             return True
         
         if going_right:
@@ -1093,16 +1339,20 @@ def sweep_zone(agent, visited, x_start, x_end, y_start, y_end, STEP):
             x_range = range(min(x_end - 1, agent.w - 1), x_start - 1, -STEP)
         
         for x in x_range:
-            if check_known_items(agent):
+            if (yield from check_known_items(agent)):
                 return True
+            if get_task_planner(agent).changed():
+                return False  # New information: let optimal_sweep pick the zone again
             
             x = max(0, min(x, agent.w - 1))
             target_y = max(0, min(y, agent.h - 1))
+            if skip_covered and planner.shared_map(agent.w, agent.h).covered[target_y, x]:
+                continue  # Already within sensing range of a visited cell
             
             stuck_count = 0
             while agent.x != x or agent.y != target_y:
                 old_x, old_y = agent.x, agent.y
-                move_step(agent, x, target_y)
+                yield from move_step(agent, x, target_y)
                 
                 # Check if stuck
                 if agent.x == old_x and agent.y == old_y:
@@ -1113,32 +1363,32 @@ def sweep_zone(agent, visited, x_start, x_end, y_start, y_end, STEP):
                     stuck_count = 0
                     previous_pos = (old_x, old_y)
                 
-                data = get_data(agent)
+                data = yield from get_data(agent)
                 if data is None:
                     continue
                 val = data.get("cell_val", 0)
                 
                 # Detect wall warning zone
                 if check_wall_danger(val):
-                    contour_around_wall(agent, x, target_y, previous_pos)
+                    yield from contour_around_wall(agent, x, target_y, previous_pos)
                     break
                 
                 if val > 0 and val < 1.0 and not near_visited(agent, visited):
-                    smart_find_item(agent, visited)
-                    if check_known_items(agent):
+                    yield from smart_find_item(agent, visited)
+                    if (yield from check_known_items(agent)):
                         return True
             
-            data = get_data(agent)
+            data = yield from get_data(agent)
             if data is None:
                 continue
             val = data.get("cell_val", 0)
             
             if check_wall_danger(val):
-                contour_around_wall(agent, x, target_y, previous_pos)
+                yield from contour_around_wall(agent, x, target_y, previous_pos)
                 continue
             
             if val > 0 and not near_visited(agent, visited):
-                smart_find_item(agent, visited)
+                yield from smart_find_item(agent, visited)
             
             if agent.has_key and agent.has_box:
                 return True
@@ -1149,118 +1399,206 @@ def sweep_zone(agent, visited, x_start, x_end, y_start, y_end, STEP):
     return False
 
 
+@phased("sweep")
+@purpose(EXPLORE)
 def optimal_sweep(agent, visited):
     """
     Optimal sweep strategy for 1-4 agents with dynamic zone adaptation.
     """
     W, H = agent.w, agent.h
-    STEP = 4
-    nb_agents = agent.nb_agent_expected
+    STEP = PARAMS.sweep_step
     
     # Check known items first
-    if check_known_items(agent):
+    if (yield from check_known_items(agent)):
         return
     
-    # Get this agent's primary zone
-    x1, x2, y1, y2 = get_zone_for_agent(agent.agent_id, nb_agents, W, H)
-    print(f"Agent {agent.agent_id}: Sweeping zone ({x1},{y1}) to ({x2},{y2})")
+    # Sweep the zones in the order of the task planner, re-ranked whenever something is learnt
+    tasks = get_task_planner(agent)
+    while not agent.completed and not agent.game_over:
+        zone = tasks.next_zone()
+        if zone is None:
+            break
+        x1, x2, y1, y2 = tasks.zones[zone]
+        print(f"Agent {agent.agent_id}: Sweeping zone of agent {zone} ({x1},{y1}) to ({x2},{y2})")
+        if (yield from sweep_zone(agent, visited, x1, x2, y1, y2, STEP)):
+            return
+        if not tasks.changed():
+            tasks.mark_swept(zone)  # Interrupted sweeps are ranked again
+        if (yield from check_known_items(agent)):
+            return
     
-    # Sweep primary zone
-    success = sweep_zone(agent, visited, x1, x2, y1, y2, STEP)
-    if success:
-        return
+    # Final fallback: full map sweep
+    if not (agent.has_key and agent.has_box):
+        print(f"Agent {agent.agent_id}: Full map sweep...")
+        yield from sweep_zone(agent, visited, 0, W, 0, H, STEP, skip_covered=False)
+
+
+def exploration_step(agent, visited):
+    """on_step step function of travel_planned for exploration trips: stop on a halo (after searching the item) or on news"""
+    def on_step(reply):
+        val = reply.get("cell_val", 0) if reply else 0
+        if 0 < val < 1.0 and not check_wall_danger(val) and not near_visited(agent, visited):
+            yield from smart_find_item(agent, visited)
+            return True
+        return get_task_planner(agent).changed()
+    return on_step
+
+
+@phased("sweep")
+@purpose(EXPLORE)
+def belief_explore(agent, visited):
+    """
+    Exploration by expected information gain (belief.py): travel to the cell whose reading rules out or reveals the most
+    item weight per step, checking halos on the way, then choose again. Falls back to optimal_sweep once nothing is left.
+    """
+    if not hasattr(agent, 'belief'):
+        agent.belief = Belief(agent.w, agent.h)
+    belief = agent.belief
+    known = planner.shared_map(agent.w, agent.h)
+    unreachable = np.zeros((agent.h, agent.w), dtype=bool)
+    on_step = exploration_step(agent, visited)
+    
+    while not agent.completed and not agent.game_over:
+        if (yield from check_known_items(agent)):
+            return
+        get_task_planner(agent).acknowledge()
+        belief.sync([agent.my_key_pos, agent.my_box_pos, *agent.other_keys.values(), *agent.other_boxes.values(), *visited])
+        target = belief.best_target(agent.x, agent.y, unreachable)
+        while target is not None and known.blocked(target[0], target[1], target[0] + 1, target[1] + 1)[0, 0]:
+            unreachable[target[1], target[0]] = True  # Obstacle or next to one: only the chosen cell is checked, not the whole map
+            target = belief.best_target(agent.x, agent.y, unreachable)
+        if target is None:
+            break
+        if target == (agent.x, agent.y):
+            val = yield from cell_val(agent)
+            if 0 < val < 1.0 and not check_wall_danger(val) and not near_visited(agent, visited):
+                yield from smart_find_item(agent, visited)
+            belief.rule_out(agent.x, agent.y)
+            continue
+        if not (yield from travel_planned(agent, target[0], target[1], on_step=on_step)) and (agent.x, agent.y) != target:
+            unreachable[target[1], target[0]] = True
     
-    if agent.has_key and agent.has_box:
-        return
+    if not (agent.has_key and agent.has_box):
+        yield from optimal_sweep(agent, visited)
+
+
+@phased("sweep")
+@purpose(EXPLORE)
+def frontier_explore(agent, visited):
+    """
+    Frontier-based exploration (frontier.py): travel to the closest cell bordering the area nobody sensed yet,
+    searching the halos met on the way, then choose again. Falls back to optimal_sweep once no frontier is reachable.
+    """
+    front = frontier.shared_frontier(agent.w, agent.h)
+    front.observe(agent.x, agent.y)
+    known = planner.shared_map(agent.w, agent.h)
+    on_step = exploration_step(agent, visited)
     
-    # Smart fallback: explore zones of OTHER agents
-    for other_id in range(nb_agents):
-        if other_id == agent.agent_id:
-            continue
-        
-        if check_known_items(agent):
+    while not agent.completed and not agent.game_over:
+        if (yield from check_known_items(agent)):
             return
-        
-        # Get other agent's zone
-        ox1, ox2, oy1, oy2 = get_zone_for_agent(other_id, nb_agents, W, H)
-        
-        if not (agent.has_key and agent.has_box):
-            print(f"Agent {agent.agent_id}: Exploring Agent {other_id}'s zone ({ox1},{oy1}) to ({ox2},{oy2})")
-            success = sweep_zone(agent, visited, ox1, ox2, oy1, oy2, STEP)
-            if success:
-                return
+        get_task_planner(agent).acknowledge()
+        target = frontier.next_target(front, known, agent.x, agent.y, agent.agent_id)
+        if target is None:
+            break
+        if not (yield from travel_planned(agent, target[0], target[1], on_step=on_step)) and (agent.x, agent.y) != target:
+            if not agent.game_over and not get_task_planner(agent).changed():
+                front.give_up(agent.agent_id, target)
     
-    # Final fallback: full map sweep
     if not (agent.has_key and agent.has_box):
-        print(f"Agent {agent.agent_id}: Full map sweep...")
-        sweep_zone(agent, visited, 0, W, 0, H, STEP)
+        yield from optimal_sweep(agent, visited)
 
 
-def agent_loop(agent):
-    global game_over_flag
+STRATEGIES = {"sweep": optimal_sweep, "belief": belief_explore, "frontier": frontier_explore}
+
+
+def play(agent, explore):
+    """Steps of an agent for the whole game: explore (a strategy of STRATEGIES) until both items are claimed or the game is over"""
     print(f"Agent {agent.agent_id}: Start ({agent.x}, {agent.y})")
-    visited = set()
+    visited = spatial.GridIndex()  # Items processed by this agent
     
-    try:
-        while not agent.completed and not game_over_flag:
-            optimal_sweep(agent, visited)
-            
-            if game_over_flag:
-                agent.completed = True
-                break
-            
-            if agent.has_key and agent.has_box:
-                agent.completed = True
-                agent.network.send({
-                    "header": BROADCAST_MSG, "Msg type": COMPLETED,
-                    "position": (agent.x, agent.y), "owner": agent.agent_id
-                })
-                print(f"Agent {agent.agent_id}: ═══ DONE ═══")
-                break
-            
-            time.sleep(0.1)
-    except Exception as e:
-        import traceback
-        print(f"Agent {agent.agent_id}: Error: {e}")
-        traceback.print_exc()
+    while not agent.completed and not agent.game_over:
+        yield from explore(agent, visited)
+        
+        if agent.game_over:
+            agent.completed = True
+            break
+        
+        if agent.has_key and agent.has_box:
+            agent.completed = True
+            yield SEND, {
+                "header": BROADCAST_MSG, "Msg type": COMPLETED,
+                "position": (agent.x, agent.y), "owner": agent.agent_id
+            }
+            print(f"Agent {agent.agent_id}: ═══ DONE ═══")
+            break
+        
+        yield WAIT, 0.1
+
+
+def agent_loop(agent, explore=optimal_sweep):
+    """Thread of an agent: its steps (play) over the agent's connection"""
+    with profiler.profiled(f"agent_{agent.agent_id}"):
+        try:
+            run_steps(agent, play(agent, explore))
+        except Exception as e:
+            import traceback
+            print(f"Agent {agent.agent_id}: Error: {e}")
+            traceback.print_exc()
 
 
 if __name__ == "__main__":
-    import sys
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--server_ip", help="Ip address of the server", type=str, default="localhost")
+    parser.add_argument("-n", "--nb_local", help="Number of agents run by this process (default: all the agents expected by the server)", type=int, default=0)
+    parser.add_argument("-s", "--strategy", help="Exploration strategy", choices=sorted(STRATEGIES), default="sweep")
+    parser.add_argument("-mx", "--multiplex", help="Run all the local agents over a single connection and receiver thread", action="store_true")
+    parser.add_argument("-shm", "--shared_memory", help="Ask the server for the shared memory transport (server.py -shm), local server only", action="store_true")
+    parser.add_argument("-pf", "--profile", help="Profile the agent threads, writes PREFIX.collapsed (flamegraph) and prints the time per phase", type=str, nargs="?", const="profile", metavar="PREFIX")
+    args = parser.parse_args()
     
     print("Starting agents...")
+    mux = MuxNetwork(args.server_ip, args.shared_memory) if args.multiplex else None
+    def connect():
+        """ Endpoint of one more agent, None lets Agent open its own TCP connection """
+        if mux is not None:
+            return mux.channel()
+        return Network(args.server_ip, shared_memory=True) if args.shared_memory else None
     
-    # Create first agent
-    agents = [Agent("localhost")]
-    
-    # Wait until we know how many agents are expected
-    while agents[0].nb_agent_expected == 0:
-        time.sleep(0.1)
+    # Create first agent, it tells us how many agents the server expects
+    agents = [Agent(args.server_ip, wait_for_start=False, network=connect())]
     
     nb_expected = agents[0].nb_agent_expected
-    print(f"Server expects {nb_expected} agents")
+    nb_local = min(args.nb_local, nb_expected) if args.nb_local > 0 else nb_expected
+    print(f"Server expects {nb_expected} agents, {nb_local} run in this process")
     
     # Create remaining agents
-    for i in range(1, nb_expected):
-        agents.append(Agent("localhost"))
+    for i in range(1, nb_local):
+        agents.append(Agent(args.server_ip, wait_for_start=False, network=connect()))
+    
+    # Block until the server pushes the game start
+    for a in agents:
+        a.wait_for_connected_agent()
     
     print(f"Created {len(agents)} agents | Map: {agents[0].w}x{agents[0].h}")
     for a in agents:
         print(f"  Agent {a.agent_id} at ({a.x}, {a.y})")
     
     # Start all agent threads
+    prof = profiler.start() if args.profile else None
     threads = []
     for agent in agents:
-        t = Thread(target=agent_loop, args=(agent,), daemon=True)
+        t = Thread(target=agent_loop, args=(agent, STRATEGIES[args.strategy]), daemon=True)
         threads.append(t)
         t.start()
     
-    # Wait for all agents to complete or game over
+    # Wait for all agents to complete or game over (reported by the server to each agent)
     try:
-        while not all(a.completed for a in agents) and not game_over_flag:
-            time.sleep(1)
+        while not all(a.completed for a in agents):
+            agents[0].game_over_event.wait(1)  # Wakes up as soon as the server pushes GAME_OVER
             
-            if game_over_flag:
+            if any(a.game_over for a in agents):
                 print("💀 GAME OVER - An agent hit a wall!")
                 break
             
@@ -1272,8 +1610,13 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         print("Stopped")
     
-    if game_over_flag:
+    if any(a.game_over for a in agents):
         print("💀 === GAME OVER === 💀")
     else:
         print("=== ALL DONE ===")
-
+    
+    if prof:
+        prof.stop()
+        prof.write_collapsed(f"{args.profile}.collapsed")
+        print(prof.summary())
+        print(f"Flamegraph stacks written to {args.profile}.collapsed")
@@ -0,0 +1,127 @@
+"""
+Content-addressed cache of the per-map artifacts derived from resources/config.json.
+The artifacts of a map (cell values, cell-kind grid, warning and wall masks, landmark distance tables) are built once,
+saved as .npy files under resources/cache/<hash>/ and memory-mapped on the next runs. The hash covers the map config,
+the number of agents (only their items are placed) and CACHE_VERSION, so editing a map invalidates its entry by itself.
+"""
+
+import hashlib, json, os, shutil, tempfile
+import numpy as np
+from my_constants import *
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "resources", "cache")
+CACHE_VERSION = 2   #bump when the way the artifacts are derived changes
+NB_LANDMARKS = 8
+UNREACHABLE = -1    #distance stored for the cells a landmark cannot reach
+
+# Cell kinds of the 'kinds' grid
+KIND_EMPTY = 0
+KIND_ITEM_ZONE = 1  #cells around a key or a box
+KIND_ITEM = 2
+KIND_WARNING = 3    #cells around a wall
+KIND_WALL = 4
+
+
+def cache_key(map_cfg, nb_agents):
+    """ Hash identifying the artifacts of a map config played by 'nb_agents' agents """
+    content = json.dumps({"map": map_cfg, "nb_agents": nb_agents, "version": CACHE_VERSION}, sort_keys=True)
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+def load(map_cfg, nb_agents, build):
+    """
+    Artifacts of the map as a dict of read-only arrays. On a cache miss, build() must return the dict
+    {"map_real", "wall_mask", "items", "wall_kinds"} (items: (n, 2) array of the key and box positions, wall_kinds: KIND_WALL
+    on the cells of the walls and KIND_WARNING on their warning zones, even where an item zone overrides them), the other
+    artifacts are derived here.
+    """
+    path = os.path.join(CACHE_DIR, cache_key(map_cfg, nb_agents))
+    try:
+        return {name[:-4]: np.load(os.path.join(path, name), mmap_mode="r") for name in os.listdir(path) if name.endswith(".npy")}
+    except (OSError, ValueError):   #not cached yet or unreadable entry: rebuild it
+        pass
+    artifacts = derive(**build())
+    save(path, artifacts)
+    for array in artifacts.values():
+        array.flags.writeable = False
+    return artifacts
+
+
+def save(path, artifacts):
+    """ Write the entry in a temporary directory and rename it, so concurrent servers never read a partial entry """
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=CACHE_DIR)
+        for name, array in artifacts.items():
+            np.save(os.path.join(tmp, name + ".npy"), array)
+        try:
+            os.rename(tmp, path)
+        except OSError:     #another process stored the same entry first
+            shutil.rmtree(tmp, ignore_errors=True)
+    except OSError as e:    #read-only checkout: run without cache
+        print(f"Map cache disabled: {e}")
+
+
+def derive(map_real, wall_mask, items, wall_kinds):
+    """ All the artifacts of a map from its cell values, wall cells, item positions and wall layout """
+    warning_mask = map_real == WALL_WARNING_PERCENTAGE
+    kinds = np.full(map_real.shape, KIND_EMPTY, dtype=np.int8)
+    kinds[(map_real > 0) & ~warning_mask] = KIND_ITEM_ZONE
+    kinds[warning_mask] = KIND_WARNING
+    kinds[wall_mask] = KIND_WALL
+    kinds[items[:, 1], items[:, 0]] = KIND_ITEM
+    landmarks, landmark_dist = landmark_tables(wall_mask)
+    return {"map_real": map_real, "wall_mask": wall_mask, "warning_mask": warning_mask, "kinds": kinds,
+            "landmarks": landmarks, "landmark_dist": landmark_dist, "wall_kinds": wall_kinds}
+
+
+def distance_field(blocked, sources):
+    """
+    Number of 8-connected moves from the nearest of 'sources' ((n, 2) array of (x, y)) to every cell, without entering a
+    blocked cell. UNREACHABLE where there is no path. Breadth-first search as a wavefront of whole-array dilations.
+    """
+    h, w = blocked.shape
+    dist = np.full((h, w), UNREACHABLE, dtype=np.int32)
+    frontier = np.zeros((h, w), dtype=bool)
+    frontier[sources[:, 1], sources[:, 0]] = True
+    frontier &= ~blocked
+    d = 0
+    while frontier.any():
+        dist[frontier] = d
+        grown = frontier.copy()     #8-neighbourhood dilation, separable: rows then columns
+        grown[1:] |= frontier[:-1]
+        grown[:-1] |= frontier[1:]
+        rows = grown.copy()
+        grown[:, 1:] |= rows[:, :-1]
+        grown[:, :-1] |= rows[:, 1:]
+        frontier = grown & ~blocked & (dist == UNREACHABLE)
+        d += 1
+    return dist
+
+
+def landmark_tables(blocked, nb_landmarks=NB_LANDMARKS):
+    """
+    Landmarks picked by farthest-point selection over the free cells, and their (nb_landmarks, h, w) distance tables.
+    |dist[l][a] - dist[l][b]| is a lower bound of the distance between a and b (ALT heuristic, one lookup per landmark).
+    """
+    free_y, free_x = np.nonzero(~blocked)
+    if len(free_x) == 0:
+        return np.zeros((0, 2), dtype=np.int32), np.zeros((0,) + blocked.shape, dtype=np.int32)
+    landmarks, tables = [], []
+    x, y = free_x[0], free_y[0]
+    nearest = None  #distance from each cell to the closest landmark picked so far
+    for _ in range(nb_landmarks):
+        dist = distance_field(blocked, np.array([(x, y)]))
+        landmarks.append((x, y))
+        tables.append(dist)
+        reach = np.where(dist == UNREACHABLE, -1, dist)
+        nearest = reach if nearest is None else np.minimum(nearest, reach)
+        if nearest.max() <= 0:  #every reachable cell is a landmark
+            break
+        y, x = np.unravel_index(np.argmax(nearest), nearest.shape)
+    return np.array(landmarks, dtype=np.int32), np.stack(tables)
+
+
+def clear():
+    """ Remove every cache entry """
+    shutil.rmtree(CACHE_DIR, ignore_errors=True)
@@ -13,6 +13,11 @@ MOVE = 2
 GET_NB_CONNECTED_AGENTS = 3
 GET_NB_AGENTS = 4
 GET_ITEM_OWNER = 5
+GAME_START = 6  #pushed by the server to every agent once all of them are connected
+GAME_OVER = 7   #pushed by the server to every agent as soon as one of them hits a wall
+GET_PATCH = 8   #get the k x k cell values around the agent at once (extended sensor game mode only)
+MUX_JOIN = 9    #get one more agent id on the same connection (multiplexed transport, network.MuxNetwork)
+SHM_OPEN = 10   #switch the connection to shared memory rings (server and agent on the same host, shm_transport.py)
 
 """ ALLOWED MOVES """
 STAND = 0   #do not move
@@ -25,6 +30,15 @@ UP_RIGHT = 6
 DOWN_LEFT = 7
 DOWN_RIGHT = 8
 
+""" MOVE PURPOSES """   #optional "purpose" of a MOVE, the game counts the moves of each agent per purpose (Game.move_counts)
+EXPLORE = 0     #sweeping / exploring the map
+LOCALIZE = 1    #searching an item around its halo
+BYPASS = 2      #going around a wall
+PROBE = 3       #reading a neighbour cell, or stepping back from it
+CLAIM = 4       #going to a known item
+UNTAGGED = 5    #MOVE without a purpose
+PURPOSES = ["explore", "localize", "bypass", "probe", "claim", "untagged"]
+
 """ BROADCAST TYPES """
 KEY_DISCOVERED = 1  #inform other agents that you discovered a key
 BOX_DISCOVERED = 2
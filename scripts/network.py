@@ -5,27 +5,140 @@ __license__ = "Apache License 2.0"
 __version__ = "1.0.0"
 
 import socket, pickle
+from threading import Thread, Lock
+from queue import Queue
+from my_constants import *
+from shm_transport import ShmChannel, LOCAL_HOSTS, ORDERED
 
 
 class Network:
     """ Class that is used by the agent to communicate with the server """
-    def __init__(self, server_ip="localhost"):
+    def __init__(self, server_ip="localhost", shared_memory=False):
         self.client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)    #pipelined moves (pipeline.py) must not wait for the previous ones to be acknowledged
         self.conf = (server_ip, 5555)
+        self.channel = None     #shm_transport.ShmChannel once negotiated
+        self.pending = []   #msgs that arrived on the socket while negotiating
         self.id = self.connect()
+        if shared_memory and server_ip in LOCAL_HOSTS and ORDERED:   #opt-in, the server must accept it too (server.py -shm)
+            self.open_shared_memory()
 
     def connect(self):
         try:
             self.client.connect(self.conf)
-            return pickle.loads(self.client.recv(1024))
+            self.stream = self.client.makefile("rb")    #pickles are self-delimiting: reading them from a buffered stream keeps back-to-back messages apart
+            return pickle.load(self.stream)
         except Exception as e:
             raise
     
+    def open_shared_memory(self):
+        """ Ask the server to carry the rest of the traffic over shared memory, stay on TCP if it declines """
+        self.client.sendall(pickle.dumps({"header": SHM_OPEN}))
+        msg = pickle.load(self.stream)
+        while msg["header"] != SHM_OPEN:    #pushes sent before the switch
+            self.pending.append(msg)
+            msg = pickle.load(self.stream)
+        if msg["name"] is not None:
+            self.channel = ShmChannel.attach(msg["name"], self.client)
+    
     def send(self, data):
         try:
-            self.client.sendall(pickle.dumps(data))
+            if self.channel is not None:
+                self.channel.send(data)
+            else:
+                self.client.sendall(pickle.dumps(data))
+        except ValueError:  #larger than a shared memory ring: nothing was sent, the caller must know
+            raise
         except Exception as e:
             print(e)
     
     def receive(self):
-        return pickle.loads(self.client.recv(1024))
\ No newline at end of file
+        if self.pending:
+            return self.pending.pop(0)
+        if self.channel is not None:
+            return self.channel.receive()
+        return pickle.load(self.stream)
+
+
+class MuxNetwork:
+    """
+    One connection carrying the traffic of several agents of this process (multiplexed transport).
+    Requests are tagged with the id of their agent ("mux_id"), the server tags the replies with it ("to").
+    Pushes (GAME_START, GAME_OVER, broadcasts) arrive once per connection and are handed to every agent but their sender.
+    A single receiver thread dispatches the messages to the channels, instead of one thread per agent.
+    """
+    def __init__(self, server_ip="localhost", shared_memory=False):
+        self.network = Network(server_ip, shared_memory)   #the id sent at connection is the one of the first channel
+        self.send_lock = Lock()     #agents send from their own threads
+        self.join_lock = Lock()
+        self.joined = Queue()   #channels created from the MUX_JOIN replies
+        self.channels = {self.network.id: MuxChannel(self, self.network.id)}
+        self.unused = [self.network.id]
+        Thread(target=self.receive_cb, daemon=True).start()
+
+
+    def channel(self):
+        """ Endpoint of one more agent, to pass as Agent(network=...). Raises RuntimeError once the server has no id left """
+        with self.join_lock:
+            if self.unused:
+                return self.channels[self.unused.pop()]
+            self.send({"header": MUX_JOIN})
+            channel = self.joined.get()
+        if channel is None:
+            raise RuntimeError("The server expects no more agents")
+        return channel
+
+
+    def send(self, data):
+        with self.send_lock:
+            self.network.send(data)
+
+
+    def receive_cb(self):
+        """ Dispatch the incoming messages to the channels """
+        try:
+            while True:
+                msg = self.network.receive()
+                if msg["header"] == MUX_JOIN:   #the channel exists before any later message can address it
+                    channel = MuxChannel(self, msg["id"]) if msg["id"] is not None else None
+                    if channel is not None:
+                        self.channels[channel.id] = channel
+                    self.joined.put(channel)
+                elif "to" in msg:
+                    self.channels[msg["to"]].deliver(msg)
+                else:
+                    for channel in list(self.channels.values()):
+                        if msg["header"] != BROADCAST_MSG or msg.get("sender") != channel.id:
+                            channel.deliver(msg)
+        except (EOFError, OSError):
+            pass
+
+
+class MuxChannel:
+    """ Endpoint of one agent on a MuxNetwork, same interface as Network plus attach() """
+    def __init__(self, mux, agent_id):
+        self.mux = mux
+        self.id = agent_id
+        self.inbox = Queue()    #messages received before a handler is attached
+        self.handler = None
+        self.lock = Lock()
+
+    def send(self, data):
+        self.mux.send(dict(data, mux_id=self.id))
+
+    def receive(self):
+        return self.inbox.get()
+
+    def attach(self, handler):
+        """ From now on the messages are passed to 'handler' by the receiver thread (queued ones first, in order) """
+        with self.lock:
+            while not self.inbox.empty():
+                handler(self.inbox.get())
+            self.handler = handler
+
+    def deliver(self, msg):
+        with self.lock:
+            if self.handler is None:
+                self.inbox.put(msg)
+            else:
+                self.handler(msg)
@@ -0,0 +1,56 @@
+"""
+Pipelined moves: follow a planned path with several MOVE requests in flight instead of one round trip per step.
+Every move after the first one is conditional ("max_cell_val"): the server applies it only if the cell the agent stands on
+holds at most this value, otherwise it refuses it ("skipped" in the reply). The requests of an agent are processed in order,
+so once a step lands on a halo, a wall warning or an item, the moves queued behind it are all refused: the speculation
+never carries the agent past a cell that needs a decision, and there is nothing to roll back.
+Replies carry the sequence number of their request ("seq"), the agent queues them in pipelined_replies.
+"""
+
+from collections import deque
+from queue import Empty
+from my_constants import *
+from directions import FROM_DELTA
+
+DEPTH = 4   #moves in flight
+SAFE_VAL = 0    #the next queued move is applied only from a cell holding at most this value
+
+
+def follow(agent, path, depth=DEPTH, max_cell_val=SAFE_VAL, timeout=1.0):
+    """
+    Move along 'path' (cells, each one adjacent to the previous one, the first one next to the agent) with up to 'depth'
+    moves in flight. Stops after the first step landing on a cell above max_cell_val, at game over, once the agent completed,
+    or when no reply comes within 'timeout' (s). Returns the replies of the applied moves, in order.
+    Unless a reply was lost, every move sent is answered before returning: agent.x, agent.y are up to date.
+    """
+    replies = []
+    in_flight = deque()     #(seq, cell the move should reach)
+    x, y = agent.x, agent.y     #where the agent stands once the moves in flight are applied
+    i = 0
+    stopped = False
+    while True:
+        while not stopped and i < len(path) and len(in_flight) < depth and not agent.completed and not agent.game_over:
+            nx, ny = path[i]
+            agent.seq += 1
+            msg = {"header": MOVE, "direction": FROM_DELTA[ny - y + 1][nx - x + 1], "seq": agent.seq, "purpose": agent.purpose}
+            if i > 0:
+                msg["max_cell_val"] = max_cell_val
+            agent.network.send(msg)
+            in_flight.append((agent.seq, (nx, ny)))
+            x, y = nx, ny
+            i += 1
+        if not in_flight:
+            return replies
+        try:
+            reply = agent.pipelined_replies.get(timeout=timeout)
+        except Empty:
+            return replies
+        if reply["seq"] < in_flight[0][0]:  #late reply of a pipeline that timed out
+            continue
+        _, cell = in_flight.popleft()
+        if stopped or reply.get("skipped"):
+            stopped = True
+            continue
+        replies.append(reply)
+        if reply.get("game_over") or reply["cell_val"] > max_cell_val or (reply["x"], reply["y"]) != cell:
+            stopped = True  #the moves in flight are refused or, after a game over, ignored
@@ -0,0 +1,317 @@
+"""
+Path planning over the wall layout the agents discovered so far.
+KnownMap records the cell values the agents observe. Warning cells (0.35) are obstacles: a wall is always behind them.
+Unknown cells are assumed free, unless they touch a known obstacle or ring cell (an item zone overrides the warning zone
+of the walls around it). A* uses the ALT heuristic: landmark distance tables (see map_cache) computed over the known
+obstacles and rebuilt lazily as walls are discovered. Tables built before the latest discoveries stay admissible, since new obstacles can only make paths longer. One KnownMap is shared by all the agents of a process (shared_map).
+The blocked() mask is cached and updated around each cell whose state changes, never recomputed over the whole map.
+Large maps (hierarchy.MIN_SIZE) are planned over a cluster graph instead (hierarchy.py), kept up to date from the log of
+the cells whose blocked() status may have changed.
+"""
+
+import heapq
+from collections import deque
+from threading import Lock
+import numpy as np
+from my_constants import *
+from directions import NEIGHBOUR_DIRS, DELTAS
+import map_cache
+import hierarchy
+
+UNKNOWN, FREE, OBSTACLE, RING = 0, 1, 2, 3     #RING: free cell of an item zone, where the warning zone of a wall may be overridden
+REBUILD_AFTER = 10  #new obstacles before the landmark tables are rebuilt
+SENSE_RADIUS = 2    #an item is noticed from anywhere in its 5x5 halo
+
+_shared = {}    #(w, h) -> KnownMap of this process
+_shared_lock = Lock()
+
+
+def shared_map(w, h):
+    """ KnownMap shared by the agents of this process playing on a w x h map """
+    with _shared_lock:
+        if (w, h) not in _shared:
+            _shared[(w, h)] = KnownMap(w, h)
+        return _shared[(w, h)]
+
+
+def reset():
+    """ Forget the maps of previous games (several episodes played in one process) """
+    with _shared_lock:
+        _shared.clear()
+
+
+class KnownMap:
+    """ What the agents know about the map, with lazily refreshed landmark tables """
+    def __init__(self, w, h, nb_landmarks=map_cache.NB_LANDMARKS):
+        self.w, self.h = w, h
+        self.nb_landmarks = nb_landmarks
+        self.cells = np.full((h, w), UNKNOWN, dtype=np.int8)
+        self.values = np.full((h, w), np.nan)  #values observed, NaN where unknown
+        self.covered = np.zeros((h, w), dtype=bool)    #cells within SENSE_RADIUS of a known one: an item there would have been noticed
+        self.item_zones = np.zeros((h, w), dtype=bool)     #5x5 zones of the items found: no wall stands there
+        self.nb_uncovered = w * h   #cells of 'covered' still False
+        self.lock = Lock()
+        self.new_obstacles = 0
+        self.landmark_dist = None   #[landmark][y][x] nested lists, map_cache.UNREACHABLE where not reachable
+        self.blocked_mask = np.zeros((h, w), dtype=bool)   #blocked(), kept up to date from observe() and block()
+        self.blocked_rows = self.blocked_mask.tolist()  #the same as nested lists, read by astar
+        self.changes = []   #cells whose blocked() status changed, in order (read by the hierarchy)
+        self.hierarchy = hierarchy.Hierarchy(self) if max(w, h) >= hierarchy.MIN_SIZE else None
+
+
+    def observe(self, x, y, val):
+        """ Record the value of a cell an agent stood on """
+        if not (0 <= x < self.w and 0 <= y < self.h):
+            return
+        if abs(val - WALL_WARNING_PERCENTAGE) < 0.01:
+            state = OBSTACLE
+        else:
+            state = RING if 0 < val < WALL_VALUE else FREE
+        with self.lock:
+            self.values[y, x] = val
+            previous = self.cells[y, x]
+            if previous != OBSTACLE:   #a danger cell stays one
+                if state == OBSTACLE:
+                    self.new_obstacles += 1
+                self.cells[y, x] = state
+                if previous == UNKNOWN:
+                    self._cover(x, y)
+                if previous != state:
+                    self._refresh_blocked(x - 1, y - 1, x + 2, y + 2)
+
+
+    def block(self, x, y):
+        """ Mark a cell as an obstacle (e.g. where an agent got stuck) """
+        if 0 <= x < self.w and 0 <= y < self.h:
+            with self.lock:
+                if self.cells[y, x] != OBSTACLE:
+                    if self.cells[y, x] == UNKNOWN:
+                        self._cover(x, y)
+                    self.cells[y, x] = OBSTACLE
+                    self.new_obstacles += 1
+                    self._refresh_blocked(x - 1, y - 1, x + 2, y + 2)
+
+
+    def item_found(self, x, y):
+        """ An item stands at (x, y): walls are never placed in its 5x5 zone, the unknown cells there are not blocked """
+        r = SENSE_RADIUS
+        x0, y0, x1, y1 = max(0, x - r), max(0, y - r), min(self.w, x + r + 1), min(self.h, y + r + 1)
+        with self.lock:
+            if self.item_zones[y0:y1, x0:x1].all():
+                return
+            self.item_zones[y0:y1, x0:x1] = True
+            self._refresh_blocked(x0, y0, x1, y1)
+
+
+    def item_candidates(self, ring):
+        """
+        Positions at distance 2 of the outer ring cell 'ring' (0.25 for a key, 0.3 for a box) where its item
+        may stand: no known value in their 5x5 zone is 0 or a warning, and their own value is unknown or an item's.
+        Overlapping zones overwrite each other's ring levels, so known ring values cannot rule a position out.
+        """
+        r, (rx, ry) = SENSE_RADIUS, ring
+        candidates = []
+        with self.lock:
+            for ix in range(rx - r, rx + r + 1):
+                for iy in range(ry - r, ry + r + 1):
+                    if max(abs(ix - rx), abs(iy - ry)) != r or not (0 <= ix < self.w and 0 <= iy < self.h):
+                        continue
+                    zone = self.values[max(0, iy - r):iy + r + 1, max(0, ix - r):ix + r + 1]
+                    known = ~np.isnan(zone)
+                    if (known & ((zone < 0.01) | (np.abs(zone - WALL_WARNING_PERCENTAGE) < 0.01))).any():
+                        continue
+                    if np.isnan(self.values[iy, ix]) or self.values[iy, ix] >= WALL_VALUE:
+                        candidates.append((ix, iy))
+        return candidates
+
+
+    def localize_path(self, start, candidates):
+        """
+        Cells to step on from 'start' to localize the item among 'candidates' (item_candidates), all of them cells no wall
+        can hold: known free or ring cells, cells next to a free one (see blocked), cells in the zone of every candidate.
+        Leads to the item once one candidate is left, otherwise to the closest cell whose value tells candidates apart.
+        None when there is no such cell.
+        """
+        r = SENSE_RADIUS
+        cx, cy = [c[0] for c in candidates], [c[1] for c in candidates]
+        zx0, zx1, zy0, zy1 = max(cx) - r, min(cx) + r, max(cy) - r, min(cy) + r     #zone of every candidate
+        wx0, wx1 = max(0, min(cx) - r - 1), min(self.w, max(cx) + r + 2)   #searched window
+        wy0, wy1 = max(0, min(cy) - r - 1), min(self.h, max(cy) + r + 2)
+        deltas = [DELTAS[d] for d in NEIGHBOUR_DIRS.tolist()]
+        with self.lock:
+            cells, values, zones = self.cells, self.values, self.item_zones
+            def safe(x, y):
+                if zx0 <= x <= zx1 and zy0 <= y <= zy1 or zones[y, x]:
+                    return True
+                if cells[y, x] == UNKNOWN:
+                    return (cells[max(0, y - 1):y + 2, max(0, x - 1):x + 2] == FREE).any()
+                return cells[y, x] != OBSTACLE
+            def wanted(x, y):
+                if len(candidates) == 1:
+                    return (x, y) == candidates[0]
+                return np.isnan(values[y, x]) and len({(d > 0) + (d > r) for d in (max(abs(x - ix), abs(y - iy)) for ix, iy in candidates)}) > 1
+            parent = {start: None}
+            queue = deque([start])
+            while queue:
+                cell = queue.popleft()
+                if cell != start and wanted(*cell):
+                    path = []
+                    while cell != start:
+                        path.append(cell)
+                        cell = parent[cell]
+                    return path[::-1]
+                x, y = cell
+                for dx, dy in deltas:
+                    n = (x + dx, y + dy)
+                    if n not in parent and wx0 <= n[0] < wx1 and wy0 <= n[1] < wy1 and safe(*n):
+                        parent[n] = cell
+                        queue.append(n)
+        return None
+
+
+    def _cover(self, x, y):
+        """ Cell (x, y) became known: update the covered cells around it (a few writes instead of a whole-map filter) """
+        r = SENSE_RADIUS
+        window = self.covered[max(0, y - r):y + r + 1, max(0, x - r):x + r + 1]
+        self.nb_uncovered -= window.size - np.count_nonzero(window)
+        window[:] = True
+
+
+    def _refresh_blocked(self, x0, y0, x1, y1):
+        """
+        Recompute the cached blocked status of the window [x0, x1) x [y0, y1) (a changed cell affects its 3x3 area only),
+        the cells whose status changed are logged in 'changes'
+        """
+        x0, y0, x1, y1 = max(0, x0), max(0, y0), min(self.w, x1), min(self.h, y1)
+        window = self._blocked(x0, y0, x1, y1)
+        cy, cx = np.nonzero(window != self.blocked_mask[y0:y1, x0:x1])
+        self.changes.extend(zip((cx + x0).tolist(), (cy + y0).tolist()))
+        self.blocked_mask[y0:y1, x0:x1] = window
+        for row, values in zip(self.blocked_rows[y0:y1], window.tolist()):
+            row[x0:x1] = values
+
+
+    def obstacles(self):
+        return self.cells == OBSTACLE
+
+
+    def landmarks(self):
+        """ Landmark tables, rebuilt once REBUILD_AFTER obstacles were discovered since the last build """
+        with self.lock:
+            if self.landmark_dist is None or self.new_obstacles >= REBUILD_AFTER:
+                self.new_obstacles = 0
+                self.landmark_dist = map_cache.landmark_tables(self.obstacles(), self.nb_landmarks)[1].tolist()
+            return self.landmark_dist
+
+
+    def blocked(self, x0=0, y0=0, x1=None, y1=None):
+        """
+        Cells a path must avoid: the known obstacles, and the unknown cells next to one or to a ring cell. Where an item
+        zone overrides the warning zone, a wall can be the direct neighbour of a ring cell (0.25-0.6) with no warning.
+        An unknown cell is not blocked when it is next to a free cell (0, or an item stood on): every cell around a wall
+        holds a warning or a ring value. Nor when it lies in the zone of a found item (item_found), walls are never there.
+        Whole map by default, or only the window [x0, x1) x [y0, y1). A copy of the cached mask.
+        """
+        x1, y1 = self.w if x1 is None else x1, self.h if y1 is None else y1
+        with self.lock:
+            return self.blocked_mask[y0:y1, x0:x1].copy()
+
+
+    def _blocked(self, x0, y0, x1, y1):
+        """ blocked() computed from the cells of the window [x0, x1) x [y0, y1) and of the cells around it """
+        ox, oy = max(0, x0 - 1), max(0, y0 - 1)     #the window and the cells around it
+        cells = self.cells[oy:min(self.h, y1 + 1), ox:min(self.w, x1 + 1)]
+        h, w = cells.shape
+        obstacles = cells == OBSTACLE
+        unknown = (cells == UNKNOWN) & ~self.item_zones[oy:oy + h, ox:ox + w]
+        danger, free = obstacles | (cells == RING), cells == FREE
+        near, clear = np.zeros_like(danger), np.zeros_like(free)    #an obstacle or ring cell / a free cell among the 8 neighbours
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                src = slice(max(0, -dy), h + min(0, -dy)), slice(max(0, -dx), w + min(0, -dx))
+                dst = slice(max(0, dy), h + min(0, dy)), slice(max(0, dx), w + min(0, dx))
+                near[dst] |= danger[src]
+                clear[dst] |= free[src]
+        blocked = obstacles | (near & unknown & ~clear)
+        return blocked[y0 - oy:y1 - oy, x0 - ox:x1 - ox]
+
+
+    def plan(self, start, goal, use_landmarks=True):
+        """
+        Shortest 8-connected path through the cells that are not blocked(), see astar.
+        On large maps the hierarchy plans instead: the path may stop short of 'goal' (at most hierarchy.HORIZON cells), plan again from its end.
+        """
+        if self.hierarchy is not None:
+            return self.hierarchy.plan(start, goal), 0
+        landmark_dist = self.landmarks() if use_landmarks else None
+        gx, gy = goal
+        with self.lock:     #the shared rows, only the goal row copied
+            blocked = list(self.blocked_rows)
+            blocked[gy] = blocked[gy][:]
+        blocked[gy][gx] = False     #items are claimed even when the agent recorded their cell as dangerous
+        return astar(blocked, start, goal, landmark_dist)
+
+
+def alt_heuristic(landmark_dist, goal):
+    """
+    h(x, y): max of the Chebyshev distance to 'goal' and of the landmark bounds |d(L, cell) - d(L, goal)|, looked up
+    in the tables ([landmark][y][x] nested lists) for the expanded nodes only.
+    """
+    gx, gy = goal
+    tables = [(dist, dist[gy][gx]) for dist in landmark_dist if dist[gy][gx] != map_cache.UNREACHABLE]
+    def heuristic(x, y):
+        bound = max(abs(x - gx), abs(y - gy))
+        for dist, d_goal in tables:
+            d = dist[y][x]
+            if d != map_cache.UNREACHABLE and abs(d - d_goal) > bound:
+                bound = abs(d - d_goal)
+        return bound
+    return heuristic
+
+
+def astar(blocked, start, goal, landmark_dist=None):
+    """
+    A* on the 8-connected grid, unit move cost, 'blocked' cells excluded. Heuristic: Chebyshev distance, tightened by the
+    landmark tables when given. Returns (path, expansions): path is the list of cells after 'start' up to 'goal' (None if
+    there is no path), expansions the number of nodes taken out of the open list.
+    'blocked' and 'landmark_dist' are arrays or nested lists: nested lists index faster one cell at a time.
+    """
+    if isinstance(blocked, np.ndarray):
+        blocked = blocked.tolist()
+    h, w = len(blocked), len(blocked[0])
+    gx, gy = goal
+    if landmark_dist is not None and len(landmark_dist):
+        if isinstance(landmark_dist, np.ndarray):
+            landmark_dist = landmark_dist.tolist()
+        hfun = alt_heuristic(landmark_dist, goal)
+    else:
+        hfun = lambda x, y: max(abs(x - gx), abs(y - gy))
+    deltas = [DELTAS[d] for d in NEIGHBOUR_DIRS.tolist()]
+    g = {start: 0}
+    parent = {start: None}
+    open_list = [(hfun(*start), 0, start)]   #(f, -g, cell): on equal f, the deepest node first
+    closed = set()
+    expansions = 0
+    while open_list:
+        _, neg_cost, cell = heapq.heappop(open_list)
+        if cell in closed:
+            continue
+        closed.add(cell)
+        expansions += 1
+        if cell == goal:
+            path = []
+            while cell != start:
+                path.append(cell)
+                cell = parent[cell]
+            return path[::-1], expansions
+        x, y = cell
+        cost = -neg_cost
+        for dx, dy in deltas:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < w and 0 <= ny < h and not blocked[ny][nx]:
+                n = (nx, ny)
+                if cost + 1 < g.get(n, cost + 2) and n not in closed:
+                    g[n] = cost + 1
+                    parent[n] = cell
+                    heapq.heappush(open_list, (cost + 1 + hfun(nx, ny), -cost - 1, n))
+    return None, expansions
@@ -0,0 +1,209 @@
+"""
+Profiling mode of the agent threads of main.py (main.py -pf).
+Two measures, both off (a single test per call) unless start() was called:
+- wall-clock time of each strategy phase: main.py marks its phases with @phased("sweep"), @phased("bypass")...
+  The time of a phase excludes the phases it calls (bypass inside a sweep counts as bypass), the rest is "other".
+- a stack sampler: a thread reads the stacks of the registered threads every INTERVAL (sys._current_frames), which costs
+  nothing to the sampled threads. The samples are written in the collapsed format of flamegraph.pl / speedscope:
+      agent_0;sweep;main:agent_loop;main:optimal_sweep;...;threading:wait 42
+  Waits (replies of the server, sleeps) show up as their own frames, e.g. queue:get or threading:wait. The strategy is
+  made of step functions (generators) run by main.run_steps: the ones waiting for a reply are put back under it.
+"""
+
+import functools, inspect, os, sys, threading, time
+from collections import Counter, defaultdict
+
+INTERVAL = 0.005    #time between two samples (s)
+DRIVER = "run_steps"    #function running step functions (main.run_steps): their frames are off the stack while they wait
+BASE_PHASE = "other"
+_profiler = None
+
+
+class Profiler:
+    """ Phase timer and stack sampler of the threads registered with profiled() """
+    def __init__(self, interval=INTERVAL):
+        self.interval = interval
+        self.names = {}     #thread ident -> name, threads sampled
+        self.phases = {}    #thread ident -> stack of [phase, start of its current stretch]
+        self.phase_time = defaultdict(float)    #(name, phase) -> exclusive wall-clock time (s)
+        self.samples = Counter()    #collapsed stack -> samples
+        self.labels = {}    #code object -> label in the stacks
+        self.stopped = threading.Event()
+        self.sampler = threading.Thread(target=self.sample_loop, daemon=True)
+        self.start_time = time.perf_counter()
+        self.sampler.start()
+
+
+    def sample_loop(self):
+        while not self.stopped.wait(self.interval):
+            frames = sys._current_frames()
+            for ident, name in list(self.names.items()):
+                frame = frames.get(ident)
+                stack = self.phases.get(ident)
+                if frame is None or not stack:
+                    continue
+                calls = []
+                while frame is not None:
+                    if frame.f_code.co_name == DRIVER:
+                        calls.extend(label for label in map(self.label_of, reversed(suspended(frame))) if label)
+                    label = self.label_of(frame)
+                    if label:
+                        calls.append(label)
+                    frame = frame.f_back
+                calls.append(stack[-1][0])
+                calls.append(name)
+                self.samples[";".join(reversed(calls))] += 1
+
+
+    def label_of(self, frame):
+        label = self.labels.get(frame.f_code)
+        if label is None:
+            label = self.labels[frame.f_code] = self.label(frame.f_code)
+        return label
+
+
+    @staticmethod
+    def label(code):
+        """ 'module:function' of a frame, empty for the wrappers of phased() which are left out """
+        if code.co_filename == __file__:
+            return ""
+        return f"{os.path.splitext(os.path.basename(code.co_filename))[0]}:{code.co_name}"
+
+
+    def enter(self, phase):
+        ident = threading.get_ident()
+        now = time.perf_counter()
+        stack = self.phases.setdefault(ident, [[BASE_PHASE, now]])
+        self._close(ident, stack[-1], now)
+        stack.append([phase, now])
+
+
+    def exit(self):
+        ident = threading.get_ident()
+        now = time.perf_counter()
+        stack = self.phases.get(ident)
+        if not stack or len(stack) == 1:    #thread unregistered meanwhile
+            return
+        self._close(ident, stack.pop(), now)
+        stack[-1][1] = now  #the caller's phase resumes
+
+
+    def _close(self, ident, entry, now):
+        """ Add the current stretch of 'entry' to its phase (nothing once stopped: the summary is final) """
+        if self.stopped.is_set():
+            return
+        self.phase_time[self.names.get(ident, f"thread_{ident}"), entry[0]] += now - entry[1]
+        entry[1] = now
+
+
+    def register(self, name):
+        """ Profile the calling thread under 'name' """
+        ident = threading.get_ident()
+        self.names[ident] = name
+        self.phases[ident] = [[BASE_PHASE, time.perf_counter()]]
+
+
+    def unregister(self):
+        """ Stop profiling the calling thread (its phases still open are closed) """
+        ident = threading.get_ident()
+        now = time.perf_counter()
+        for entry in self.phases.pop(ident, []):
+            self._close(ident, entry, now)
+        self.names.pop(ident, None)
+
+
+    def stop(self):
+        """ Close the phases of the threads still registered and stop sampling """
+        now = time.perf_counter()
+        for ident, stack in list(self.phases.items()):
+            for entry in stack:
+                self._close(ident, entry, now)
+        self.elapsed = now - self.start_time
+        self.stopped.set()
+        self.sampler.join()
+
+
+    def write_collapsed(self, path):
+        """ One line per distinct stack: 'frames separated by ; count' (flamegraph.pl, speedscope, inferno) """
+        with open(path, "w") as f:
+            for stack, count in sorted(self.samples.items()):
+                f.write(f"{stack} {count}\n")
+
+
+    def summary(self):
+        """ Per thread and phase: wall-clock time, share of the thread's time, samples and the leaf frames seen most """
+        leaves = defaultdict(Counter)   #(name, phase) -> leaf frame -> samples
+        for stack, count in self.samples.items():
+            frames = stack.split(";")
+            leaves[frames[0], frames[1]][frames[-1]] += count
+        lines = [f"Profile: {self.elapsed:.1f}s, {sum(self.samples.values())} samples every {self.interval * 1000:g} ms",
+                 f"{'thread':<10} {'phase':<9} {'time (s)':>9} {'share':>6} {'samples':>8}  top frames"]
+        for name in sorted({n for n, _ in self.phase_time}):
+            total = sum(t for (n, _), t in self.phase_time.items() if n == name) or 1
+            for (n, phase), t in sorted(self.phase_time.items(), key=lambda kv: -kv[1]):
+                if n != name:
+                    continue
+                top = ", ".join(f"{frame} {100 * c / sum(leaves[n, phase].values()):.0f}%" for frame, c in leaves[n, phase].most_common(3))
+                lines.append(f"{name:<10} {phase:<9} {t:>9.2f} {100 * t / total:>5.0f}% {sum(leaves[n, phase].values()):>8}  {top}")
+        return "\n".join(lines)
+
+
+def suspended(frame):
+    """ Frames of the step functions waiting in a DRIVER frame for the result of the operation they yielded, outermost first """
+    steps = frame.f_locals.get("steps")
+    frames = []
+    while inspect.isgenerator(steps) and not steps.gi_running and steps.gi_frame is not None:
+        frames.append(steps.gi_frame)
+        steps = steps.gi_yieldfrom
+    return frames
+
+
+def start(interval=INTERVAL):
+    """ Turn the profiling mode on for the whole process, returns the profiler """
+    global _profiler
+    _profiler = Profiler(interval)
+    return _profiler
+
+
+def phased(name):
+    """ Decorator: every call of the function is in phase 'name', every run of it for a step function (generator) """
+    def decorator(func):
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def steps(*args, **kwargs):
+                if _profiler is None:
+                    return (yield from func(*args, **kwargs))
+                _profiler.enter(name)
+                try:
+                    return (yield from func(*args, **kwargs))
+                finally:
+                    _profiler.exit()
+            return steps
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _profiler is None:
+                return func(*args, **kwargs)
+            _profiler.enter(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _profiler.exit()
+        return wrapper
+    return decorator
+
+
+class profiled:
+    """ Context manager profiling the calling thread under 'name' while inside (nothing when the profiler is off) """
+    def __init__(self, name):
+        self.name = name
+
+
+    def __enter__(self):
+        self.profiler = _profiler
+        if self.profiler:
+            self.profiler.register(self.name)
+
+
+    def __exit__(self, *exc):
+        if self.profiler:
+            self.profiler.unregister()
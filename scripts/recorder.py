@@ -0,0 +1,75 @@
+"""
+Flight recorder of the server: the last CAPACITY messages processed for each agent, kept in preallocated ring buffers
+(one bytearray seen as a NumPy structured array, records are packed in place: about 1 us per message).
+The server dumps it on game over, on an unhandled exception and on SIGTERM/SIGINT, as an .npz file under resources/flight_records/.
+The dump holds one array per field (agent, t, header, direction, x, y, cell_val, flags), in chronological order:
+    rec = np.load(path); rec["x"][rec["agent"] == 0]
+Recording never raises into the request path: a header or direction that does not fit its byte (malformed request) is
+recorded as -1, and a record that cannot be packed at all is counted in 'dropped' instead.
+"""
+
+import itertools, os, struct, time
+from datetime import datetime
+import numpy as np
+from my_constants import *
+
+DUMP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "resources", "flight_records")
+CAPACITY = 4096     #messages kept per agent
+RECORD = np.dtype([("t", "<f8"), ("header", "i1"), ("direction", "i1"), ("x", "<i4"), ("y", "<i4"), ("cell_val", "<f4"), ("flags", "u1")])
+PACKED = struct.Struct("<dbbiifB")  #same layout as RECORD
+
+# Bits of the 'flags' field
+GAME_OVER_FLAG = 1  #the reply reported the game over
+SKIPPED_FLAG = 2    #conditional move refused (pipeline.py)
+REFUSED_FLAG = 4    #guarded move refused (server.py -gm)
+
+
+def byte_field(value):
+    """ Value of an "i1" field, -1 when it is not an integer of that range """
+    return int(value) if (type(value) is int or isinstance(value, np.integer)) and -128 <= value <= 127 else -1
+
+
+class FlightRecorder:
+    """ Ring buffer of the processed messages of each agent: time, request, position and cell value after the request """
+    def __init__(self, nb_agents, capacity=CAPACITY):
+        self.capacity = capacity
+        self.buffer = bytearray(nb_agents * capacity * RECORD.itemsize)
+        self.records = np.frombuffer(self.buffer, dtype=RECORD).reshape(nb_agents, capacity)
+        self.slots = [itertools.count() for _ in range(nb_agents)]    #next() is atomic: threads recording for the same agent get distinct slots
+        self.count = [0] * nb_agents    #messages recorded per agent, the ring keeps the last 'capacity'
+        self.dropped = 0    #messages that could not be recorded
+
+
+    def record(self, agent_id, msg, reply, x, y, cell_val):
+        """ Called by Game.process once the reply is computed, (x, y) is the position of the agent after the request """
+        try:
+            header = msg.get("header")
+            flags = 0
+            if header == MOVE and reply:
+                flags = (GAME_OVER_FLAG if reply.get("game_over") else 0) | (SKIPPED_FLAG if "skipped" in reply else 0) | (REFUSED_FLAG if "refused" in reply else 0)
+            n = next(self.slots[agent_id])
+            PACKED.pack_into(self.buffer, (agent_id * self.capacity + n % self.capacity) * PACKED.size,
+                             time.time(), byte_field(header), byte_field(msg.get("direction", -1)), x, y, cell_val, flags)
+        except Exception:   #the agent gets its reply whatever happens to its trace
+            self.dropped += 1
+            return
+        self.count[agent_id] = n + 1
+
+
+    def snapshot(self):
+        """ Recorded messages of every agent as a dict of 1-D arrays (one per field, plus 'agent'), sorted by time """
+        parts = [self.records[i, :min(n, self.capacity)].copy() for i, n in enumerate(self.count)]
+        agent = np.concatenate([np.full(len(p), i, dtype=np.int8) for i, p in enumerate(parts)])
+        records = np.concatenate(parts)
+        order = np.argsort(records["t"], kind="stable")
+        snapshot = {name: records[name][order] for name in RECORD.names}
+        snapshot["agent"] = agent[order]
+        return snapshot
+
+
+    def dump(self, reason, directory=DUMP_DIR, **info):
+        """ Write the snapshot and 'info' (extra scalars or arrays, e.g. the death position) to a new .npz file, returns its path """
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"flight_{datetime.now():%Y%m%d_%H%M%S}_{os.getpid()}_{reason}.npz")
+        np.savez(path, reason=reason, dropped=self.dropped, **{k: np.asarray(v) for k, v in info.items() if v is not None}, **self.snapshot())
+        return path
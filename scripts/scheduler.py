@@ -0,0 +1,65 @@
+""" Lockstep scheduling of the agents' moves, for fair and reproducible multi-agent runs """
+
+from threading import Lock
+from collections import deque
+from my_constants import *
+
+
+class LockstepScheduler:
+    """
+    Collect the MOVE requests of the active agents and apply them tick by tick.
+    A tick is resolved as soon as every active agent has a move pending (there is no fixed frame rate):
+    one move per agent is applied in agent id order, then all the replies are delivered in one batch.
+    Agents that completed their mission or disconnected leave the lockstep.
+    """
+    def __init__(self, game):
+        self.game = game
+        self.lock = Lock()
+        self.pending = [deque() for _ in range(game.nb_agents)]  #(msg, deliver) waiting for a tick, per agent
+        self.active = set()
+        self.tick = 0
+
+
+    def join(self, agent_id):
+        """ From now on, no tick is resolved without a move of this agent """
+        with self.lock:
+            self.active.add(agent_id)
+
+
+    def leave(self, agent_id):
+        """ Stop waiting for this agent (it may complete the current tick) """
+        with self.lock:
+            self.active.discard(agent_id)
+            batch = self._resolve()
+        self._deliver(batch)
+
+
+    def submit(self, agent_id, msg, deliver):
+        """ Queue a MOVE; deliver(reply) is called once the tick that applies it is resolved (possibly from another thread) """
+        with self.lock:
+            self.pending[agent_id].append((msg, deliver))
+            batch = self._resolve()
+        self._deliver(batch)
+
+
+    def _resolve(self):
+        """ Apply every complete tick, returns the replies to deliver. Called with the lock held """
+        batch = []
+        while True:
+            if self.game.game_over:    #nothing to synchronize anymore, release everyone
+                ready = [i for i in range(len(self.pending)) if self.pending[i]]
+            elif self.active and all(self.pending[i] for i in self.active):
+                ready = sorted(self.active)
+                self.tick += 1
+            else:   #moves of agents outside the lockstep are never held back
+                ready = [i for i in range(len(self.pending)) if self.pending[i] and i not in self.active]
+            if not ready:
+                return batch
+            for agent_id in ready:
+                msg, deliver = self.pending[agent_id].popleft()
+                batch.append((deliver, self.game.process(msg, agent_id)))
+
+
+    def _deliver(self, batch):
+        for deliver, reply in batch:
+            deliver(reply)
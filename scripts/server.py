@@ -5,12 +5,13 @@ __license__ = "Apache License 2.0"
 __version__ = "1.0.0"
 
 
-import socket, pickle
+import socket, pickle, signal, traceback
 from threading import Thread, Lock
 import sys, argparse, os
 from game import Game
+from scheduler import LockstepScheduler
+from shm_transport import ShmChannel, ORDERED
 from my_constants import *
-from time import sleep
 
 if os.name == "nt": #If you are on Windows
     screen_resolution_to_fix = True  #Set this variable to True if you face resolution issues when the GUI appears
@@ -21,71 +22,202 @@ if os.name == "nt": #If you are on Windows
 
 class Server:
     """ Server handling communication between the agents and the game """
-    def __init__(self, conf, nb_agents, map_id):
+    def __init__(self, conf, nb_agents, map_id, extended_sensor=0, lockstep=False, shared_memory=False, guarded_moves=False):
         """ Initialize the server """
-        self.game = Game(nb_agents, map_id)
+        self.game = Game(nb_agents, map_id, extended_sensor, guarded_moves=guarded_moves)
+        self.scheduler = LockstepScheduler(self.game) if lockstep else None
         self.nb_disconnected = 0
         self.id_count = 0
         self.conf = conf
         self.nb_agents = nb_agents
         self.clients = []
+        self.client_ids = {}    #client socket -> ids of the agents it carries (several with network.MuxNetwork)
         self.clients_lock = Lock()
+        self.send_locks = {}    #one lock per client socket, replies and pushes are sent from different threads
+        self.shared_memory = shared_memory and ORDERED  #accept SHM_OPEN from local agents (shm_transport.ORDERED)
+        self.channels = {}  #client socket -> shm_transport.ShmChannel carrying its traffic
+        self.game_over_sent = False
         print(f"Server configuration: {conf}")
         self.s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)    #SO_REUSEADDR flag tells the kernel to reuse a local socket in TIME_WAIT state, without waiting for its natural timeout to expire.
         self.s.bind(conf)
         self.s.listen()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self.on_signal)
         self.start()
 
 
     def start(self):
         """ Start listening to incoming clients """
         print("Server ready! Waiting for connections...")
+        self.s.settimeout(0.2)  #MUX_JOIN requests also hand out ids: check regularly whether all of them are taken
         while self.id_count < self.nb_agents:
-            conn, addr = self.s.accept()
+            try:
+                conn, addr = self.s.accept()
+            except socket.timeout:
+                continue
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  #replies to pipelined moves go out at once
             with self.clients_lock:
+                client_id = self.new_id(conn)
+                if client_id is None:   #the last ids went to a multiplexed connection
+                    conn.close()
+                    continue
                 self.clients.append(conn)
-            Thread(target=self.client_cb, daemon=True, args=(conn, addr, self.id_count)).start()
-            self.id_count += 1
-            sleep(0.1)
+                self.send_locks[conn] = Lock()
+            Thread(target=self.client_cb, daemon=True, args=(conn, addr, client_id)).start()
         self.game.gui.render()
+
+
+    def new_id(self, conn):
+        """ Allocate the next agent id to the connection 'conn', None when every agent is already there. Call with clients_lock held """
+        if self.id_count >= self.nb_agents:
+            return None
+        client_id = self.id_count
+        self.id_count += 1
+        self.client_ids.setdefault(conn, []).append(client_id)
+        return client_id
     
 
     def client_cb(self, conn, addr, client_id):
         """ Handle the interactions with a client """
         print(f"Connected to {addr[0]} on port {addr[1]}")
-        self.game.nb_ready += 1
-
-        conn.send(pickle.dumps((client_id)))
+        self.send(conn, client_id)
+        self.ready(client_id)
 
+        stream = conn.makefile("rb")
+        receive = lambda: pickle.load(stream)
         try:
             while True:
-                msg = pickle.loads(conn.recv(1024))
+                msg = receive()
+                tag = "mux_id" in msg   #multiplexed connection: the msg comes from one of its agents, the reply goes back to it
+                sender = msg.pop("mux_id", client_id)
+                if sender not in self.client_ids[conn]:
+                    continue
                 if msg["header"] == BROADCAST_MSG:
-                    msg["sender"] = client_id
-                    self.send_to_all(conn, msg)
+                    msg["sender"] = sender
+                    self.send_to_all(sender, msg)
+                    if msg["Msg type"] == COMPLETED and self.scheduler is not None:
+                        self.scheduler.leave(sender)
+                elif msg["header"] == MUX_JOIN:
+                    with self.clients_lock:
+                        new_id = self.new_id(conn)
+                    self.send(conn, {"sender": GAME_ID, "header": MUX_JOIN, "id": new_id})
+                    if new_id is not None:
+                        self.ready(new_id)
+                elif msg["header"] == SHM_OPEN:
+                    channel = self.open_shared_memory(conn, addr)
+                    if channel is not None:
+                        receive = channel.receive
                 else:
-                    reply = self.game.process(msg, client_id)
-                    conn.send(pickle.dumps(reply))
-        except Exception as e:
+                    self.handle_request(conn, sender, msg, tag)
+        except (EOFError, OSError):  #the client left
             pass
+        except Exception:
+            traceback.print_exc()
+            self.dump_flight_record("exception")
         finally:
             print(f"Closing connection with {addr[0]} on port {addr[1]}")
+            ids = self.client_ids[conn]
+            if self.scheduler is not None:
+                for agent_id in ids:
+                    self.scheduler.leave(agent_id)
             with self.clients_lock:
+                with self.send_locks[conn]:
+                    if conn in self.channels:
+                        self.channels.pop(conn).close()
                 self.clients.remove(conn)
+                del self.client_ids[conn]
+                del self.send_locks[conn]
                 conn.close()
-                self.nb_disconnected += 1
+                self.nb_disconnected += len(ids)
                 if self.nb_disconnected >= self.nb_agents:
+                    if self.scheduler is not None:
+                        print(f"Game finished after {self.scheduler.tick} ticks!")
                     print("Game finished! Close the window manually to exit.")
+                    print(self.game.move_summary())
                     # La fenêtre reste ouverte jusqu'à ce que l'utilisateur la ferme
 
 
+    def open_shared_memory(self, conn, addr):
+        """ Answer SHM_OPEN: a local agent gets the name of its shared memory block, from then on its traffic goes through it """
+        if not self.shared_memory or addr[0] not in ("127.0.0.1", "::1"):
+            self.send(conn, {"sender": GAME_ID, "header": SHM_OPEN, "name": None})
+            return None
+        channel = ShmChannel.create(conn)
+        with self.send_locks[conn]:     #what was sent before went through the socket, what follows goes through the rings
+            conn.sendall(pickle.dumps({"sender": GAME_ID, "header": SHM_OPEN, "name": channel.name}))
+            self.channels[conn] = channel
+        return channel
+
+
+    def ready(self, client_id):
+        """ The agent got its id, start the game once all of them did """
+        if self.scheduler is not None:
+            self.scheduler.join(client_id)
+        with self.clients_lock:
+            self.game.nb_ready += 1
+            all_connected = self.game.nb_ready == self.nb_agents
+        if all_connected:   #every client already got its id, so the start event cannot overtake it
+            self.send_to_all(None, {"sender": GAME_ID, "header": GAME_START, "nb_agents": self.nb_agents, "nb_connected_agents": self.game.nb_ready})
+
+
+    def handle_request(self, conn, client_id, msg, tag=False):
+        """ Answer a request of an agent, in lockstep mode the moves wait for their tick. 'tag': address the reply to client_id (multiplexed connection) """
+        to = client_id if tag else None
+        if msg["header"] == MOVE and self.scheduler is not None:
+            self.scheduler.submit(client_id, msg, lambda reply: self.send_reply(conn, reply, to))
+        else:
+            self.send_reply(conn, self.game.process(msg, client_id), to)
+
+
+    def send_reply(self, conn, reply, to=None):
+        """ Send the reply to a request, then tell everyone if it ended the game """
+        self.send(conn, reply if to is None else dict(reply, to=to))
+        if self.game.game_over:
+            self.send_game_over()
+
+
+    def send(self, conn, msg):
+        """ Send a msg to one client, serialized with the other threads writing to the same socket """
+        with self.send_locks[conn]:
+            if conn in self.channels:
+                self.channels[conn].send(msg)
+            else:
+                conn.sendall(pickle.dumps(msg))
+
+
+    def send_game_over(self):
+        """ Push GAME_OVER to all clients, only once """
+        with self.clients_lock:
+            if self.game_over_sent:
+                return
+            self.game_over_sent = True
+        self.send_to_all(None, {"sender": GAME_ID, "header": GAME_OVER, "agent_id": self.game.death_agent, "death_pos": self.game.death_position})
+        self.dump_flight_record("game_over")
+        print(self.game.move_summary())
+
+
+    def dump_flight_record(self, reason):
+        """ Save the last messages of every agent (recorder.py) """
+        try:
+            path = self.game.recorder.dump(reason, map_id=self.game.map_id, death_agent=self.game.death_agent, death_pos=self.game.death_position)
+            print(f"Flight record saved to {path}")
+        except Exception:
+            traceback.print_exc()
+
+
+    def on_signal(self, signum, frame):
+        """ SIGTERM / SIGINT: save the flight record before leaving """
+        self.dump_flight_record(signal.Signals(signum).name.lower())
+        sys.exit(128 + signum)
+
+
     def send_to_all(self, sender, msg):
-        """ Broadcast a msg to all clients except the 'sender' """
+        """ Broadcast a msg to all agents except the 'sender' id: once per connection, a multiplexed one skips the sender itself """
         with self.clients_lock:
             for client in self.clients:
-                if client != sender:
-                    client.send(pickle.dumps(msg))
+                if self.client_ids[client] != [sender]:
+                    self.send(client, msg)
 
 
 
@@ -94,6 +226,10 @@ if __name__ == "__main__":
     parser.add_argument("-i", "--ip_server", help="Ip address of the server", type=str, default="localhost")
     parser.add_argument("-nb", "--nb_agents", help="Number of agents: 1, 2, 3 or 4", type=int, default=3)
     parser.add_argument("-mi", "--map_id", help="Map to load: 1 or 2 or 3", type=int, default=3)
+    parser.add_argument("-ls", "--lockstep", help="Apply the moves in lockstep ticks (one move per agent per tick, in agent id order)", action="store_true")
+    parser.add_argument("-es", "--extended_sensor", help="Extended sensor mode: largest k served by GET_PATCH (0: disabled)", type=int, default=0)
+    parser.add_argument("-gm", "--guarded_moves", help="Guarded moves mode: a MOVE with a 'guard' is refused, and the value of the cell reported, when the cell holds more", action="store_true")
+    parser.add_argument("-shm", "--shared_memory", help="Let local agents asking for it (main.py -shm) switch to shared memory rings instead of TCP", action="store_true")
 
 
     args = parser.parse_args()
@@ -105,4 +241,4 @@ if __name__ == "__main__":
     if not args.map_id in range(1, 4):    #There are only 3 maps
         print("There are only 2 maps!")
         sys.exit()
-    server = Server((args.ip_server, port), args.nb_agents, args.map_id)
\ No newline at end of file
+    server = Server((args.ip_server, port), args.nb_agents, args.map_id, args.extended_sensor, args.lockstep, args.shared_memory, args.guarded_moves)
\ No newline at end of file
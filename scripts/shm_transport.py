@@ -0,0 +1,205 @@
+"""
+Shared-memory transport between the server and agents running on the same host.
+The TCP connection is kept to hand out the agent id and negotiate the transport (SHM_OPEN), then every message goes through
+two single-producer single-consumer rings of fixed-size records in one multiprocessing.shared_memory block: one towards the
+server, one towards the agent. A message (pickle) takes one record, or several consecutive ones when it is larger.
+Both sides must opt in: server.py -shm accepts the switch, main.py -shm (or Network(shared_memory=True)) asks for it.
+
+A side waiting on a ring spins for a few microseconds, then raises the 'waiting' word of the ring and blocks on the socket,
+which is now a doorbell: the peer sends it a byte after changing a ring whose 'waiting' word is raised. A closed socket
+wakes the sleeper too, that is how a disconnection is noticed.
+
+Memory ordering: the rings take no lock and issue no barrier (Python has none). A record is published by storing the
+'written' counter after its bytes, read after loading that counter, and released by storing 'read' after copying it out.
+This is only correct when stores are seen by the other core in program order and loads are not reordered with each
+other, i.e. on a total store order CPU (x86, x86-64): the transport is restricted to those (ORDERED), the other ones
+stay on TCP. The counters are aligned 8-byte words written by one native-format pack_into (one store, never seen half
+written). Even x86 may let a store pass a later load: raising 'waiting' and then checking the ring can race with the
+peer publishing and then checking 'waiting', both missing the other. A sleeper therefore never blocks longer than
+WAKE_TIMEOUT, which only bounds the cost of such a missed ring.
+"""
+
+import os, pickle, platform, select, struct, time
+from threading import Lock
+from multiprocessing import shared_memory
+
+SLOT_SIZE = 1024    #bytes of a record
+NB_SLOTS = 256      #records of a ring
+COUNTERS = struct.Struct("QQQ") #records written, records read, the other side waits on this ring. Native format: each one
+COUNTER = struct.Struct("Q")    #is copied as a whole word, "<Q" packs byte by byte and could be read half written
+WAITING = 2 * COUNTER.size      #offset of the 'waiting' word in the counters
+LENGTH = struct.Struct("<I")    #size of the message, at the start of its first record
+RING_SIZE = COUNTERS.size + SLOT_SIZE * NB_SLOTS
+SPIN_TIME = 50e-6   #polling without sleeping for this long first (s)
+WAKE_TIMEOUT = 10e-3    #longest sleep on the doorbell, in case a ring was missed (s)
+LOCAL_HOSTS = ("localhost", "127.0.0.1", "::1")
+ORDERED = platform.machine().lower() in ("x86_64", "amd64", "i386", "i686", "x86")  #total store order, see above
+yield_cpu = getattr(os, "sched_yield", lambda: time.sleep(0))   #no sched_yield on Windows
+
+
+class Doorbell:
+    """ The connection socket once the traffic goes through shared memory: one byte wakes the peer up """
+    def __init__(self, sock):
+        self.sock = sock
+        self.lock = Lock()  #two threads of a side can sleep at once (one receiving, one sending on a full ring)
+
+
+    def ring(self):
+        try:
+            self.sock.sendall(b"\0")
+        except OSError:     #the peer is gone, its next wait tells
+            pass
+
+
+    def sleep(self, timeout):
+        """ Block until the peer rings or the timeout. Raises EOFError once the peer closed the socket """
+        with self.lock:     #a recv after another thread drained the socket would block
+            try:
+                if select.select([self.sock], [], [], timeout)[0] and self.sock.recv(4096) == b"":
+                    raise EOFError("Shared memory peer is gone")
+            except OSError:
+                raise EOFError("Shared memory peer is gone")
+
+
+def wait(poll, ring, doorbell):
+    """
+    Call poll() until it returns something: spin, then sleep on the doorbell with the 'waiting' word of the ring raised.
+    Raises EOFError once the peer is gone, like pickle.load on a closed socket
+    """
+    start = time.perf_counter()
+    while True:
+        result = poll()
+        if result is not None:
+            return result
+        if time.perf_counter() - start < SPIN_TIME:
+            yield_cpu()     #lets the peer run when it shares our core, returns at once otherwise
+            continue
+        ring.set_waiting(1)
+        result = poll()     #the peer may have changed the ring before seeing the word raised
+        if result is not None:
+            ring.set_waiting(0)
+            return result
+        doorbell.sleep(WAKE_TIMEOUT)
+
+
+class Ring:
+    """ Single-producer single-consumer ring of fixed-size records, at 'offset' in a shared memory buffer """
+    def __init__(self, buf, offset):
+        self.buf = buf
+        self.counters = offset
+        self.start = offset + COUNTERS.size
+        self.size = SLOT_SIZE * NB_SLOTS
+
+
+    def _copy_in(self, pos, data):
+        """ Write 'data' at byte 'pos' of the slots, wrapping around their end """
+        first = min(len(data), self.size - pos)
+        self.buf[self.start + pos:self.start + pos + first] = data[:first]
+        if first < len(data):
+            self.buf[self.start:self.start + len(data) - first] = data[first:]
+
+
+    def _copy_out(self, pos, n):
+        first = min(n, self.size - pos)
+        data = bytes(self.buf[self.start + pos:self.start + pos + first])
+        if first < n:
+            data += bytes(self.buf[self.start:self.start + n - first])
+        return data
+
+
+    def put(self, data):
+        """ Append a message, None when the ring is too full for now (try again) """
+        n = LENGTH.size + len(data)
+        count = -(-n // SLOT_SIZE)
+        if count > NB_SLOTS:
+            raise ValueError(f"Message of {len(data)} bytes does not fit in a ring")
+        written, read, _ = COUNTERS.unpack_from(self.buf, self.counters)
+        if written + count - read > NB_SLOTS:
+            return None
+        pos = written % NB_SLOTS * SLOT_SIZE
+        self._copy_in(pos, LENGTH.pack(len(data)) + data)
+        COUNTER.pack_into(self.buf, self.counters, written + count)     #publish once the records are complete
+        return count
+
+
+    def get(self):
+        """ Oldest message, None when the ring is empty """
+        written, read, _ = COUNTERS.unpack_from(self.buf, self.counters)
+        if read == written:
+            return None
+        pos = read % NB_SLOTS * SLOT_SIZE
+        n, = LENGTH.unpack_from(self.buf, self.start + pos)
+        data = self._copy_out(pos + LENGTH.size, n)
+        COUNTER.pack_into(self.buf, self.counters + COUNTER.size, read + -(-(LENGTH.size + n) // SLOT_SIZE))
+        return data
+
+
+    def set_waiting(self, waiting):
+        COUNTER.pack_into(self.buf, self.counters + WAITING, waiting)
+
+
+    def take_waiting(self):
+        """ True if the other side sleeps on this ring (the reader on an empty one, the writer on a full one), lowered """
+        if not COUNTER.unpack_from(self.buf, self.counters + WAITING)[0]:
+            return False
+        self.set_waiting(0)
+        return True
+
+
+class ShmChannel:
+    """ Both rings of one connection. The server creates the block, the agent attaches to it by name """
+    def __init__(self, shm, is_server, sock):
+        self.shm = shm
+        self.is_server = is_server
+        self.sock = sock
+        self.doorbell = Doorbell(sock)
+        to_server, to_agent = Ring(shm.buf, 0), Ring(shm.buf, RING_SIZE)
+        self.outgoing, self.incoming = (to_agent, to_server) if is_server else (to_server, to_agent)
+
+
+    @classmethod
+    def create(cls, sock):
+        """ Server side: new zeroed block """
+        return cls(shared_memory.SharedMemory(create=True, size=2 * RING_SIZE), True, sock)
+
+
+    @classmethod
+    def attach(cls, name, sock):
+        """ Agent side: the server owns the block and unlinks it, keep the resource tracker of this process out of it """
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return cls(shm, False, sock)
+
+
+    @property
+    def name(self):
+        return self.shm.name
+
+
+    def send(self, msg):
+        """ Raises ValueError when the message is larger than a ring """
+        data = pickle.dumps(msg)
+        wait(lambda: self.outgoing.put(data), self.outgoing, self.doorbell)
+        if self.outgoing.take_waiting():
+            self.doorbell.ring()
+
+
+    def receive(self):
+        data = wait(self.incoming.get, self.incoming, self.doorbell)
+        if self.incoming.take_waiting():
+            self.doorbell.ring()
+        return pickle.loads(data)
+
+
+    def close(self):
+        self.incoming = self.outgoing = None    #the rings hold views on the buffer, which must be released first
+        try:
+            self.shm.close()
+            if self.is_server:
+                self.shm.unlink()
+        except (BufferError, FileNotFoundError):
+            pass
@@ -0,0 +1,116 @@
+"""
+Uniform-grid spatial index of points of the map (items, visited cells, wall cells).
+The map is cut into BUCKET x BUCKET buckets, each one a dict {(x, y): value} of the points inside it. A query only reads the
+buckets overlapping its area: "is there a point within r of (x, y)" costs a few dict lookups however many points are known.
+Agents index the items they know (main.near_visited), the server indexes the walls and items of the map for the GUI,
+which only draws the points of the visible window.
+"""
+
+from threading import Lock
+import numpy as np
+
+BUCKET = 8  #side of a bucket (cells)
+
+
+class GridIndex:
+    """ Points (x, y) with a value each, bucketed on a uniform grid. Safe to share between the threads of a process """
+    def __init__(self, points=(), bucket=BUCKET):
+        self.bucket = bucket
+        self.buckets = {}   #(bx, by) -> {(x, y): value}
+        self.size = 0
+        self.lock = Lock()
+        for point in points:
+            self.add(point)
+
+
+    def add(self, point, value=None):
+        """ Insert the point (x, y), or replace its value: used like a set, or like a dict with values """
+        x, y = point
+        with self.lock:
+            points = self.buckets.setdefault((x // self.bucket, y // self.bucket), {})
+            self.size += (x, y) not in points
+            points[x, y] = value
+
+
+    def update(self, xs, ys, values):
+        """
+        Insert the points (xs[i], ys[i]) with the values values[i] (arrays), e.g. the cells of a cached mask: the points
+        are grouped by bucket with NumPy, each bucket is filled by one dict update instead of one add() per point
+        """
+        xs, ys, values = np.asarray(xs), np.asarray(ys), np.asarray(values)
+        if not len(xs):
+            return
+        bx, by = xs // self.bucket, ys // self.bucket
+        order = np.lexsort((bx, by))
+        bx, by = bx[order], by[order]
+        bounds = [0, *(np.flatnonzero((bx[1:] != bx[:-1]) | (by[1:] != by[:-1])) + 1).tolist(), len(order)]
+        px, py, pv = xs[order].tolist(), ys[order].tolist(), values[order].tolist()
+        bx, by = bx.tolist(), by.tolist()
+        with self.lock:
+            for start, end in zip(bounds, bounds[1:]):
+                points = self.buckets.setdefault((bx[start], by[start]), {})
+                before = len(points)
+                points.update(zip(zip(px[start:end], py[start:end]), pv[start:end]))
+                self.size += len(points) - before
+
+
+    def discard(self, point):
+        x, y = point
+        with self.lock:
+            points = self.buckets.get((x // self.bucket, y // self.bucket))
+            if points and points.pop((x, y), self) is not self:
+                self.size -= 1
+
+
+    def get(self, point, default=None):
+        x, y = point
+        return self.buckets.get((x // self.bucket, y // self.bucket), {}).get((x, y), default)
+
+
+    def __contains__(self, point):
+        x, y = point
+        return (x, y) in self.buckets.get((x // self.bucket, y // self.bucket), ())
+
+
+    def __len__(self):
+        return self.size
+
+
+    def __iter__(self):
+        """ The points, in no particular order """
+        with self.lock:
+            return iter([p for points in self.buckets.values() for p in points])
+
+
+    def window(self, x0, y0, x1, y1):
+        """ [((x, y), value)] of the points in [x0, x1) x [y0, y1), e.g. the visible part of the map """
+        b = self.bucket
+        with self.lock:
+            found = []
+            for by in range(y0 // b, (y1 - 1) // b + 1):
+                for bx in range(x0 // b, (x1 - 1) // b + 1):
+                    points = self.buckets.get((bx, by))
+                    if not points:
+                        continue
+                    if x0 <= bx * b and (bx + 1) * b <= x1 and y0 <= by * b and (by + 1) * b <= y1:    #bucket inside the window
+                        found += points.items()
+                    else:
+                        found += [(p, v) for p, v in points.items() if x0 <= p[0] < x1 and y0 <= p[1] < y1]
+            return found
+
+
+    def within(self, x, y, r):
+        """ [((x, y), value)] of the points at most r moves away from (x, y) (Chebyshev distance) """
+        return self.window(x - r, y - r, x + r + 1, y + r + 1)
+
+
+    def near(self, x, y, r):
+        """ True if a point is at most r moves away from (x, y) """
+        b = self.bucket
+        with self.lock:
+            for by in range((y - r) // b, (y + r) // b + 1):
+                for bx in range((x - r) // b, (x + r) // b + 1):
+                    for px, py in self.buckets.get((bx, by), ()):
+                        if abs(px - x) <= r and abs(py - y) <= r:
+                            return True
+        return False
@@ -1,7 +1,12 @@
 #!/usr/bin/env python3
 """
 Startup script to launch server + agents together.
-Usage: python3 startup.py [nb_agents] [map_index]
+Usage: python3 startup.py [nb_agents] [map_index] [-p agents_per_process] [-s strategy] [-mx]
+
+By default every agent runs as a thread of a single main.py process.
+With -p K, the agents are split into groups of K, each group running in its own
+main.py process (-p 1 gives one process per agent), so their strategy loops
+do not share a GIL. Game over is reported to each process by the server.
 """
 
 import subprocess
@@ -9,6 +14,7 @@ import sys
 import time
 import signal
 import os
+import argparse
 
 # Default parameters
 NB_AGENTS = 4
@@ -16,8 +22,15 @@ MAP_INDEX = 1
 
 def main():
     # Parse command line arguments
-    nb_agents = int(sys.argv[1]) if len(sys.argv) > 1 else NB_AGENTS
-    map_index = int(sys.argv[2]) if len(sys.argv) > 2 else MAP_INDEX
+    parser = argparse.ArgumentParser()
+    parser.add_argument("nb_agents", help="Number of agents", type=int, nargs="?", default=NB_AGENTS)
+    parser.add_argument("map_index", help="Map to load", type=int, nargs="?", default=MAP_INDEX)
+    parser.add_argument("-p", "--agents_per_process", help="Run the agents in groups of this size, one process per group (0: all in one process)", type=int, default=0)
+    parser.add_argument("-s", "--strategy", help="Exploration strategy of the agents (see main.py -s)", type=str, default="sweep")
+    parser.add_argument("-mx", "--multiplex", help="One connection per agent process instead of one per agent (see main.py -mx)", action="store_true")
+    args = parser.parse_args()
+    nb_agents, map_index = args.nb_agents, args.map_index
+    group_size = args.agents_per_process if args.agents_per_process > 0 else nb_agents
     
     script_dir = os.path.dirname(os.path.abspath(__file__))
     
@@ -46,18 +59,21 @@ def main():
     print("✅ Server ready!")
     print("-" * 50)
     
-    # Start agents
-    agent_cmd = [sys.executable, "main.py"]
-    print(f"🤖 Starting agents: {' '.join(agent_cmd)}")
-    agent_proc = subprocess.Popen(
-        agent_cmd,
-        cwd=script_dir
-    )
+    # Start agents, one process per group of agents
+    agent_procs = []
+    for first in range(0, nb_agents, group_size):
+        agent_cmd = [sys.executable, "main.py", "-n", str(min(group_size, nb_agents - first)), "-s", args.strategy] + (["-mx"] if args.multiplex else [])
+        print(f"🤖 Starting agents: {' '.join(agent_cmd)}")
+        agent_procs.append(subprocess.Popen(
+            agent_cmd,
+            cwd=script_dir
+        ))
     
     # Handle Ctrl+C gracefully
     def signal_handler(sig, frame):
         print("\n⏹️ Stopping simulation...")
-        agent_proc.terminate()
+        for agent_proc in agent_procs:
+            agent_proc.terminate()
         server_proc.terminate()
         sys.exit(0)
     
@@ -65,7 +81,8 @@ def main():
     
     # Wait for agents to complete
     try:
-        agent_proc.wait()
+        for agent_proc in agent_procs:
+            agent_proc.wait()
         print("\n" + "=" * 50)
         print("✅ Simulation complete!")
         print("📺 Window stays open - close it manually or press Ctrl+C")
@@ -0,0 +1,142 @@
+"""
+Task planning for the team: which zone an agent sweeps next and when it claims its own items, so that the last agent
+completes as early as possible (makespan) rather than each agent as early as possible.
+Each agent runs its own TaskPlanner over what it knows (own discoveries, broadcasts, cells visited by the agents of its
+process); the plan is only recomputed when that knowledge changed (new broadcast, new item, new claim).
+"""
+
+import numpy as np
+from my_constants import *
+import planner
+
+SENSE_RADIUS = planner.SENSE_RADIUS
+HOME_BONUS = 2.0    #factor applied to the zone get_zone_for_agent gives to this agent
+CROWD_PENALTY = 0.5     #factor applied to the home zone of another agent still searching
+
+
+def chebyshev(a, b):
+    return max(abs(a[0] - b[0]), abs(a[1] - b[1]))
+
+
+class TaskPlanner:
+    """
+    Plan of one agent. zones[i] = (x_start, x_end, y_start, y_end) is the home zone of agent i.
+    - remaining(): estimated steps each agent still needs (known legs key -> box, plus a search cost per unknown item)
+    - next_zone(): the zone to sweep next, by expected number of still-needed unknown items per step of travel
+    - should_claim(slack): False while this agent can keep searching for the others without becoming the bottleneck
+    """
+    def __init__(self, agent, zones):
+        self.agent = agent
+        self.zones = zones
+        self.swept = set()
+        self.version = None
+        self.estimates = {}
+
+
+    def _signature(self):
+        a = self.agent
+        return (a.knowledge_version, a.my_key_pos, a.my_box_pos, a.has_key, a.has_box, len(a.other_keys), len(a.other_boxes))
+
+
+    def changed(self):
+        """ True when something was learnt since the plan was last computed """
+        return self._signature() != self.version
+
+
+    def acknowledge(self):
+        """ Take the current knowledge as planned for (strategies that do not call next_zone) """
+        self.version = self._signature()
+
+
+    def _items(self, owner):
+        """ (key_pos, box_pos, has_key) of an agent as far as this agent knows, None for unknown positions """
+        a = self.agent
+        if owner == a.agent_id:
+            return a.my_key_pos, a.my_box_pos, a.has_key
+        return a.other_keys.get(owner), a.other_boxes.get(owner), False
+
+
+    def _searching(self):
+        a = self.agent
+        return [i for i in range(a.nb_agent_expected) if i not in a.completed_agents and not (i == a.agent_id and a.completed)]
+
+
+    def remaining(self, uncovered):
+        """ {agent id: estimated remaining steps} of the agents that did not complete """
+        a = self.agent
+        searching = self._searching()
+        search_cost = uncovered / max(1, len(searching)) / (2 * SENSE_RADIUS + 1)   #sweeping a share of the map with a 5-cell wide sensor
+        estimates = {}
+        for owner in searching:
+            key, box, has_key = self._items(owner)
+            pos = (a.x, a.y) if owner == a.agent_id else (key or box)
+            cost = 0
+            if not has_key:
+                cost += chebyshev(pos, key) if key and pos else search_cost
+                pos = key
+            cost += chebyshev(pos, box) if box and pos else search_cost
+            estimates[owner] = cost
+        self.estimates = estimates
+        return estimates
+
+
+    def _known(self):
+        return planner.shared_map(self.agent.w, self.agent.h)
+
+
+    def should_claim(self, slack):
+        """
+        Claim own items now, unless another agent is expected to finish more than 'slack' steps later (the bottleneck):
+        searching for its items first does not delay the team. The estimates shrink as the map gets covered, so the claim
+        always happens in the end. slack <= 0 always claims at once.
+        """
+        if slack <= 0 or self.needed_unknown() == 0:
+            return True
+        uncovered = self._known().nb_uncovered     #kept up to date by KnownMap, no reduction over the map
+        if uncovered == 0:
+            return True
+        estimates = self.remaining(uncovered)
+        return max(estimates.values(), default=0) - estimates.get(self.agent.agent_id, 0) < slack
+
+
+    def needed_unknown(self):
+        """ Number of unknown items that an agent still searching needs """
+        count = 0
+        for owner in self._searching():
+            key, box, has_key = self._items(owner)
+            count += (key is None and not has_key) + (box is None)
+        return count
+
+
+    def next_zone(self):
+        """
+        Zone with the most expected needed items per step of travel, None once every zone was swept or nothing is left to find.
+        Without information on who owns what is left, an item is equally likely on every uncovered cell.
+        """
+        a = self.agent
+        self.version = self._signature()
+        known = self._known()
+        uncovered = known.nb_uncovered
+        needed = self.needed_unknown()
+        if uncovered == 0 or needed == 0:
+            return None
+        searching = set(self._searching())
+        best, best_score = None, 0.0
+        for i, (x1, x2, y1, y2) in enumerate(self.zones):
+            if i in self.swept:
+                continue
+            zone = known.covered[y1:y2, x1:x2]
+            score = needed * (zone.size - np.count_nonzero(zone)) / uncovered   #expected needed items in the zone
+            if i == a.agent_id:
+                score *= HOME_BONUS
+            elif i in searching:
+                score *= CROWD_PENALTY
+            distance = chebyshev((a.x, a.y), (min(max(a.x, x1), x2 - 1), min(max(a.y, y1), y2 - 1)))
+            score /= 1 + distance / (a.w + a.h)
+            if score > best_score:
+                best, best_score = i, score
+        return best
+
+
+    def mark_swept(self, zone):
+        self.swept.add(zone)
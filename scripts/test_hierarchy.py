@@ -0,0 +1,56 @@
+"""
+Randomized check of hierarchy.py against planner.astar on generated large maps: following the partial paths of
+Hierarchy.plan from call to call must reach exactly the goals A* reaches, with valid moves and without coming back
+to where an earlier partial path ended.
+Usage: python3 -m pytest -q test_hierarchy.py
+"""
+
+import numpy as np
+import pytest
+from bench_planner import generated_obstacles
+import planner
+
+SIZE = 160
+QUERIES = 150
+
+
+def known_map(blocked):
+    known = planner.KnownMap(*blocked.shape[::-1])
+    for (y, x), obstacle in np.ndenumerate(blocked):
+        if obstacle:
+            known.block(x, y)
+        else:
+            known.observe(x, y, 0.0)
+    known.changes.clear()   #the hierarchy is built from the final cells
+    return known
+
+
+def follow(hierarchy, blocked, start, goal):
+    """ Walk the partial paths from start, returns the cell reached (goal, or where planning stopped) """
+    cell, ends = start, set()
+    while cell != goal:
+        path = hierarchy.plan(cell, goal)
+        if not path:
+            break
+        for (ax, ay), (bx, by) in zip([cell] + path, path):
+            assert max(abs(ax - bx), abs(ay - by)) == 1 and not blocked[by, bx], ((ax, ay), (bx, by))
+        cell = path[-1]
+        assert cell not in ends, f"{start} -> {goal}: back to {cell}"
+        ends.add(cell)
+    return cell
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("density", [40, 60])
+def test_reachability(seed, density):
+    rng = np.random.default_rng(seed)
+    blocked = generated_obstacles(SIZE, SIZE * SIZE // density, seed)
+    blocked |= rng.random(blocked.shape) < 0.08     #scattered cells: diagonal-only crossings, closed pockets
+    hierarchy = known_map(blocked).hierarchy
+    assert hierarchy is not None
+    free_y, free_x = np.nonzero(~blocked)
+    for _ in range(QUERIES):
+        i, j = rng.integers(len(free_x), size=2)
+        start, goal = (int(free_x[i]), int(free_y[i])), (int(free_x[j]), int(free_y[j]))
+        reachable = planner.astar(blocked, start, goal)[0] is not None
+        assert (follow(hierarchy, blocked, start, goal) == goal) == reachable, (start, goal)
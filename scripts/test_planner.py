@@ -0,0 +1,81 @@
+"""
+Checks of planner.KnownMap: the cached blocked() mask kept up to date cell by cell must match the mask computed from
+the cells over the whole map, and plans through it must match the plans astar finds on that mask. Plans must not enter
+an unknown wall next to a ring cell, where the item zone overrides the warning zone (map 2, box 3 below the wall at (27, 10)),
+but may go next to a cell holding 0: every cell around a wall holds a warning or a ring value. Localizing an item from its
+outer ring must reach it over cells no wall holds, where the zones of two items overlap too (map 2, keys 1 and 3).
+Usage: python3 -m pytest -q test_planner.py
+"""
+
+import numpy as np
+import pytest
+from my_constants import WALL_WARNING_PERCENTAGE, WALL_VALUE
+from game import Game
+import planner
+
+W, H = 35, 30
+STEPS = 400
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_cached_blocked(seed):
+    rng = np.random.default_rng(seed)
+    known = planner.KnownMap(W, H)
+    for _ in range(STEPS):
+        x, y = int(rng.integers(W)), int(rng.integers(H))
+        if rng.random() < 0.1:
+            known.block(x, y)
+        else:
+            known.observe(x, y, rng.choice([0.0, 0.0, 0.3, WALL_WARNING_PERCENTAGE]))
+        if rng.random() < 0.01:
+            known.item_found(x, y)
+    full = known._blocked(0, 0, W, H)
+    assert (known.blocked() == full).all()
+    assert (np.array(known.blocked_rows) == full).all()
+    assert (known.blocked(5, 7, 20, 12) == full[7:12, 5:20]).all()
+    free_y, free_x = np.nonzero(~full)
+    for _ in range(50):
+        i, j = rng.integers(len(free_x), size=2)
+        start, goal = (int(free_x[i]), int(free_y[i])), (int(free_x[j]), int(free_y[j]))
+        path = known.plan(start, goal)[0]
+        expected = planner.astar(full, start, goal)[0]
+        assert (path is None) == (expected is None) and (path is None or len(path) == len(expected)), (start, goal)
+
+
+def test_wall_next_to_ring():
+    real = Game(4, 2, headless=True).map_real
+    assert real[10, 27] == WALL_VALUE and real[11, 27] == real[11, 26] == 0.3   #no warning between the ring and the wall
+    known = planner.KnownMap(real.shape[1], real.shape[0])
+    for y in range(16, 10, -1):     #an agent came up column 27 from below the item zone
+        known.observe(27, y, real[y, 27])
+    known.observe(26, 11, real[11, 26])
+    assert known.blocked(27, 10, 28, 11)[0, 0]
+    path = known.plan((27, 11), (27, 4))[0]
+    assert path is not None and (27, 10) not in path
+    path = known.plan((27, 11), (27, 10))[0]   #the goal itself is never blocked (items are claimed from any cell)
+    assert path == [(27, 10)]
+    known.observe(23, 11, real[11, 23])    #an unknown cell next to a ring cell and to a 0 cell is no wall
+    assert known.blocked(22, 10, 23, 11)[0, 0]
+    known.observe(21, 10, 0.0)
+    assert not known.blocked(22, 10, 23, 11)[0, 0]
+
+
+def test_overlapping_zones():
+    real = Game(4, 2, headless=True).map_real
+    assert real[17, 18] == WALL_VALUE and real[16, 17] == real[17, 17] == 0.25     #key 1 inner ring overwritten by key 3
+    known = planner.KnownMap(real.shape[1], real.shape[0])
+    for x in range(23, 19, -1):     #an agent came along row 17 from the east, up to the outer ring of key 1
+        known.observe(x, 17, real[17, x])
+    cell = (20, 17)
+    known.observe(17, 16, real[16, 17])
+    known.observe(17, 17, real[17, 17])
+    for _ in range(planner.SENSE_RADIUS * 8):      #walk as main.localize_safely does, reading each cell entered
+        candidates = known.item_candidates((20, 17))
+        assert (18, 17) in candidates
+        if cell == (18, 17):
+            break
+        path = known.localize_path(cell, candidates)
+        assert path and (real[path[0][1], path[0][0]] != WALL_VALUE or path[0] == (18, 17))
+        cell = path[0]
+        known.observe(*cell, real[cell[1], cell[0]])
+    assert cell == (18, 17)
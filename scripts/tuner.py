@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Parameter sweep of the strategy constants of main.py (main.StrategyParams) on the headless engine.
+Every candidate setting is played on each map and agent count, in parallel worker processes,
+then the Pareto front of mean steps against game-over rate is reported.
+Usage: python3 tuner.py [--search grid|random] [--samples N] [--maps 1 2 3] [--agents 2 4] [--episodes K] [--workers W] [--out results.json]
+"""
+
+import argparse, itertools, json, os, random, sys
+from multiprocessing import Pool
+
+# Values tried for each StrategyParams field
+SEARCH_SPACE = {
+    "sweep_step": [3, 4, 5],
+    "zone_overlap": [1, 2, 3],
+    "max_contours": [5, 10, 20],
+    "max_bypass_attempts": [3, 5, 8],
+    "loop_window": [6, 10, 16],
+    "claim_slack": [0, 20, 40, 80],
+}
+
+
+def candidates(search, samples, seed=0):
+    """ Parameter dicts to evaluate: the full grid, or 'samples' random points of it """
+    names = list(SEARCH_SPACE)
+    grid = [dict(zip(names, values)) for values in itertools.product(*(SEARCH_SPACE[n] for n in names))]
+    if search == "random" and samples < len(grid):
+        return random.Random(seed).sample(grid, samples)
+    return grid
+
+
+def silence():
+    """ Worker initializer: the agents print a lot, even from their receiver threads """
+    sys.stdout = open(os.devnull, "w")
+
+
+def evaluate(task):
+    """ Worker: play one episode with the given parameters """
+    params, map_id, nb_agents, max_moves, timeout, strategy = task
+    import main, headless
+    main.PARAMS = main.StrategyParams(**params)
+    result = headless.run_episode(map_id, nb_agents, max_moves, timeout, strategy=strategy)
+    result.update(map_id=map_id, nb_agents=nb_agents)
+    return params, result
+
+
+def summarize(results):
+    """ Aggregate the episodes of each setting: mean steps (total moves), game-over rate and share of agents that completed """
+    episodes = {}
+    for params, result in results:
+        episodes.setdefault(tuple(sorted(params.items())), []).append(result)
+    rows = []
+    for key, runs in episodes.items():
+        rows.append({"params": dict(key), "episodes": len(runs),
+                     "mean_steps": sum(r["steps"] for r in runs) / len(runs),
+                     "game_over_rate": sum(r["game_over"] for r in runs) / len(runs),
+                     "completion_rate": sum(r["completed"] for r in runs) / sum(r["nb_agents"] for r in runs)})
+    return rows
+
+
+def pareto_front(rows):
+    """ Settings that no other setting beats on both mean steps and game-over rate, by increasing mean steps """
+    front = []
+    for row in rows:
+        dominated = any(o["mean_steps"] <= row["mean_steps"] and o["game_over_rate"] <= row["game_over_rate"]
+                        and (o["mean_steps"] < row["mean_steps"] or o["game_over_rate"] < row["game_over_rate"]) for o in rows)
+        if not dominated:
+            front.append(row)
+    return sorted(front, key=lambda r: r["mean_steps"])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--search", help="Search the full grid or a random subset of it", choices=["grid", "random"], default="random")
+    parser.add_argument("--samples", help="Number of settings drawn by the random search", type=int, default=20)
+    parser.add_argument("--maps", help="Maps to play", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--agents", help="Agent counts to play", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--episodes", help="Episodes per setting, map and agent count", type=int, default=1)
+    parser.add_argument("--max_moves", help="Moves of one agent after which an episode is stopped", type=int, default=5000)
+    parser.add_argument("--timeout", help="Wall-clock limit of one episode (s)", type=float, default=120)
+    parser.add_argument("--strategy", help="Exploration strategy of main.py", type=str, default="sweep")
+    parser.add_argument("--workers", help="Worker processes", type=int, default=os.cpu_count())
+    parser.add_argument("--out", help="Write every setting and the front to this JSON file", type=str, default=None)
+    args = parser.parse_args()
+
+    settings = candidates(args.search, args.samples)
+    tasks = [(params, map_id, nb_agents, args.max_moves, args.timeout, args.strategy)
+             for params in settings for map_id in args.maps for nb_agents in args.agents for _ in range(args.episodes)]
+    print(f"Evaluating {len(settings)} settings, {len(tasks)} episodes on {args.workers} workers...")
+    with Pool(args.workers, initializer=silence) as pool:
+        results = []
+        for i, result in enumerate(pool.imap_unordered(evaluate, tasks), 1):
+            results.append(result)
+            if i % 10 == 0 or i == len(tasks):
+                print(f"  {i}/{len(tasks)} episodes")
+
+    rows = summarize(results)
+    front = pareto_front(rows)
+    print("\nPareto front (mean steps vs game-over rate):")
+    print(f"{'mean steps':>11} {'game over':>10} {'completed':>10}  params")
+    for row in front:
+        print(f"{row['mean_steps']:>11.1f} {row['game_over_rate']:>10.2f} {row['completion_rate']:>10.2f}  {row['params']}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"settings": rows, "pareto_front": front}, f, indent=2)
+        print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
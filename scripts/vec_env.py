@@ -0,0 +1,119 @@
+"""
+Gym-style vectorized environment over the rules of Game, for batched strategy evaluation without sockets.
+All the per-environment state lives in NumPy arrays whose first dimension is the environment,
+so stepping 1000 environments costs a handful of array operations.
+"""
+
+import numpy as np
+from my_constants import *
+from game import Game
+from directions import DELTAS
+
+MOVE_DELTAS = np.array(DELTAS)  #(9, 2) array of (dx, dy), indexed by direction
+GAME_OVER_PENALTY = -100.0  #reward of the agent that hits a wall
+
+
+class VecEnv:
+    """
+    'nb_envs' independent games of 'nb_agents' agents, stepped together.
+    reset(seed, map_ids) -> obs and step(actions) -> (obs, rewards, dones, infos), where actions is an (nb_envs, nb_agents) array
+    of move directions. Maps are padded to the largest one. An agent standing on its own key picks it up, then on its own box
+    completes its mission. An environment is done after a game over, once every agent completed or after 'max_steps' steps;
+    the actions sent to a finished environment are ignored until the next reset.
+    """
+    def __init__(self, nb_envs, nb_agents, map_ids=(1,), max_steps=2000):
+        self.nb_envs, self.nb_agents = nb_envs, nb_agents
+        self.max_steps = max_steps
+        self.templates = {}     #map_id -> Game holding the map, built once
+        for map_id in set(map_ids):
+            self._template(map_id)
+        self.map_h = max(g.map_h for g in self.templates.values())
+        self.map_w = max(g.map_w for g in self.templates.values())
+        self.default_map_ids = np.resize(np.array(map_ids), nb_envs)
+        self.env_idx = np.arange(nb_envs)[:, None]     #broadcasts against the agent dimension for fancy indexing
+        self.agent_idx = np.arange(nb_agents)[None, :]
+
+
+    def _template(self, map_id):
+        if map_id not in self.templates:
+            self.templates[map_id] = Game(self.nb_agents, map_id, headless=True)
+        return self.templates[map_id]
+
+
+    def reset(self, seed=None, map_ids=None):
+        """
+        Start new games. map_ids gives the map of each environment (scalar or sequence, default: the constructor ones).
+        Without seed the agents spawn as in the map config, with a seed they spawn on random empty cells.
+        """
+        E, A = self.nb_envs, self.nb_agents
+        self.map_ids = self.default_map_ids if map_ids is None else np.resize(np.array(map_ids), E)
+        self.map_real = np.zeros((E, self.map_h, self.map_w))
+        self.walls = np.zeros((E, self.map_h, self.map_w), dtype=bool)
+        self.size = np.zeros((E, 2), dtype=int)     #(w, h)
+        self.pos = np.zeros((E, A, 2), dtype=int)
+        self.key_pos = np.zeros((E, A, 2), dtype=int)
+        self.box_pos = np.zeros((E, A, 2), dtype=int)
+        rng = np.random.default_rng(seed)
+        for map_id in np.unique(self.map_ids):
+            game = self._template(map_id)
+            envs = np.flatnonzero(self.map_ids == map_id)
+            self.map_real[envs, :game.map_h, :game.map_w] = game.map_real
+            self.walls[envs, :game.map_h, :game.map_w] = game.get_wall_mask()
+            self.size[envs] = (game.map_w, game.map_h)
+            self.key_pos[envs] = game.keys.positions()
+            self.box_pos[envs] = game.boxes.positions()
+            if seed is None:
+                self.pos[envs] = game.agents.positions()
+            else:
+                empty_y, empty_x = np.nonzero(game.map_real == 0)
+                picks = rng.integers(len(empty_x), size=(len(envs), A))
+                self.pos[envs] = np.stack((empty_x[picks], empty_y[picks]), axis=-1)
+        self.has_key = np.zeros((E, A), dtype=bool)
+        self.has_box = np.zeros((E, A), dtype=bool)
+        self.game_over = np.zeros(E, dtype=bool)
+        self.steps = np.zeros(E, dtype=int)
+        self.dones = np.zeros(E, dtype=bool)
+        return self._observe()
+
+
+    def step(self, actions):
+        """ Apply one move per agent in every environment (agent id order, as in a lockstep tick) """
+        actions = np.asarray(actions)
+        active = ~self.dones[:, None] & ~self.has_box
+        new = self.pos + MOVE_DELTAS[actions]
+        inside = ((new >= 0) & (new < self.size[:, None, :])).all(axis=-1)
+        new = np.where(inside[..., None], new, self.pos)
+        hit = active & self.walls[self.env_idx, new[..., 1], new[..., 0]]
+        # as in Game.handle_move, the agent hitting a wall and the ones after it in the tick do not move
+        crashed = hit.any(axis=1)
+        first_hit = np.where(crashed, hit.argmax(axis=1), self.nb_agents)
+        moving = active & (self.agent_idx < first_hit[:, None])
+        self.pos = np.where(moving[..., None], new, self.pos)
+
+        on_key = moving & ~self.has_key & (self.pos == self.key_pos).all(axis=-1)
+        self.has_key |= on_key
+        on_box = moving & self.has_key & ~self.has_box & (self.pos == self.box_pos).all(axis=-1)
+        self.has_box |= on_box
+
+        rewards = np.where(active, -1.0, 0.0)
+        rewards[hit] = GAME_OVER_PENALTY
+        running = ~self.dones
+        self.steps += running
+        self.game_over |= crashed & running
+        self.dones |= self.game_over | self.has_box.all(axis=1) | (self.steps >= self.max_steps)
+        infos = {"game_over": self.game_over.copy(), "steps": self.steps.copy(), "completed": self.has_box.copy()}
+        return self._observe(), rewards, self.dones.copy(), infos
+
+
+    def _observe(self):
+        """
+        Observations of every agent: position, value of its cell (map_real) and, when it stands on an item,
+        the owner and type of the item (-1 otherwise), i.e. what GET_DATA and GET_ITEM_OWNER would answer
+        """
+        x, y = self.pos[..., 0], self.pos[..., 1]
+        on_key = (self.pos[:, :, None, :] == self.key_pos[:, None, :, :]).all(axis=-1)    #(E, A, owner)
+        on_box = (self.pos[:, :, None, :] == self.box_pos[:, None, :, :]).all(axis=-1)
+        owner = np.where(on_key.any(-1), on_key.argmax(-1), np.where(on_box.any(-1), on_box.argmax(-1), -1))
+        item_type = np.where(on_key.any(-1), KEY_TYPE, np.where(on_box.any(-1), BOX_TYPE, -1))
+        return {"pos": self.pos.copy(), "cell_val": self.map_real[self.env_idx, y, x], "owner": owner, "type": item_type,
+                "has_key": self.has_key.copy(), "has_box": self.has_box.copy()}